@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Agenda window benchmark: node scan against TimeIndex.
+
+Run from the repository root::
+
+    python benchmarks/bench_agenda.py [tasks]
+
+Builds a synthetic file of tasks scheduled over two years and times
+finding the stamps of one week by asking every node for its schedule
+and deadline, against building a TimeIndex and querying it.
+"""
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pyorgtree.pyorgtree import OrgTree
+from pyorgtree.index import TimeIndex
+
+
+def make_text(tasks):
+    rand = random.Random(1)
+    base = datetime.date(2024, 1, 1)
+    lines = []
+    for number in range(tasks):
+        day = base + datetime.timedelta(days=rand.randint(0, 730))
+        lines.append("%s TODO task %d" % ("*" * rand.randint(1, 3), number))
+        draw = rand.random()
+        if draw < 0.4:
+            lines.append("  SCHEDULED: <%s>" % day.strftime("%Y-%m-%d %a"))
+        elif draw < 0.6:
+            lines.append("  SCHEDULED: <%s 10:00-11:30> DEADLINE: <%s>" % (
+                day.strftime("%Y-%m-%d %a"), (day + datetime.timedelta(days=3)).isoformat()))
+        elif draw < 0.61:
+            lines.append("  SCHEDULED: <%s>--<%s>" % (
+                day.isoformat(), (day + datetime.timedelta(days=rand.randint(1, 200))).isoformat()))
+        lines.append("body")
+    return "\n".join(lines) + "\n"
+
+
+def scan(tree, start, end):
+    found = []
+    for node in tree:
+        if node.get_header() == None:
+            continue
+        for stamp in (node.get_schedule(), node.get_deadline()):
+            if stamp == None:
+                continue
+            first = stamp.get_from() if hasattr(stamp, 'get_from') else stamp
+            if start <= first.get_date() < end:
+                found.append(node)
+    return found
+
+
+def main():
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    text = make_text(tasks)
+    start, end = datetime.date(2024, 6, 3), datetime.date(2024, 6, 10)
+
+    tree = OrgTree()
+    tree.read_from_string(text)
+    began = time.perf_counter()
+    found = scan(tree, start, end)
+    print("scan        %8.3f s  %d stamps" % (time.perf_counter() - began, len(found)))
+
+    tree = OrgTree()
+    tree.read_from_string(text)
+    began = time.perf_counter()
+    index = TimeIndex(tree)
+    index.check()
+    print("index build %8.3f s  %d stamps" % (time.perf_counter() - began, len(index)))
+    began = time.perf_counter()
+    entries = index.query(start, end)
+    print("index week  %8.3f ms %d stamps" % ((time.perf_counter() - began) * 1e3, len(entries)))
+
+
+if __name__ == "__main__":
+    main()
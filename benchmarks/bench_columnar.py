@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""Columnar store benchmark: build time, memory and filter time.
+
+Run from the repository root::
+
+    python benchmarks/bench_columnar.py [headings]
+
+Compares OrgTree with ColumnarOrgTree on the same synthetic file: time
+to read it, bytes held per heading, and time to find the TODO headings
+tagged tag3.
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pyorgtree.pyorgtree import OrgTree
+from pyorgtree.columnar import ColumnarOrgTree
+from bench_reader import make_org_file
+
+
+def read(tree_class, filename):
+    start = time.perf_counter()
+    tree_class().read_from_file(filename)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    tree = tree_class()
+    tree.read_from_file(filename)
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return tree, elapsed, memory
+
+
+def filter_tree(tree):
+    return [node for node in tree if node.get_header() != None and node.get_header().get_type() == "TODO"
+            and "tag3" in node.get_header().get_tags()]
+
+
+def main(headings):
+    filename = make_org_file(headings)
+    try:
+        tree, elapsed, memory = read(OrgTree, filename)
+        start = time.perf_counter()
+        found = len(filter_tree(tree))
+        selected = time.perf_counter() - start
+        print("%-16s read %8.3f s %8.0f bytes/heading  filter %8.4f s (%d)" % (
+            "OrgTree", elapsed, memory / headings, selected, found))
+        del tree
+        tree, elapsed, memory = read(ColumnarOrgTree, filename)
+        start = time.perf_counter()
+        found = len(tree.select_rows(keyword="TODO", tag="tag3"))
+        selected = time.perf_counter() - start
+        print("%-16s read %8.3f s %8.0f bytes/heading  filter %8.4f s (%d)" % (
+            "ColumnarOrgTree", elapsed, memory / headings, selected, found))
+    finally:
+        os.unlink(filename)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
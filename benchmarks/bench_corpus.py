@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""Corpus loading benchmark: many Org files loaded with 1..N worker processes.
+
+Run from the repository root::
+
+    python benchmarks/bench_corpus.py [files] [headings per file]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_reader import make_org_file
+from pyorgtree.corpus import load_corpus
+
+
+def main(files, headings):
+    filenames = [make_org_file(headings) for _ in range(files)]
+    try:
+        processes = 1
+        while processes <= (os.cpu_count() or 1):
+            start = time.perf_counter()
+            forest = load_corpus(filenames, processes=processes)
+            elapsed = time.perf_counter() - start
+            print("%3d processes %5d files %8.3f s %6d collisions" % (
+                processes, files, elapsed, len(forest.get_hash_collisions())))
+            processes *= 2
+    finally:
+        for filename in filenames:
+            os.unlink(filename)
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [200, 500][len(args):]))
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""Memory benchmark: bytes held per node of a parsed tree.
+
+Run from the repository root::
+
+    python benchmarks/bench_memory.py [headings]
+
+Two figures are reported for each tree class: right after parsing, and
+after the title, tags, keyword, priority, schedule and properties of
+every node have been read.
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pyorgtree.pyorgtree import OrgTree, HashedOrgTree
+from bench_reader import make_org_file
+
+
+def touch(tree):
+    for node in tree:
+        header = node.get_header()
+        if header == None:
+            continue
+        header.get_title()
+        header.get_tags()
+        header.get_type()
+        header.get_priority()
+        node.has_schedule()
+        node.get_properties()
+
+
+def measure(tree_class, filename):
+    gc.collect()
+    tracemalloc.start()
+    tree = tree_class()
+    tree.read_from_file(filename, 0, 0)
+    gc.collect()
+    parsed = tracemalloc.get_traced_memory()[0]
+    touch(tree)
+    gc.collect()
+    resolved = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    nodes = sum(1 for node in tree)
+    return nodes, parsed, resolved
+
+
+def main(headings):
+    filename = make_org_file(headings, body_lines=1)
+    try:
+        for tree_class in (OrgTree, HashedOrgTree):
+            nodes, parsed, resolved = measure(tree_class, filename)
+            print("%-14s %8d nodes %8.0f bytes/node parsed %8.0f bytes/node resolved" % (
+                tree_class.__name__, nodes, parsed / nodes, resolved / nodes))
+    finally:
+        os.unlink(filename)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""Reader benchmark: time to load synthetic Org files of growing size.
+
+Run from the repository root::
+
+    python benchmarks/bench_reader.py [headings ...]
+
+The time per heading should stay flat as the file grows.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pyorgtree.pyorgtree import OrgTree, HashedOrgTree
+
+
+def make_org_file(headings, body_lines=4):
+    fd, filename = tempfile.mkstemp(suffix=".org")
+    with os.fdopen(fd, "w") as out:
+        for i in range(headings):
+            level = 1 + i % 4
+            out.write("%s TODO %05x: heading number %d :tag%d:\n" % ("*" * level, i % 0xfffff, i, i % 7))
+            for j in range(body_lines):
+                out.write("   body line %d of heading %d, lorem ipsum dolor sit amet\n" % (j, i))
+    return filename
+
+
+def bench(tree_class, filename, mode="read"):
+    start = time.perf_counter()
+    tree = tree_class()
+    if mode == "mmap":
+        tree.read_from_mmap(filename)
+    elif mode == "parallel":
+        tree.read_from_file_parallel(filename)
+    else:
+        tree.read_from_file(filename, 0, 0)
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    for headings in sizes:
+        filename = make_org_file(headings)
+        try:
+            size = os.path.getsize(filename)
+            for tree_class in (OrgTree, HashedOrgTree):
+                for mode in ("read", "mmap", "parallel"):
+                    elapsed = bench(tree_class, filename, mode)
+                    print("%-14s %-8s %8d headings %8.1f MB %8.3f s %6.2f us/heading" % (
+                        tree_class.__name__, mode, headings,
+                        size / 1e6, elapsed, elapsed / headings * 1e6))
+        finally:
+            os.unlink(filename)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Planning line benchmark: time to build schedules and deadlines.
+
+Run from the repository root::
+
+    python benchmarks/bench_timestamp.py [lines]
+"""
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pyorgtree.schedule import ScheduleAbstractFactory, DeadlineAbstractFactory
+
+
+def make_planning_lines(count):
+    start = datetime.date(2000, 1, 1)
+    lines = []
+    for i in range(count):
+        date = start + datetime.timedelta(days=i % 9000)
+        stamp = date.strftime("%Y-%m-%d %a")
+        kind = i % 5
+        if kind == 0:
+            lines.append("SCHEDULED: <%s %02d:%02d +%dd>" % (stamp, i % 24, i % 60, 1 + i % 9))
+        elif kind == 1:
+            lines.append("SCHEDULED: <%s>" % stamp)
+        elif kind == 2:
+            lines.append("SCHEDULED: <%s 10:%02d-12:00>" % (stamp, i % 60))
+        elif kind == 3:
+            lines.append("SCHEDULED: <%s 13:00>--<%s 15:%02d>" % (stamp, stamp, i % 60))
+        else:
+            lines.append("DEADLINE: <%s -%dd>" % (stamp, 1 + i % 9))
+    return lines
+
+
+def bench(lines):
+    start = time.perf_counter()
+    for line in lines:
+        if line.startswith("DEADLINE"):
+            DeadlineAbstractFactory.get_deadline(line)
+        else:
+            ScheduleAbstractFactory.get_schedule(line)
+    return time.perf_counter() - start
+
+
+def main(count):
+    lines = make_planning_lines(count)
+    elapsed = min(bench(lines) for i in range(5))
+    print("%8d planning lines %8.3f s %6.2f us/line" % (count, elapsed, elapsed / count * 1e6))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
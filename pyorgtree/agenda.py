@@ -0,0 +1,228 @@
+import calendar
+import collections
+import datetime
+import heapq
+from .schedule import *
+from .index import TimeIndex, from_seconds
+
+Occurrence = collections.namedtuple('Occurrence', ['shown', 'start', 'end', 'keyword', 'node', 'timestamp'])
+
+
+def add_interval(moment, count, unit):
+    """moment shifted by count (possibly negative) days, weeks, months or years.
+
+    Months and years are added from moment itself with the day clamped
+    to the length of the target month, so that a stamp on the 31st
+    repeats on the last day of the shorter months.
+    """
+    if unit == "d":
+        return moment + datetime.timedelta(days=count)
+    if unit == "w":
+        return moment + datetime.timedelta(weeks=count)
+    month = moment.month - 1 + count * (12 if unit == "y" else 1)
+    year = moment.year + month // 12
+    month = month % 12 + 1
+    return moment.replace(year=year, month=month, day=min(moment.day, calendar.monthrange(year, month)[1]))
+
+
+def get_bounds(stamp):
+    """First and last moment (both included) covered by a timestamp or a range."""
+    if isinstance(stamp, Range):
+        return get_bounds(stamp.get_from())[0], get_bounds(stamp.get_to())[1]
+    if isinstance(stamp, DatetimeStamp):
+        start = stamp.get_datetime()
+        if stamp.has_duration():
+            return start, max(start, stamp.get_end_datetime())
+        return start, start
+    start = datetime.datetime.combine(stamp.get_date(), datetime.time())
+    return start, start + datetime.timedelta(seconds=86399)
+
+
+def first_repeat(base, count, unit, moment):
+    """Smallest k >= 0 for which base shifted by k repeats is not before moment."""
+    if moment <= base:
+        return 0
+    if unit in ("d", "w"):
+        step = datetime.timedelta(days=count * (7 if unit == "w" else 1))
+        return -(-(moment - base) // step)
+    months = count * (12 if unit == "y" else 1)
+    repeat = max(0, ((moment.year - base.year) * 12 + moment.month - base.month) // months - 1)
+    while add_interval(base, repeat * count, unit) < moment:
+        repeat += 1
+    return repeat
+
+
+def as_datetime(moment):
+    if isinstance(moment, datetime.datetime):
+        return moment
+    return datetime.datetime.combine(moment, datetime.time())
+
+
+class Expansion(object):
+    """Occurrences of a Schedule or Deadline.
+
+    Repeaters of the three kinds (``+``, ``++`` and ``.+``) repeat from
+    the stamp itself; they differ only in how the stamp moves when the
+    task is marked done.  An occurrence belongs to a window when the
+    time it is shown overlaps it.  That is the occurrence itself unless
+    warnings is set, in which case a deadline is shown from its warning
+    period (the delay, ``-3d``) onwards and a scheduled stamp is hidden
+    until its delay has passed (``--`` delays the first occurrence only).
+    """
+    __slots__ = ('stamp', 'node', 'first', 'length', 'repeat', 'delay', 'deadline', 'lead')
+
+    def __init__(self, stamp, node=None, warnings=False):
+        self.stamp = stamp
+        self.node = node
+        self.first, last = get_bounds(stamp)
+        self.length = last - self.first
+        self.repeat = None
+        self.delay = None
+        if not isinstance(stamp, Range):
+            self.repeat = stamp.get_repeat_interval()
+            if warnings:
+                self.delay = stamp.get_delay_interval()
+        self.deadline = isinstance(stamp, Deadline)
+        self.lead = datetime.timedelta(0)
+        if self.delay != None:
+            self.lead = datetime.timedelta(days=self.delay[0] * {"d": 1, "w": 7, "m": 31, "y": 366}[self.delay[1]])
+
+    def get_first_number(self, start):
+        """Number of the first repeat that may be shown at or after start."""
+        if self.repeat == None:
+            return 0
+        return first_repeat(self.first, self.repeat[0], self.repeat[1], start - self.length - self.lead)
+
+    def get_occurrence(self, number):
+        """Start and shown time of a repeat, None past the calendar."""
+        try:
+            occurrence = add_interval(self.first, number * self.repeat[0], self.repeat[1]) if number else self.first
+        except (ValueError, OverflowError):
+            return None
+        delay = self.delay
+        if delay == None:
+            return occurrence, occurrence
+        if self.deadline:
+            return occurrence, add_interval(occurrence, -delay[0], delay[1])
+        if number == 0 or not self.stamp.get_delay().startswith("--"):
+            return occurrence, add_interval(occurrence, delay[0], delay[1])
+        return occurrence, occurrence
+
+    def get_window_number(self, start, end):
+        """Number of the first repeat shown in [start, end), None if there is none."""
+        if self.first - self.lead >= end:
+            return None
+        number = self.get_first_number(start)
+        occurrence = self.get_occurrence(number)
+        if occurrence == None or min(occurrence) >= end:
+            return None
+        if self.repeat == None and max(occurrence[1], occurrence[0] + self.length) < start:
+            return None
+        return number
+
+    def iter_window(self, start, end, number=None):
+        """Lazily yield the occurrences shown in [start, end), ordered by shown time.
+
+        Repeats are generated until their undelayed time reaches end.  A
+        delayed first occurrence may be shown after later repeats (a
+        ``--`` delay longer than the interval), so it is held back until
+        its turn.
+        """
+        if number == None:
+            number = self.get_first_number(start)
+        held = None
+        while True:
+            occurrence = self.get_occurrence(number)
+            if occurrence == None or min(occurrence) >= end:
+                break
+            occurrence, shown = occurrence
+            if shown < end and max(shown, occurrence + self.length) >= start:
+                item = Occurrence(shown, occurrence, occurrence + self.length, self.stamp.keyword, self.node,
+                                  self.stamp.string)
+                if held != None and held.shown <= shown:
+                    yield held
+                    held = None
+                if number == 0 and self.repeat != None and shown > occurrence:
+                    held = item
+                else:
+                    yield item
+            if self.repeat == None:
+                break
+            number += 1
+        if held != None:
+            yield held
+
+
+def expand(stamp, start, end, node=None, warnings=False):
+    """Lazily yield the occurrences of a Schedule or Deadline in [start, end).
+
+    :returns: generator -- Occurrence tuples ordered by shown time
+    """
+    return Expansion(stamp, node, warnings).iter_window(as_datetime(start), as_datetime(end))
+
+
+def merge_occurrences(tasks, start, end, warnings=False):
+    """Occurrences of (node, stamp) pairs in [start, end), merged lazily in time order.
+
+    Every stamp is expanded by its own generator and a heap merges them,
+    so the work grows with the occurrences taken from the stream, not
+    with the number of tasks times the length of the window.
+    """
+    streams = [expand(stamp, start, end, node, warnings) for node, stamp in tasks]
+    return heapq.merge(*streams, key=lambda occurrence: (occurrence.shown, occurrence.start))
+
+
+class Agenda(object):
+    """Time-ordered occurrences of the SCHEDULED and DEADLINE stamps of a tree.
+
+    Stamps without a repeater or a delay come straight from the window
+    query of a TimeIndex.  The others are parsed once into Expansion
+    objects; a query only starts a generator for those with an
+    occurrence shown before the end of the window and merges them with
+    the rest on a heap.
+    """
+
+    def __init__(self, root, index=None):
+        self.index = TimeIndex(root) if index == None else index
+        self.version = None
+        self.expansions = None
+
+    def get_expansions(self, warnings):
+        index = self.index
+        index.check()
+        if self.version != index.version:
+            self.expansions = {}
+            self.version = index.version
+        if warnings not in self.expansions:
+            self.expansions[warnings] = [
+                Expansion(index.get_stamp(number), index.get_node(index.entry_positions[number]), warnings)
+                for number in sorted(index.modified)]
+        return self.expansions[warnings]
+
+    def iter_plain(self, start, end, keyword):
+        index = self.index
+        modified = index.modified
+        for number in index.find_entries(start, end, keyword):
+            if number not in modified:
+                first = from_seconds(index.starts[number])
+                yield Occurrence(first, first, from_seconds(index.ends[number]), index.keywords[number],
+                                 index.get_node(index.entry_positions[number]), index.timestamps[number])
+
+    def iter_occurrences(self, start, end, keyword=None, warnings=False):
+        """Lazily yield the occurrences shown in [start, end) in time order.
+
+        start and end are dates or datetimes.  See Expansion for how
+        repeaters and, with warnings, delays are applied.
+        """
+        expansions = self.get_expansions(warnings)
+        streams = [self.iter_plain(start, end, keyword)]
+        start, end = as_datetime(start), as_datetime(end)
+        for expansion in expansions:
+            if keyword == None or expansion.stamp.keyword == keyword:
+                number = expansion.get_window_number(start, end)
+                if number != None:
+                    streams.append(expansion.iter_window(start, end, number))
+        return heapq.merge(*streams, key=lambda occurrence: (occurrence.shown, occurrence.start))
+
+    def get_occurrences(self, start, end, keyword=None, warnings=False):
+        return list(self.iter_occurrences(start, end, keyword, warnings))
@@ -0,0 +1,199 @@
+import array
+import mmap
+import os
+import struct
+import sys
+from .header import HashedHeader
+
+BINARY_MAGIC = b"OTBN"
+BINARY_VERSION = 2
+HEADER_FORMAT = struct.Struct("<4sHHQ")
+SECTION_FORMAT = struct.Struct("<QQ")
+TABLES = ('keywords', 'tags', 'tagsets', 'hashes', 'hash_rows', 'text')
+FLAG_HASHED = 1
+
+
+class MalformedBinaryTree(Exception):
+    def __init__(self, message):
+        Exception.__init__(self, message)
+
+
+def pack_strings(strings):
+    return "\0".join(strings).encode('utf-8')
+
+
+def unpack_strings(data):
+    if not data:
+        return []
+    return [sys.intern(string) for string in bytes(data).decode('utf-8').split("\0")]
+
+
+def get_little_endian(column):
+    if sys.byteorder == 'big':
+        column = array.array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def columns_from_tree(tree, column_types):
+    """Columns, keywords, tagsets, tree_dict rows and text of an OrgTree.
+
+    The text is the document as OrgTree.iter_source_lines writes it and
+    the offsets of the columns point into it.
+    """
+    columns = dict((name, array.array(typecode)) for name, typecode in column_types)
+    keywords, keyword_ids = [None], {None: 0}
+    tagsets, tagset_ids = [()], {(): 0}
+    hashes = {}
+    chunks = []
+    position = 0
+    stack = []
+    rows = {}
+    for row, node in enumerate(tree):
+        header = node.get_header()
+        while stack and stack[-1][1] is not node.parent:
+            closed, closed_node = stack.pop()
+            columns['size'][closed] = row - closed
+        columns['parent'].append(rows[node.parent] if row else -1)
+        rows[node] = row
+        stack.append((row, node))
+        columns['offset'].append(position)
+        if row == 0:
+            level, priority, keyword_id, tagset_id = 0, 0, 0, 0
+        else:
+            line = (header.get_string() if header.is_modified() else header.line) + "\n"
+            chunks.append(line)
+            position += len(line.encode('utf-8'))
+            level = node.level
+            priority = ord(header.get_priority()) if header.get_priority() else 0
+            keyword = header.get_type()
+            keyword_id = keyword_ids.get(keyword)
+            if keyword_id == None:
+                keyword_id = keyword_ids[keyword] = len(keywords)
+                keywords.append(keyword)
+            tags = tuple(header.get_tags())
+            tagset_id = tagset_ids.get(tags)
+            if tagset_id == None:
+                tagset_id = tagset_ids[tags] = len(tagsets)
+                tagsets.append(tags)
+            node_hash = header.get_hash() if isinstance(header, HashedHeader) else None
+            if node_hash:
+                hashes[node_hash] = row
+        body = node.get_raw_data() or ""
+        columns['body_offset'].append(position)
+        chunks.append(body)
+        position += len(body.encode('utf-8'))
+        columns['body_end'].append(position)
+        columns['level'].append(level)
+        columns['size'].append(0)
+        columns['priority'].append(priority)
+        columns['keyword'].append(keyword_id)
+        columns['tagset'].append(tagset_id)
+    row = len(columns['level'])
+    for closed, closed_node in stack:
+        columns['size'][closed] = row - closed
+    return columns, keywords, tagsets, hashes, "".join(chunks).encode('utf-8')
+
+
+def write_binary(filename, column_types, columns, keywords, tagsets, hashes, text, hashed):
+    """Write a tree in the binary format.
+
+    The file starts with a header (magic, version, flags, number of rows)
+    and a directory of (offset, length) pairs, one per section in the
+    order of column_types followed by TABLES: the columns as little-endian
+    arrays, the keyword and tag string tables (NUL-separated UTF-8), the
+    tagsets as a flat array of tag counts followed by tag numbers, the
+    hash string table with the row of every hash, and last the text of
+    the document, which the offset columns point into.  Since version 2
+    the keyword, priority and tagset columns always match the headlines
+    in the text; version 1 files may hold the original line of an
+    edited header.
+    """
+    tags, tag_ids = [], {}
+    flat_tagsets = array.array('q')
+    for tagset in tagsets:
+        flat_tagsets.append(len(tagset))
+        for tag in tagset:
+            if tag not in tag_ids:
+                tag_ids[tag] = len(tags)
+                tags.append(tag)
+            flat_tagsets.append(tag_ids[tag])
+    names = [name for name, typecode in column_types] + list(TABLES)
+    sections = [get_little_endian(columns[name]) for name, typecode in column_types]
+    sections.append(pack_strings(keyword or "" for keyword in keywords[1:]))
+    sections.append(pack_strings(tags))
+    sections.append(get_little_endian(flat_tagsets))
+    sections.append(pack_strings(hashes))
+    sections.append(get_little_endian(array.array('q', hashes.values())))
+    directory_end = HEADER_FORMAT.size + SECTION_FORMAT.size * len(names)
+    text_offset = directory_end + sum(len(section) for section in sections)
+    for name in ('offset', 'body_offset', 'body_end'):
+        shifted = array.array(columns[name].typecode, (offset + text_offset for offset in columns[name]))
+        sections[names.index(name)] = get_little_endian(shifted)
+    sections.append(text)
+    rows = len(columns['level'])
+    with open(filename, 'wb') as out:
+        out.write(HEADER_FORMAT.pack(BINARY_MAGIC, BINARY_VERSION, FLAG_HASHED if hashed else 0, rows))
+        offset = directory_end
+        for section in sections:
+            out.write(SECTION_FORMAT.pack(offset, len(section)))
+            offset += len(section)
+        for section in sections:
+            out.write(section)
+
+
+def read_binary(filename, column_types):
+    """Map a file written by write_binary.
+
+    :returns:  tuple -- (source, columns, keywords, tagsets, hashes, hashed,
+               version); source is the memory-mapped file, which the
+               offset columns point into, and hashes maps every hash to
+               its row
+    """
+    with open(filename, 'rb') as inp:
+        if os.fstat(inp.fileno()).st_size < HEADER_FORMAT.size:
+            raise MalformedBinaryTree("Not a binary tree file: %s" % filename)
+        source = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, flags, rows = HEADER_FORMAT.unpack_from(source)
+    if magic != BINARY_MAGIC:
+        raise MalformedBinaryTree("Not a binary tree file: %s" % filename)
+    if version not in (1, BINARY_VERSION):
+        raise MalformedBinaryTree("Unsupported binary tree version %d: %s" % (version, filename))
+    sections = {}
+    for number, name in enumerate([name for name, typecode in column_types] + list(TABLES)):
+        try:
+            offset, length = SECTION_FORMAT.unpack_from(source, HEADER_FORMAT.size + number * SECTION_FORMAT.size)
+        except struct.error:
+            raise MalformedBinaryTree("Truncated binary tree file: %s" % filename)
+        if offset + length > len(source):
+            raise MalformedBinaryTree("Truncated binary tree file: %s" % filename)
+        sections[name] = memoryview(source)[offset:offset + length]
+    columns = {}
+    for name, typecode in column_types:
+        columns[name] = read_array(typecode, sections[name], filename)
+        if len(columns[name]) != rows:
+            raise MalformedBinaryTree("Column %s has %d rows instead of %d: %s" %
+                                      (name, len(columns[name]), rows, filename))
+    keywords = [None] + unpack_strings(sections['keywords'])
+    tags = unpack_strings(sections['tags'])
+    flat_tagsets = read_array('q', sections['tagsets'], filename)
+    tagsets = []
+    position = 0
+    while position < len(flat_tagsets):
+        count = flat_tagsets[position]
+        tagsets.append(tuple(tags[tag_id] for tag_id in flat_tagsets[position + 1:position + 1 + count]))
+        position += 1 + count
+    hashes = dict(zip(unpack_strings(sections['hashes']), read_array('q', sections['hash_rows'], filename)))
+    for section in sections.values():
+        section.release()
+    return source, columns, keywords, tagsets, hashes, bool(flags & FLAG_HASHED), version
+
+
+def read_array(typecode, data, filename):
+    column = array.array(typecode)
+    if len(data) % column.itemsize:
+        raise MalformedBinaryTree("Column size does not match this platform: %s" % filename)
+    column.frombytes(data)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
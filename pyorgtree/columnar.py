@@ -0,0 +1,440 @@
+import array
+import itertools
+import mmap
+import operator
+import os
+import sys
+from .tree import *
+from .header import *
+from .data import *
+from .source import decompress_stream
+from .binary import write_binary, read_binary
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+COLUMNS = (
+    ('parent', 'q'),
+    ('level', 'H'),
+    ('size', 'q'),
+    ('offset', 'q'),
+    ('body_offset', 'q'),
+    ('body_end', 'q'),
+    ('priority', 'B'),
+    ('keyword', 'l'),
+    ('tagset', 'l'),
+)
+
+
+class ColumnarNode(object):
+    """Read-only view of one row of a ColumnarOrgTree.
+
+    Views are created on demand and hold nothing but the store and the
+    row index, so they can be thrown away and recreated freely; two views
+    of the same row compare equal.  Headers and bodies are decoded from
+    the source every time they are asked for.
+    """
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def __eq__(self, other):
+        if not isinstance(other, ColumnarNode):
+            return NotImplemented
+        return self.store is other.store and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.store), self.index))
+
+    def __repr__(self):
+        return "ColumnarNode(%d)" % self.index
+
+    @property
+    def level(self):
+        return self.store.columns['level'][self.index]
+
+    @property
+    def header(self):
+        return self.get_header()
+
+    @property
+    def parent(self):
+        return self.get_parent()
+
+    @property
+    def children(self):
+        return self.get_children()
+
+    def get_level(self):
+        return self.level
+
+    def get_header(self):
+        store = self.store
+        if self.index == 0:
+            return None
+        start = store.columns['offset'][self.index]
+        end = store.columns['body_offset'][self.index]
+        return store.header_class(store.decode(start, end))
+
+    def get_parent(self):
+        parent = self.store.columns['parent'][self.index]
+        if parent == -1:
+            return None
+        return self.store.node(parent)
+
+    def get_child_rows(self):
+        size = self.store.columns['size']
+        row = self.index + 1
+        end = self.index + size[self.index]
+        while row < end:
+            yield row
+            row += size[row]
+
+    def get_children(self):
+        return [self.store.node(row) for row in self.get_child_rows()]
+
+    def has_children(self):
+        return self.store.columns['size'][self.index] > 1
+
+    def __getitem__(self, item_index):
+        if item_index == 0:
+            return self
+        children = self.get_children()
+        if item_index > 0 and item_index <= len(children):
+            return children[item_index - 1]
+        raise IndexError("Node index out of range")
+
+    def __iter__(self):
+        return self.iter_preorder()
+
+    def iter_preorder(self, prune=None):
+        """Iterate over the subtree in document order.
+
+        Rows are stored in document order, so without a prune predicate
+        this is a walk over a contiguous range of rows.
+        """
+        if prune is not None:
+            return Node.iter_preorder(self, prune)
+        return self.store.nodes(self.get_subtree_rows())
+
+    iter_postorder = Node.iter_postorder
+    iter_breadth_first = Node.iter_breadth_first
+
+    def get_structure_version(self):
+        return self.store.structure_version
+
+    def get_subtree_rows(self):
+        return range(self.index, self.index + self.store.columns['size'][self.index])
+
+    def get_raw_data(self):
+        columns = self.store.columns
+        return self.store.decode(columns['body_offset'][self.index], columns['body_end'][self.index])
+
+    def get_data(self):
+        return self.get_raw_data()
+
+    def get_tags(self):
+        return self.store.tagsets[self.store.columns['tagset'][self.index]]
+
+    def get_type(self):
+        return self.store.keywords[self.store.columns['keyword'][self.index]]
+
+    def get_priority(self):
+        priority = self.store.columns['priority'][self.index]
+        return chr(priority) if priority else None
+
+    def has_schedule(self):
+        return OrgTreeData(self.get_raw_data()).has_schedule()
+
+    def get_schedule(self):
+        return OrgTreeData(self.get_raw_data()).get_schedule()
+
+    def has_deadline(self):
+        return OrgTreeData(self.get_raw_data()).has_deadline()
+
+    def get_deadline(self):
+        return OrgTreeData(self.get_raw_data()).get_deadline()
+
+    def has_properties(self):
+        return OrgTreeData(self.get_raw_data()).has_properties()
+
+    def get_properties(self):
+        return OrgTreeData(self.get_raw_data()).get_properties()
+
+    def get_tag_dict(self):
+        return self.store.get_tag_dict()
+
+    def get_trees_by_tag(self, tag):
+        return self.store.get_tag_dict().get(tag, [])
+
+
+class ColumnarOrgTree(ColumnarNode):
+    """Org tree kept as parallel array columns, one row per heading.
+
+    Row 0 is the root (the text before the first heading) and the other
+    rows follow in document order, so a subtree is the contiguous range
+    of rows [index, index + size).  The columns are:
+
+    parent       row of the parent heading, -1 for the root
+    level        number of stars, 0 for the root
+    size         number of rows in the subtree, the row itself included
+    offset       byte offset of the headline in the source
+    body_offset  byte offset of the body, just after the headline
+    body_end     byte offset where the body ends
+    priority     code point of the priority letter, 0 if none
+    keyword      index into keywords, 0 if none
+    tagset       index into tagsets, 0 for no tags
+
+    The tree itself is the view of row 0, so code written against
+    OrgTree can walk it with get_children(), get_header(), get_data()
+    and the traversal methods.  Views are read-only; the store is meant
+    for queries and analytics over large files.
+    """
+    __slots__ = ('columns', 'source', 'keywords', 'keyword_ids', 'tagsets', 'tagset_ids',
+                 'header_class', 'tag_dict', 'tree_dict', 'structure_version')
+
+    def __init__(self, hashed=False):
+        super(ColumnarOrgTree, self).__init__(self, 0)
+        self.columns = dict((name, array.array(typecode)) for name, typecode in COLUMNS)
+        self.source = b""
+        self.keywords = [None]
+        self.keyword_ids = {None: 0}
+        self.tagsets = [()]
+        self.tagset_ids = {(): 0}
+        self.header_class = HashedHeader if hashed else Header
+        self.tag_dict = None
+        self.tree_dict = {} if hashed else None
+        self.structure_version = 0
+
+    def structure_changed(self):
+        self.structure_version = next(Node._structure_versions)
+
+    def node(self, row):
+        if row == 0:
+            return self
+        return ColumnarNode(self, row)
+
+    def nodes(self, rows):
+        node = self.node
+        return map(node, rows)
+
+    def __len__(self):
+        return len(self.columns['level'])
+
+    def get_column(self, name):
+        """Return a column as a numpy array if numpy is available, else as array.array."""
+        column = self.columns[name]
+        if numpy is not None:
+            return numpy.frombuffer(column, dtype=column.typecode)
+        return column
+
+    def decode(self, start, end):
+        text = self.source[start:end].decode('utf-8')
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
+
+    def read_from_file(self, filename):
+        """Build the columns from a file, memory-mapped when it is not compressed."""
+        with open(filename, 'rb') as inp:
+            stream = decompress_stream(inp)
+            if stream is not inp:
+                return self.read_from_bytes(stream.read())
+            if os.fstat(inp.fileno()).st_size == 0:
+                return self.read_from_bytes(b"")
+            return self.read_from_bytes(mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def read_from_string(self, text):
+        return self.read_from_bytes(text.encode('utf-8'))
+
+    def read_from_bytes(self, source):
+        """Build the columns in a single pass over the headlines of source.
+
+        Only the headlines are decoded and tokenized; bodies stay in the
+        source until a view asks for them.
+        """
+        self.source = source
+        self.tag_dict = None
+        self.structure_changed()
+        if self.tree_dict is not None:
+            self.tree_dict = {}
+        self.columns = dict((name, array.array(typecode)) for name, typecode in COLUMNS)
+        parent = self.columns['parent'].append
+        level = self.columns['level']
+        size = self.columns['size']
+        offset = self.columns['offset'].append
+        body_offset = self.columns['body_offset'].append
+        body_end = self.columns['body_end']
+        priority = self.columns['priority'].append
+        keyword = self.columns['keyword'].append
+        tagset = self.columns['tagset'].append
+        hash_group = HEADLINE_GROUPS['hash']
+        parent(-1)
+        level.append(0)
+        size.append(0)
+        offset(0)
+        body_offset(0)
+        body_end.append(len(source))
+        priority(0)
+        keyword(0)
+        tagset(0)
+        stack = [0]
+        row = 0
+        for match in HEADER_BYTES_PATTERN.finditer(source):
+            start = match.start()
+            body_end[row] = start
+            row += 1
+            end = source.find(b"\n", start)
+            end = len(source) if end == -1 else end + 1
+            line = source[start:end].decode('utf-8').strip()
+            tokens = HEADLINE_PATTERN.match(line)
+            heading_level = len(tokens.group('stars'))
+            while level[stack[-1]] >= heading_level:
+                closed = stack.pop()
+                size[closed] = row - closed
+            parent(stack[-1])
+            stack.append(row)
+            level.append(heading_level)
+            size.append(0)
+            offset(start)
+            body_offset(end)
+            body_end.append(len(source))
+            letter = tokens.group('priority')
+            priority(ord(letter[2]) if letter else 0)
+            keyword(self.get_keyword_id(tokens.group('keyword')))
+            tags = tokens.group('tags')
+            tagset(self.get_tagset_id(tuple(tags[1:-1].split(":")) if tags else ()))
+            if self.tree_dict is not None and tokens.group(hash_group):
+                self.tree_dict[tokens.group(hash_group)] = row
+        row += 1
+        for closed in stack:
+            size[closed] = row - closed
+        return None
+
+    def binary_dump(self, filename):
+        """Write the columns and the text in the format of pyorgtree.binary."""
+        base = self.columns['body_offset'][0]
+        end = self.columns['body_end'][len(self) - 1]
+        columns = dict(self.columns)
+        if base:
+            for name in ('offset', 'body_offset', 'body_end'):
+                columns[name] = array.array('q', (offset - base for offset in self.columns[name]))
+        write_binary(filename, COLUMNS, columns, self.keywords, self.tagsets, self.tree_dict or {},
+                     self.source[base:end], self.tree_dict is not None)
+
+    def read_from_binary(self, filename):
+        """Map a file written by binary_dump.
+
+        The columns are read in one copy each and the headlines and bodies
+        are decoded from the mapped file when a view asks for them.
+        """
+        (self.source, self.columns, self.keywords, self.tagsets, tree_dict,
+         hashed, version) = read_binary(filename, COLUMNS)
+        self.keyword_ids = dict((keyword, keyword_id) for keyword_id, keyword in enumerate(self.keywords))
+        self.tagset_ids = dict((tags, tagset_id) for tagset_id, tags in enumerate(self.tagsets))
+        self.header_class = HashedHeader if hashed else Header
+        self.tree_dict = tree_dict if hashed else None
+        self.tag_dict = None
+        self.structure_changed()
+        return None
+
+    def get_keyword_id(self, keyword):
+        keyword_id = self.keyword_ids.get(keyword)
+        if keyword_id == None:
+            keyword_id = self.keyword_ids[keyword] = len(self.keywords)
+            self.keywords.append(sys.intern(keyword))
+        return keyword_id
+
+    def get_tagset_id(self, tags):
+        tagset_id = self.tagset_ids.get(tags)
+        if tagset_id == None:
+            tagset_id = self.tagset_ids[tags] = len(self.tagsets)
+            self.tagsets.append(tuple(sys.intern(tag) for tag in tags))
+        return tagset_id
+
+    def get_tag_dict(self):
+        if self.tag_dict == None:
+            self.tag_dict = {}
+            for row in self.select_rows(tagged=True):
+                for tag in self.get_tagset(row):
+                    self.tag_dict.setdefault(tag, []).append(self.node(row))
+        return self.tag_dict
+
+    def get_tagset(self, row):
+        return self.tagsets[self.columns['tagset'][row]]
+
+    def get_subtree_by_hash(self, subtree_hash):
+        row = self.tree_dict.get(subtree_hash)
+        if row == None:
+            return None
+        return self.node(row)
+
+    def get_tree_dict(self):
+        return dict((tree_hash, self.node(row)) for tree_hash, row in self.tree_dict.items())
+
+    def select_rows(self, keyword=None, priority=None, tag=None, level=None, within=None, tagged=False):
+        """Rows matching all given conditions, computed column-wise.
+
+        :param keyword: TODO keyword, e.g. "TODO"
+        :param priority: priority letter, e.g. "A"
+        :param tag: tag the heading must carry
+        :param level: heading level
+        :param within: only rows in the subtree of this row (or view)
+        :param tagged: only rows with at least one tag
+        :returns:  sequence of row indexes in document order
+        """
+        if isinstance(within, ColumnarNode):
+            within = within.index
+        start, stop = 1, len(self)
+        if within != None:
+            start, stop = max(within, 1), within + self.columns['size'][within]
+        conditions = []
+        if keyword != None:
+            keyword_id = self.keyword_ids.get(keyword)
+            if keyword_id == None:
+                return []
+            conditions.append(('keyword', (keyword_id,)))
+        if priority != None:
+            conditions.append(('priority', (ord(priority),)))
+        if level != None:
+            conditions.append(('level', (level,)))
+        if tag != None or tagged:
+            tagset_ids = [tagset_id for tagset_id, tags in enumerate(self.tagsets)
+                          if tags and (tag == None or tag in tags)]
+            if not tagset_ids:
+                return []
+            conditions.append(('tagset', tagset_ids))
+        if numpy is not None:
+            return self._select_numpy(conditions, start, stop)
+        rows = range(start, stop)
+        if not conditions:
+            return rows
+        masks = [self._mask(name, values, start, stop) for name, values in conditions]
+        mask = masks[0]
+        for other in masks[1:]:
+            mask = map(operator.and_, mask, other)
+        return list(itertools.compress(rows, mask))
+
+    def _mask(self, name, values, start, stop):
+        column = self.columns[name][start:stop]
+        if len(values) == 1:
+            return map(values[0].__eq__, column)
+        return map(frozenset(values).__contains__, column)
+
+    def _select_numpy(self, conditions, start, stop):
+        mask = numpy.ones(stop - start, dtype=bool)
+        for name, values in conditions:
+            column = self.get_column(name)[start:stop]
+            if len(values) == 1:
+                mask &= column == values[0]
+            else:
+                mask &= numpy.isin(column, values)
+        return (numpy.flatnonzero(mask) + start).tolist()
+
+    def select(self, **conditions):
+        """Views of the rows matching select_rows(**conditions)."""
+        return list(self.nodes(self.select_rows(**conditions)))
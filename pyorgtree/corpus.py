@@ -0,0 +1,97 @@
+import concurrent.futures
+import os
+from .pyorgtree import *
+
+
+def _read_tree(job):
+    filename, hashed = job
+    tree = HashedOrgTree() if hashed else OrgTree()
+    tree.read_from_file(filename, 0, 0)
+    return tree
+
+
+class OrgForest(HashedOrgTree):
+    """Root node holding the trees of many Org files.
+
+    Each child is the level 0 tree of one file.  tag_dict and tree_dict
+    are merged across files, and tag_index/hash_index keep the same
+    entries as (filename, tree) pairs so every node can be traced back to
+    the file it was read from.
+    """
+
+    def __init__(self):
+        super(OrgForest, self).__init__()
+        self.file_dict = {}
+        self.tag_index = {}
+        self.hash_index = {}
+        self.hash_collisions = {}
+
+    def add_file_tree(self, filename, tree):
+        tree.set_parent(self)
+        self.add_child(tree)
+        self.file_dict[filename] = tree
+        for tag, trees in tree.get_tag_dict().items():
+            if tag not in self.tag_dict:
+                self.tag_dict[tag] = []
+                self.tag_index[tag] = []
+            self.tag_dict[tag].extend(trees)
+            self.tag_index[tag].extend((filename, subtree) for subtree in trees)
+        if not isinstance(tree, HashedOrgTree):
+            return
+        for subtree in tree:
+            header = subtree.get_header()
+            if header == None or not header.has_hash():
+                continue
+            tree_hash = header.get_hash()
+            if tree_hash in self.hash_index:
+                if tree_hash not in self.hash_collisions:
+                    self.hash_collisions[tree_hash] = [self.hash_index[tree_hash]]
+                self.hash_collisions[tree_hash].append((filename, subtree))
+            self.hash_index[tree_hash] = (filename, subtree)
+            self.tree_dict[tree_hash] = subtree
+
+    def load_files(self, filenames, processes=None, hashed=True):
+        """Parse the files in a process pool and merge them in the given order.
+
+        :param processes: number of worker processes, None for one per CPU;
+                          1 parses in the calling process
+        """
+        filenames = list(filenames)
+        jobs = [(filename, hashed) for filename in filenames]
+        if processes == 1 or len(jobs) < 2:
+            trees = map(_read_tree, jobs)
+            for filename, tree in zip(filenames, trees):
+                self.add_file_tree(filename, tree)
+            return
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+            chunksize = max(1, len(jobs) // (4 * (processes or os.cpu_count() or 1)))
+            trees = executor.map(_read_tree, jobs, chunksize=chunksize)
+            for filename, tree in zip(filenames, trees):
+                self.add_file_tree(filename, tree)
+
+    def get_file_tree(self, filename):
+        return self.file_dict.get(filename)
+
+    def get_filenames(self):
+        return list(self.file_dict.keys())
+
+    def get_trees_by_tag_with_files(self, tag):
+        return self.tag_index.get(tag, [])
+
+    def get_file_by_hash(self, subtree_hash):
+        try:
+            return self.hash_index[subtree_hash][0]
+        except KeyError:
+            return None
+
+    def has_hash_collisions(self):
+        return len(self.hash_collisions) > 0
+
+    def get_hash_collisions(self):
+        return self.hash_collisions
+
+
+def load_corpus(filenames, processes=None, hashed=True):
+    forest = OrgForest()
+    forest.load_files(filenames, processes, hashed)
+    return forest
@@ -1,60 +1,115 @@
 import re
 from .schedule import *
+from .tree import set_pickled_state
+
+PLANNING_LINE_PATTERN = re.compile(r"^[ \t]*(?:SCHEDULED|DEADLINE|CLOSED):")
+PLANNING_PATTERN = re.compile(r"(?P<keyword>SCHEDULED|DEADLINE|CLOSED):[ \t]*(?P<timestamp>[<\[][^>\]]*[>\]](?:--[<\[][^>\]]*[>\]])?)")
+PROPERTIES_START_PATTERN = re.compile(r"^[ \t]*:PROPERTIES:[ \t]*$")
+DRAWER_END_PATTERN = re.compile(r"^[ \t]*:END:[ \t]*$", re.M)
+PROPERTY_PATTERN = re.compile(r"^[ \t]*:(?P<key>[^\s:]+):(?:[ \t]+(?P<value>.*))?$", re.M)
+
 
 class OrgTreeData(object):
-    data = None
-    properties_dict = None
-    schedule = None
-    deadline = None
+    """Body of a tree with its planning line and property drawer.
+
+    Only the lines at the top of the body are looked at: the planning
+    line and the property drawer, in either order, before the first line
+    of free text.  Each facet is parsed the first time it is asked for.
+    """
+    __slots__ = ('data', 'properties_dict', 'schedule', 'deadline', 'planning', 'drawer')
 
     def __init__(self, data):
         self.data = data
-        properties_start = re.compile(".{0,}:PROPERTIES:")
-        properties_end = re.compile(".{0,}:END:")
-        lines = self.data.split('\n')
-        properties_open = False
-        property_match = re.compile(".{0,}:[a-zA-Z0-9]{1,100}:")
-        schedule_match = re.compile(".{0,}SCHEDULED: .{1,}$")
-        deadline_match = re.compile(".{0,}DEADLINE: .{1,}$")
-        self.properties_dict = dict()
-        for line in lines:
-            if properties_start.match(line):
-                properties_open = True
-            elif properties_end.match(line):
-                break
-            elif schedule_match.match(line):
-                self.schedule = ScheduleAbstractFactory.get_schedule(line)
-            elif deadline_match.match(line):
-                self.deadline = DeadlineAbstractFactory.get_deadline(line)
+        self.properties_dict = None
+        self.schedule = -1
+        self.deadline = -1
+        self.planning = -1
+        self.drawer = -1
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            self.__init__(state['data'])
+        set_pickled_state(self, state)
+
+    def _scan_sections(self):
+        data = self.data
+        self.planning = None
+        self.drawer = None
+        position = 0
+        while position < len(data):
+            end = data.find("\n", position)
+            if end == -1:
+                end = len(data)
+            line = data[position:end]
+            if self.planning == None and PLANNING_LINE_PATTERN.match(line):
+                self.planning = line
+            elif self.drawer == None and PROPERTIES_START_PATTERN.match(line):
+                drawer_end = DRAWER_END_PATTERN.search(data, end)
+                if drawer_end == None:
+                    break
+                self.drawer = data[end + 1:drawer_end.start()]
+                end = drawer_end.end()
             else:
-                if properties_open:
-                    if property_match.match(line):
-                        prop = re.sub(".{0,}:(?P<prop>[a-zA-Z0-9]{1,100}):.{0,}$", "\g<prop>", line)
-                        value = re.sub(".*:(?P<val>.{1,})$", "\g<val>", line).strip()
-                        self.properties_dict[prop] = value
+                break
+            position = end + 1
+
+    def get_planning_line(self):
+        if self.planning == -1:
+            self._scan_sections()
+        return self.planning
+
+    def get_drawer(self):
+        if self.drawer == -1:
+            self._scan_sections()
+        return self.drawer
+
+    def _get_planning_timestamp(self, keyword):
+        planning = self.get_planning_line()
+        if planning == None:
+            return None
+        for match in PLANNING_PATTERN.finditer(planning):
+            if match.group('keyword') == keyword:
+                return "%s: %s" % (keyword, match.group('timestamp'))
+        return None
 
     def get_data(self):
         return self.data
 
     def has_properties(self):
-        return len(list(self.properties_dict.keys())) > 0
+        return len(list(self.get_properties().keys())) > 0
 
     def get_properties(self):
+        if self.properties_dict == None:
+            self.properties_dict = dict()
+            drawer = self.get_drawer()
+            if drawer != None:
+                for match in PROPERTY_PATTERN.finditer(drawer):
+                    self.properties_dict[match.group('key')] = (match.group('value') or "").strip()
         return self.properties_dict
 
     def has_schedule(self):
-        return self.schedule != None
+        return self.get_schedule() != None
     def get_schedule(self):
+        if self.schedule == -1:
+            self.schedule = None
+            string = self._get_planning_timestamp("SCHEDULED")
+            if string != None:
+                self.schedule = ScheduleAbstractFactory.get_schedule(string)
         return self.schedule
     def set_schedule(self, schedule):
         if not (schedule == None or isinstance(schedule, Schedule)):
             return False
         self.schedule = schedule
         return True
-        
+
     def has_deadline(self):
-        return self.deadline != None
+        return self.get_deadline() != None
     def get_deadline(self):
+        if self.deadline == -1:
+            self.deadline = None
+            string = self._get_planning_timestamp("DEADLINE")
+            if string != None:
+                self.deadline = DeadlineAbstractFactory.get_deadline(string)
         return self.deadline
     def set_deadline(self, deadline):
         if not (deadline == None or isinstance(deadline, Deadline)):
@@ -0,0 +1,60 @@
+from .header import *
+from .source import open_source
+
+START_HEADING = "start-heading"
+BODY_CHUNK = "body-chunk"
+END_HEADING = "end-heading"
+
+
+class OrgEvent(object):
+    def __init__(self, event_type, header=None, data=None):
+        self.event_type = event_type
+        self.header = header
+        self.data = data
+
+    def get_type(self):
+        return self.event_type
+
+    def get_header(self):
+        return self.header
+
+    def get_data(self):
+        return self.data
+
+    def __repr__(self):
+        return "OrgEvent(%s, %r, %r)" % (self.event_type, self.header and self.header.line, self.data)
+
+
+def iter_events(path_or_stream, hashed=False):
+    """Stream the headings of an Org document without building a tree.
+
+    Yields ``start-heading`` and ``end-heading`` events carrying the lazily
+    parsed header, and one ``body-chunk`` event per body line.  Body lines
+    before the first heading are reported with ``header`` set to None.
+    Headings are nested exactly as ``OrgTreeReader.read_from_file`` nests
+    them, and only the headers of the currently open headings are kept.
+
+    :param path_or_stream: file name, file object (compressed input is
+                           decompressed on the fly) or iterable of lines
+    :param hashed: create HashedHeader instead of Header objects
+    """
+    with open_source(path_or_stream) as lines:
+        for event in _iter_line_events(lines, hashed):
+            yield event
+
+
+def _iter_line_events(lines, hashed):
+    header_class = HashedHeader if hashed else Header
+    stack = []
+    for line in lines:
+        if not is_header_line(line):
+            yield OrgEvent(BODY_CHUNK, stack[-1] if stack else None, line)
+            continue
+        header = header_class(line)
+        level = header.get_level()
+        while stack and stack[-1].get_level() >= level:
+            yield OrgEvent(END_HEADING, stack.pop())
+        stack.append(header)
+        yield OrgEvent(START_HEADING, header)
+    while stack:
+        yield OrgEvent(END_HEADING, stack.pop())
@@ -0,0 +1,208 @@
+import mmap
+import os
+import re
+import struct
+import zlib
+from .source import peek_stream, atomic_output, DECOMPRESSORS, MAGIC_SIZE
+from .columnar import ColumnarOrgTree
+from .pyorgtree import HashedOrgTree
+
+HASH_INDEX_SUFFIX = ".hashidx"
+HASH_INDEX_MAGIC = b"OTHX"
+HASH_INDEX_VERSION = 1
+HEADER_FORMAT = struct.Struct("<4sHIqqI")
+RECORD_FORMAT = struct.Struct("<5sQQHI")
+HASH_SIZE = 5
+HASH_PATTERN = re.compile(r"[a-z0-9]{5}\Z")
+
+
+class StaleHashIndex(Exception):
+    def __init__(self, message):
+        Exception.__init__(self, message)
+
+
+def get_hash_index_path(filename):
+    return filename + HASH_INDEX_SUFFIX
+
+
+def get_file_stamp(filename):
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def write_hash_index(filename, index_filename=None):
+    """Write the hash index of an uncompressed Org file next to it.
+
+    Every hashed heading gets a fixed-size record (hash, byte offset and
+    length of its subtree, level and crc32 of the subtree bytes) and the records are sorted by hash.  The header holds the
+    modification time, size and crc32 of the file.  The file is replaced
+    atomically.
+
+    :returns:  int -- number of records written
+    """
+    if index_filename == None:
+        index_filename = get_hash_index_path(filename)
+    mtime, size = get_file_stamp(filename)
+    with open(filename, 'rb') as inp:
+        if any(peek_stream(inp, MAGIC_SIZE)[0].startswith(magic) for magic, opener in DECOMPRESSORS):
+            raise ValueError("Compressed files cannot be indexed by offset: %s" % filename)
+        inp.seek(0)
+        source = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        try:
+            store = ColumnarOrgTree(hashed=True)
+            store.read_from_bytes(source)
+            offsets = store.columns['offset']
+            sizes = store.columns['size']
+            levels = store.columns['level']
+            records = []
+            for subtree_hash, row in sorted(store.tree_dict.items()):
+                start = offsets[row]
+                end = offsets[row + sizes[row]] if row + sizes[row] < len(store) else size
+                records.append(RECORD_FORMAT.pack(subtree_hash.encode('ascii'), start, end - start, levels[row],
+                                                  zlib.crc32(source[start:end])))
+            checksum = zlib.crc32(source)
+        finally:
+            if size:
+                source.close()
+    with atomic_output(index_filename) as out:
+        out.write(HEADER_FORMAT.pack(HASH_INDEX_MAGIC, HASH_INDEX_VERSION, len(records), mtime, size, checksum))
+        out.write(b"".join(records))
+    return len(records)
+
+
+class HashIndex(object):
+    """Sorted on-disk index from heading hashes to subtrees of an Org file.
+
+    The index file is memory-mapped and searched by bisection over its
+    fixed-size records, so a lookup reads a handful of pages of the
+    index and then only the bytes of the subtree, which are checked
+    against their crc32 and parsed alone.  The index is stale when the
+    modification time or the size of the file differ from those it was
+    built for; with rebuild set it is then rewritten, otherwise lookups
+    raise StaleHashIndex.  verify() also compares the checksum of the
+    whole file.
+    """
+
+    def __init__(self, filename, index_filename=None, rebuild=True):
+        self.filename = filename
+        self.index_filename = get_hash_index_path(filename) if index_filename == None else index_filename
+        self.rebuild = rebuild
+        self.index = None
+        self.count = 0
+        self.stamp = None
+        self.checksum = None
+
+    def open(self):
+        self.close()
+        try:
+            with open(self.index_filename, 'rb') as inp:
+                self.index = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, ValueError):
+            return False
+        if len(self.index) < HEADER_FORMAT.size:
+            self.close()
+            return False
+        magic, version, count, mtime, size, checksum = HEADER_FORMAT.unpack_from(self.index)
+        if magic != HASH_INDEX_MAGIC or version != HASH_INDEX_VERSION or \
+                len(self.index) != HEADER_FORMAT.size + count * RECORD_FORMAT.size:
+            self.close()
+            return False
+        self.count = count
+        self.stamp = (mtime, size)
+        self.checksum = checksum
+        return True
+
+    def close(self):
+        if self.index != None:
+            self.index.close()
+        self.index = None
+
+    def is_fresh(self):
+        return self.index != None and self.stamp == get_file_stamp(self.filename)
+
+    def load(self):
+        return self.is_fresh() or (self.open() and self.is_fresh())
+
+    def verify(self):
+        """Whether the index matches the file, its checksum included."""
+        if not self.load():
+            return False
+        with open(self.filename, 'rb') as inp:
+            return zlib.crc32(inp.read()) == self.checksum
+
+    def check(self):
+        if self.load():
+            return
+        if not self.rebuild:
+            raise StaleHashIndex("Hash index out of date: %s" % self.index_filename)
+        write_hash_index(self.filename, self.index_filename)
+        if not self.load():
+            raise StaleHashIndex("Hash index out of date: %s" % self.index_filename)
+
+    def __len__(self):
+        self.check()
+        return self.count
+
+    def __contains__(self, subtree_hash):
+        return self.find(subtree_hash) != None
+
+    def get_record(self, number):
+        return RECORD_FORMAT.unpack_from(self.index, HEADER_FORMAT.size + number * RECORD_FORMAT.size)
+
+    def find(self, subtree_hash):
+        """Record of a hash: (offset, length, level, crc32), None if absent."""
+        if not isinstance(subtree_hash, str) or not HASH_PATTERN.match(subtree_hash):
+            return None
+        self.check()
+        key = subtree_hash.encode('ascii')
+        index, low, high = self.index, 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = HEADER_FORMAT.size + middle * RECORD_FORMAT.size
+            if index[start:start + HASH_SIZE] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count:
+            record = self.get_record(low)
+            if record[0] == key:
+                return record[1:]
+        return None
+
+    def read_subtree(self, subtree_hash, record=None):
+        """Bytes of the subtree of a hash as found in the file, None if absent."""
+        if record == None:
+            record = self.find(subtree_hash)
+        if record == None:
+            return None
+        offset, length, level, checksum = record
+        with open(self.filename, 'rb') as inp:
+            inp.seek(offset)
+            data = inp.read(length)
+        if zlib.crc32(data) != checksum:
+            raise StaleHashIndex("Subtree %s changed on disk: %s" % (subtree_hash, self.filename))
+        return data
+
+    def get_subtree_by_hash(self, subtree_hash):
+        """Parse the subtree of a hash alone.
+
+        :returns:  HashedOrgTree -- the heading, child of a root holding
+                   only its subtree, or None if the hash is not in the file
+        """
+        record = self.find(subtree_hash)
+        if record == None:
+            return None
+        data = self.read_subtree(subtree_hash, record)
+        offset, length, level, checksum = record
+        root = HashedOrgTree()
+        root.read_from_string(data.decode('utf-8'), 0, level - 1)
+        return root.get_subtree_by_hash(subtree_hash)
+
+
+def get_subtree_by_hash(filename, subtree_hash):
+    """Subtree of a hash in an Org file, through (and if needed refreshing) its hash index."""
+    index = HashIndex(filename)
+    try:
+        return index.get_subtree_by_hash(subtree_hash)
+    finally:
+        index.close()
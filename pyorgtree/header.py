@@ -2,10 +2,59 @@ import re
 import datetime
 import os
 import pickle
+import sys
 from .tree import *
 
+HEADER_PATTERN = re.compile(r"^\*{1,} ")
+HEADER_BYTES_PATTERN = re.compile(br"^\*{1,} ", re.M)
+TOP_HEADER_BYTES_PATTERN = re.compile(br"^\* ", re.M)
+
+HEADLINE_PATTERN = re.compile(r"""
+    (?P<stars>\**)
+    (?:\ (?P<keyword>[A-Z]{3,5})(?=\ ))?
+    (?:\ (?P<timestamp>\[[0-9]{4}-[0-9]{2}-[0-9]{2}\ [^\]]{3}(?:\ [0-2][0-9]:[0-5][0-9])?\]))?
+    (?:\ (?P<priority>\[\#[A-Z]\]))?
+    (?:\ (?P<hash>[a-z0-9]{5}):(?=\ ))?
+    (?P<title>.*?)
+    (?:(?:\ {1,5}|\t)(?P<tags>:[a-zA-Z0-9:]*:))?
+    $""", re.VERBOSE)
+HEADLINE_GROUPS = HEADLINE_PATTERN.groupindex
+
+def is_header_line(line):
+    return HEADER_PATTERN.match(line) != None
+
+class HeaderTokens(object):
+    """Single scan of the headline shared by all header facets.
+
+    HEADLINE_PATTERN splits the line into level, keyword, timestamp,
+    priority, hash, title and tags in one match; the start and end of
+    its groups are kept, shifted by one so that a missing group is 0, in
+    one flat bytes object (a tuple for lines longer than 254 characters)
+    and the facet getters slice the line with them.
+    """
+    __slots__ = ()
+
+    def get_tokens(self):
+        if self.tokens == None:
+            tokens = [position + 1 for span in HEADLINE_PATTERN.match(self.line).regs for position in span]
+            self.tokens = bytes(tokens) if len(self.line) < 255 else tuple(tokens)
+        return self.tokens
+
+    def get_token_span(self, name):
+        index = 2 * HEADLINE_GROUPS[name]
+        tokens = self.get_tokens()
+        return tokens[index] - 1, tokens[index + 1] - 1
+
+    def get_token(self, name):
+        start, end = self.get_token_span(name)
+        if start == -1:
+            return None
+        return self.line[start:end]
+
+
 class HeaderTags(object):
-    tags = None
+    __slots__ = ()
+
     def has_tags(self):
         if self.tags == None:
             self.get_tags()
@@ -13,9 +62,9 @@ class HeaderTags(object):
         
     def get_tags(self):
         if self.tags == None:
-            if re.compile(r".{0,}( {1,5}|\t):[a-zA-Z0-9:]*:$").match(self.line):
-                tag_string = re.sub(r".{0,}( |\t)(?P<tags>:[a-zA-Z0-9:]*):$", r"\g<tags>", self.line)
-                self.tags = tag_string[1:].split(":")
+            tag_string = self.get_token('tags')
+            if tag_string:
+                self.tags = [sys.intern(tag) for tag in tag_string[1:-1].split(":")]
             else:
                 self.tags = []
         return self.tags
@@ -27,7 +76,8 @@ class HeaderTags(object):
         if not pattern.match(tag):
             return False
         if tag not in self.tags:
-            self.tags.append(tag)
+            self.tags.append(sys.intern(tag))
+            self.source_line = None
             return True
         return False
         
@@ -36,12 +86,14 @@ class HeaderTags(object):
             self.get_tags()
         if tag in self.tags:
             self.tags.remove(tag)
+            self.source_line = None
             return True
         else:
             return False
         
     def remove_all_tags(self):
         self.tags = []
+        self.source_line = None
         
     def get_tag_string(self):
         if not self.tags:
@@ -52,7 +104,7 @@ class HeaderTags(object):
         return result
         
 class HeaderPriority(object):
-    priority = "NA"
+    __slots__ = ()
     
     def has_priority(self):
         if self.priority == "NA":
@@ -61,20 +113,8 @@ class HeaderPriority(object):
 
     def get_priority(self):
         if self.priority == "NA":
-            patterns = []
-            priority_pattern = r" \[#[A-Z]\].{0,}"
-            keyword_pattern = " [A-Z]{3,5}"
-            timestamp_pattern = r" \[[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] .{3}( [0-2][0-9]:[0-5][0-9]|.{0})\]"
-            patterns.append(re.compile(r"\*{1,}%s" % (priority_pattern)))
-            patterns.append(re.compile(r"\*{1,}%s%s" % (keyword_pattern, priority_pattern)))
-            patterns.append(re.compile(r"\*{1,}%s%s%s" % (keyword_pattern, priority_pattern, timestamp_pattern)))  
-            patterns.append(re.compile(r"\*{1,}%s%s%s" % (keyword_pattern, timestamp_pattern, priority_pattern)))  
-            self.priority = None
-            for pattern in patterns:
-                if pattern.match(self.line):
-                    prio = re.sub(r".{1,} (?P<prio>\[#[A-Z]\]).{0,}", r"\g<prio>", self.line)
-                    self.priority = prio[2:3]
-                    break
+            priority = self.get_token('priority')
+            self.priority = priority[2] if priority else None
         return self.priority
         
     def set_priority(self, priority):
@@ -82,6 +122,7 @@ class HeaderPriority(object):
         if not (priority == None or pattern.match(priority)):
             return False
         self.priority = priority
+        self.source_line = None
         return True
         
     def get_priority_string(self):
@@ -93,7 +134,7 @@ class HeaderPriority(object):
             return ""
             
 class HeaderType(object):
-    header_type = "NA"
+    __slots__ = ()
     
     def has_type(self):
         if self.header_type == "NA":
@@ -102,12 +143,8 @@ class HeaderType(object):
 
     def get_type(self):
         if self.header_type == "NA":
-            self.header_type = None
-            patterns = []
-            patterns.append(re.compile(r"\*{1,} [A-Z]{3,5} ")) 
-            for pattern in patterns:
-                if pattern.match(self.line):
-                    self.header_type = re.sub(r"\*{1,} (?P<type>[A-Z]{3,5}) .{0,}", r"\g<type>", self.line)
+            keyword = self.get_token('keyword')
+            self.header_type = keyword and sys.intern(keyword)
         return self.header_type
 
     def set_type(self, new_type):
@@ -115,6 +152,7 @@ class HeaderType(object):
         if not (new_type == None or pattern.match(new_type)):
             return False
         self.header_type = new_type
+        self.source_line = None
         return True
     def get_type_string(self):
         if self.header_type == "NA":
@@ -125,8 +163,8 @@ class HeaderType(object):
             return ""
 
 class HeaderTimestamp(object):
-    timestamp = -1
-    timestamp_time_included = True
+    __slots__ = ()
+
     def has_timestamp(self):
         if self.timestamp == -1:
             self.get_timestamp()
@@ -153,27 +191,19 @@ class HeaderTimestamp(object):
     def get_timestamp(self):
         if self.timestamp == -1:
             self.timestamp = None
-            patterns = []
-            keyword_pattern = " ([A-Z]{3,5}|.{0})"
-            timestamp_pattern = r"\[[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] .{3}( [0-2][0-9]:[0-5][0-9]|.{0})\]"
-            priority_pattern = r" (\[#[A-Z]\]|.{0})"
-            patterns.append(re.compile(r"\*{1,}%s%s" % (keyword_pattern, timestamp_pattern)))
-            patterns.append(re.compile(r"\*{1,}%s%s%s($|.{0,})" % (keyword_pattern, priority_pattern, timestamp_pattern)))  
-            patterns.append(re.compile(r"\*{1,}%s%s%s($|.{0,})" % (keyword_pattern, timestamp_pattern, priority_pattern)))  
-            for pattern in patterns:
-                if pattern.match(self.line):
-                    time_string = re.sub(r".{0,}(?P<time>\[[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] .{3}( [0-2][0-9]:[0-5][0-9]|.{0,})\]).{0,}", r"\g<time>", self.line)
-                    year = int(time_string[1:5])
-                    month = int(time_string[6:8])
-                    day = int(time_string[9:11])
-                    try:
-                        hour = int(time_string[16:18])
-                        minute = int(time_string[19:21])
-                    except ValueError:
-                        self.timestamp_time_included = False
-                        hour = 0
-                        minute = 0
-                    self.timestamp = datetime.datetime(year, month, day, hour, minute)
+            time_string = self.get_token('timestamp')
+            if time_string:
+                year = int(time_string[1:5])
+                month = int(time_string[6:8])
+                day = int(time_string[9:11])
+                if len(time_string) > 16:
+                    hour = int(time_string[16:18])
+                    minute = int(time_string[19:21])
+                else:
+                    self.timestamp_time_included = False
+                    hour = 0
+                    minute = 0
+                self.timestamp = datetime.datetime(year, month, day, hour, minute)
         return self.timestamp
 
     def set_timestamp(self, timestamp, dateonly=False):
@@ -182,52 +212,59 @@ class HeaderTimestamp(object):
         self.timestamp = timestamp
         if not dateonly or timestamp == None:
             self.timestamp_time_included = True
+        self.source_line = None
         return True
         
-class Header(HeaderTags, HeaderPriority, HeaderType, HeaderTimestamp):
-    line = None
-    title = None
-    level = None
+class Header(HeaderTokens, HeaderTags, HeaderPriority, HeaderType, HeaderTimestamp):
+    __slots__ = ('line', 'title', 'level', 'tokens', 'tags', 'priority', 'header_type',
+                 'timestamp', 'timestamp_time_included', 'source_line')
     
     def __init__(self, line):
         self.line = line.strip()
-        self.level = 0
-        for char in self.line:
-            if char == "*":
-                self.level += 1
-            else:
-                break
+        source_line = line.rstrip("\r\n")
+        self.source_line = self.line if source_line == self.line else source_line
+        self.level = len(self.line) - len(self.line.lstrip("*"))
+        self.title = None
+        self.tokens = None
+        self.tags = None
+        self.priority = "NA"
+        self.header_type = "NA"
+        self.timestamp = -1
+        self.timestamp_time_included = True
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            self.__init__(state['line'])
+        set_pickled_state(self, state)
 
     def get_level(self):
         return self.level
 
+    def is_modified(self):
+        """Whether a setter changed the header since it was read; source_line is then None."""
+        return self.source_line == None
+
     def set_level(self, level):
         if level < 1:
             return False
         self.level = level
+        self.source_line = None
         return True
         
     def get_title(self):
         if self.title == None:
-            result = self.line
-            if self.has_tags():
-                tag_string = re.sub(r".{0,}( |\t)(?P<tags>:[a-zA-Z0-9:]*:)$", r"\g<tags>", result)
-                result = re.sub(tag_string, "", result)
-            if self.has_priority():
-                priority = self.get_priority()
-                result = re.sub(r'\[#%s\]' % priority , '', result)
-            if self.has_type():
-                tree_type = self.get_type()
-                result = re.sub(tree_type, '', result)
-            if self.has_timestamp():
-                result = re.sub(r".{1,} \[[0-9][0-9].{1,}\]", "", result)
-            self.title = re.sub(r"^\*{1,}", "", result).strip()
+            start, end = self.get_token_span('title')
+            hash_start = self.get_token_span('hash')[0]
+            if hash_start != -1:
+                start = hash_start
+            self.title = self.line[start:end].strip()
         return self.title
         
     def set_title(self, title):
         if title == None or not isinstance(title, str) or not title.strip():
             return False
         self.title = title
+        self.source_line = None
         return True
         
     def get_string(self):
@@ -271,13 +308,20 @@ class Header(HeaderTags, HeaderPriority, HeaderType, HeaderTimestamp):
                 self.timestamp_time_included == other.timestamp_time_included)
 
 class HashedHeader(Header):
-    header_hash = "NA"
+    __slots__ = ('header_hash',)
+
+    def __init__(self, line):
+        super(HashedHeader, self).__init__(line)
+        self.header_hash = "NA"
+
+    def __setstate__(self, state):
+        super(HashedHeader, self).__setstate__(state)
+        if isinstance(state, dict) and self.title != None and self.has_hash():
+            self.title = re.sub(self.header_hash + ':', '', self.title).strip()
+
     def get_hash(self):
         if self.header_hash == "NA":
-            self.header_hash = None
-            title = super(HashedHeader, self).get_title()
-            if re.compile(r"^[a-z0-9]{5}: ").match(title):
-                self.header_hash = title[0:5]
+            self.header_hash = self.get_token('hash')
         return self.header_hash
         
     def has_hash(self):
@@ -286,11 +330,10 @@ class HashedHeader(Header):
         return self.header_hash != None
 
     def get_title(self):
-        title = super(HashedHeader, self).get_title()
-        if self.has_hash():
-            tree_hash = self.get_hash()
-            title = re.sub(tree_hash + ':', '', title).strip()
-        return title
+        if self.title == None:
+            start, end = self.get_token_span('title')
+            self.title = self.line[start:end].strip()
+        return self.title
 
     def get_string(self):
         if self.title == None:
@@ -0,0 +1,669 @@
+import array
+import bisect
+import collections
+import datetime
+import re
+import sys
+from .tree import *
+from .data import OrgTreeData, PLANNING_PATTERN
+from .schedule import *
+from .columnar import ColumnarOrgTree
+
+FILETAGS_PATTERN = re.compile(r"^[ \t]*#\+FILETAGS:[ \t]*(?P<tags>.*)$", re.M | re.I)
+TAG_TERM_PATTERN = re.compile(r"(?P<sign>[+-]?)(?P<tag>[^\s+\-|&:]+)|(?P<and>&)")
+FILE_PROPERTY_PATTERN = re.compile(r"^[ \t]*#\+PROPERTY:[ \t]*(?P<key>[^\s:]+)(?:[ \t]+(?P<value>.*))?$", re.M | re.I)
+PROPERTY_CONDITION_PATTERN = re.compile(r"^\s*(?P<key>[^\s=<>!]+)\s*(?P<op><>|!=|==|<=|>=|=|<|>)\s*(?P<value>.*?)\s*$")
+NUMBER_PATTERN = re.compile(r"^[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$")
+DURATION_PATTERN = re.compile(r"^(?:(?P<days>\d+)d\s*)?(?P<hours>\d+):(?P<minutes>\d\d)(?::(?P<seconds>\d\d))?$")
+
+
+class MalformedTagExpression(Exception):
+    def __init__(self, message):
+        Exception.__init__(self, message)
+
+
+def parse_filetags(text):
+    """Tags declared by the #+FILETAGS lines of a file preamble."""
+    tags = []
+    for match in FILETAGS_PATTERN.finditer(text or ""):
+        for tag in re.split(r"[\s:]+", match.group('tags')):
+            if tag and tag not in tags:
+                tags.append(tag)
+    return tags
+
+
+def parse_file_properties(text):
+    """Properties set by the #+PROPERTY lines of a file preamble."""
+    properties = {}
+    for match in FILE_PROPERTY_PATTERN.finditer(text or ""):
+        properties[match.group('key')] = (match.group('value') or "").strip()
+    return properties
+
+
+def parse_property_value(value):
+    """Sort key of a property value that reads as a number, a duration or a date.
+
+    Durations (``1:30``, ``2d 4:00``) are counted in minutes and dates
+    (``<2013-08-11 Sun 10:00>``, ``2013-08-11``) in seconds since the
+    start of the proleptic Gregorian calendar.
+
+    :returns: tuple -- (kind, key) pair, None for any other value
+    """
+    value = value.strip()
+    if NUMBER_PATTERN.match(value):
+        return "number", float(value)
+    match = DURATION_PATTERN.match(value)
+    if match:
+        minutes = int(match.group('days') or 0) * 1440 + int(match.group('hours')) * 60 + int(match.group('minutes'))
+        return "duration", minutes + int(match.group('seconds') or 0) / 60.0
+    if not value.lstrip("<[")[:4].isdigit():
+        return None
+    if value[0] not in "<[":
+        value = "<%s>" % value
+    parsed = parse_timestamp(value)
+    if parsed == None or parsed.range_end != None:
+        return None
+    seconds = parsed.time.hour * 3600 + parsed.time.minute * 60 if parsed.time != None else 0
+    return "date", parsed.date.toordinal() * 86400.0 + seconds
+
+
+ORIGIN = datetime.datetime(1, 1, 1)
+
+
+def to_seconds(moment):
+    """Seconds from the start of the proleptic Gregorian calendar to a date or datetime."""
+    seconds = moment.toordinal() * 86400
+    if isinstance(moment, datetime.datetime):
+        seconds += moment.hour * 3600 + moment.minute * 60 + moment.second
+    return seconds
+
+
+def from_seconds(seconds):
+    return ORIGIN + datetime.timedelta(seconds=seconds - 86400)
+
+
+def get_interval(parsed):
+    """Seconds (first, last) covered by a parsed timestamp, both included.
+
+    A date covers its whole day, a time the instant it names and a time
+    with an end time runs up to it.  A range runs from the start of its
+    first stamp to the end of its second one.
+    """
+    first = parsed.date.toordinal() * 86400
+    if parsed.time == None:
+        last = first + 86399
+    else:
+        day = first
+        first += parsed.time.hour * 3600 + parsed.time.minute * 60
+        last = first
+        if parsed.end_time != None:
+            last = max(first, day + parsed.end_time.hour * 3600 + parsed.end_time.minute * 60)
+    if parsed.range_end != None:
+        last = max(last, get_interval(parsed.range_end)[1])
+    return first, last
+
+
+def iter_planning(raw):
+    """SCHEDULED and DEADLINE stamps of the planning line of a body.
+
+    Only the first stamp of each keyword counts and a DEADLINE range is
+    cut to its first stamp.
+
+    :returns:  iterator -- (keyword, timestamp, parsed, first, last) tuples,
+               see get_interval for first and last
+    """
+    planning = OrgTreeData(raw).get_planning_line()
+    if planning == None:
+        return
+    seen = []
+    for match in PLANNING_PATTERN.finditer(planning):
+        keyword = match.group('keyword')
+        if keyword == "CLOSED" or keyword in seen:
+            continue
+        seen.append(keyword)
+        timestamp = match.group('timestamp')
+        parsed = parse_timestamp(timestamp)
+        if parsed == None:
+            continue
+        if keyword == "DEADLINE" and parsed.range_end != None:
+            parsed = parsed._replace(range_end=None)
+        first, last = get_interval(parsed)
+        yield keyword, timestamp, parsed, first, last
+
+
+def parse_tag_expression(expression):
+    """Split an Org tag match such as ``+work-someday|urgent`` into terms.
+
+    The expression is a ``|`` separated list of alternatives; each one is
+    a sequence of tags, ``+tag`` or a bare tag to require it and ``-tag``
+    to exclude it, optionally joined with ``&``.
+
+    :returns:  list -- (required tags, excluded tags) pair per alternative
+    """
+    terms = []
+    for alternative in expression.split("|"):
+        required, excluded = [], []
+        position = 0
+        alternative = alternative.strip()
+        while position < len(alternative):
+            match = TAG_TERM_PATTERN.match(alternative, position)
+            if match == None:
+                raise MalformedTagExpression("Malformed tag expression: %s" % expression)
+            if match.group('tag'):
+                (excluded if match.group('sign') == "-" else required).append(match.group('tag'))
+            position = match.end()
+        if not required and not excluded:
+            raise MalformedTagExpression("Malformed tag expression: %s" % expression)
+        terms.append((required, excluded))
+    return terms
+
+
+class TreeIndex(object):
+    """Document order numbering shared by the indexes of this module.
+
+    Positions follow document order with the root at 0, so the subtree
+    of the heading at position p is the run [p, p + sizes[p]).  For a
+    ColumnarOrgTree the positions are its row numbers and the parent and
+    size columns are used as they are.  The index is rebuilt lazily on
+    the first query after nodes were linked or unlinked.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.version = None
+        self.nodes = None
+        self.positions = None
+        self.parents = None
+        self.sizes = None
+
+    def rebuild(self):
+        if isinstance(self.root, ColumnarOrgTree):
+            self.nodes = None
+            self.positions = None
+            self.parents = self.root.columns['parent']
+            self.sizes = self.root.columns['size']
+        else:
+            nodes = []
+            parents = array.array('l')
+            stack = [(self.root, -1)]
+            while stack:
+                node, parent = stack.pop()
+                position = len(nodes)
+                nodes.append(node)
+                parents.append(parent)
+                if node.children:
+                    stack.extend((child, position) for child in reversed(node.children))
+            sizes = array.array('l', [1]) * len(nodes)
+            for position in range(len(nodes) - 1, 0, -1):
+                sizes[parents[position]] += sizes[position]
+            self.nodes = nodes
+            self.positions = dict((node, position) for position, node in enumerate(nodes))
+            self.parents = parents
+            self.sizes = sizes
+        self.version = self.root.get_structure_version()
+        self.build()
+
+    def build(self):
+        pass
+
+    def check(self):
+        if self.version != self.root.get_structure_version():
+            self.rebuild()
+
+    def __len__(self):
+        self.check()
+        return len(self.parents)
+
+    def get_node(self, position):
+        if self.nodes == None:
+            return self.root.node(position)
+        return self.nodes[position]
+
+    def get_position(self, node):
+        self.check()
+        if self.positions == None:
+            return node.index
+        return self.positions[node]
+
+    def iter_bodies(self, *markers):
+        """(position, body) of the headings whose body contains one of markers.
+
+        On a ColumnarOrgTree the markers are searched for in the source
+        bytes, so that only the bodies containing them are decoded.
+        """
+        if self.nodes != None:
+            for position in range(1, len(self.nodes)):
+                raw = self.nodes[position].get_raw_data()
+                if raw and any(marker in raw for marker in markers):
+                    yield position, raw
+            return
+        store = self.root
+        body_offset = store.columns['body_offset']
+        body_end = store.columns['body_end']
+        rows = set()
+        for marker in markers:
+            marker = marker.encode('utf-8')
+            start = store.source.find(marker)
+            while start != -1:
+                row = bisect.bisect_right(body_offset, start) - 1
+                if row > 0 and start < body_end[row]:
+                    rows.add(row)
+                    start = body_end[row]
+                else:
+                    start += 1
+                start = store.source.find(marker, start)
+        for row in sorted(rows):
+            yield row, store.decode(body_offset[row], body_end[row])
+
+
+class TagIndex(TreeIndex):
+    """Effective (inherited) tags of every heading of a tree.
+
+    A heading inherits the tags of its ancestors and the #+FILETAGS of
+    the root (of its file root in an OrgForest), except those listed in
+    exclude_from_inheritance.  Tags are
+    numbered in a shared vocabulary and the effective tags of a heading
+    are kept as an int bitset.  Headings with the same effective tags
+    share one group, so a tag match is evaluated once per distinct tag
+    set rather than once per heading.  Call rebuild() after editing tags.
+    """
+
+    def __init__(self, root, exclude_from_inheritance=()):
+        super(TagIndex, self).__init__(root)
+        self.exclude_from_inheritance = set(exclude_from_inheritance)
+        self.vocabulary = None
+        self.tags = None
+        self.masks = None
+        self.groups = None
+
+    def get_bit(self, tag):
+        bit = self.vocabulary.get(tag)
+        if bit == None:
+            bit = self.vocabulary[tag] = 1 << len(self.tags)
+            self.tags.append(sys.intern(tag))
+        return bit
+
+    def get_mask(self, tags):
+        mask = 0
+        for tag in tags:
+            mask |= self.get_bit(tag)
+        return mask
+
+    def build(self):
+        self.vocabulary = {}
+        self.tags = []
+        self.groups = {}
+        not_inherited = ~self.get_mask(self.exclude_from_inheritance)
+        filetags = parse_filetags(self.root.get_data()) if self.root.get_header() == None else []
+        root_mask = self.get_mask(filetags)
+        headerless = set()
+        if self.nodes == None:
+            tagset_masks = [self.get_mask(tags) for tags in self.root.tagsets]
+            own = [tagset_masks[tagset] for tagset in self.root.columns['tagset']]
+        else:
+            own = [0]
+            for position in range(1, len(self.nodes)):
+                node = self.nodes[position]
+                header = node.get_header()
+                if header != None:
+                    own.append(self.get_mask(header.get_tags()))
+                else:
+                    own.append(self.get_mask(parse_filetags(node.get_data())))
+                    headerless.add(position)
+        parents = self.parents
+        groups = self.groups
+        masks = self.masks = array.array('l') if len(self.tags) < 63 else []
+        masks.append(root_mask)
+        for position in range(1, len(own)):
+            mask = (masks[parents[position]] & not_inherited) | own[position]
+            masks.append(mask)
+            if position in headerless:
+                continue
+            group = groups.get(mask)
+            if group == None:
+                group = groups[mask] = array.array('l')
+            group.append(position)
+
+    def get_tags(self, node):
+        """Effective tags of node in vocabulary order."""
+        position = self.get_position(node)
+        mask = self.masks[position]
+        return [tag for i, tag in enumerate(self.tags) if mask >> i & 1]
+
+    def has_tag(self, node, tag):
+        position = self.get_position(node)
+        bit = self.vocabulary.get(tag)
+        return bit != None and self.masks[position] & bit != 0
+
+    def compile(self, expression):
+        """Turn a tag match into (required mask, excluded mask) pairs.
+
+        Alternatives requiring a tag no heading carries can never match
+        and are dropped; excluded unknown tags are ignored.
+        """
+        self.check()
+        compiled = []
+        for required, excluded in parse_tag_expression(expression):
+            if any(tag not in self.vocabulary for tag in required):
+                continue
+            required_mask = sum(self.vocabulary[tag] for tag in set(required))
+            excluded_mask = sum(self.vocabulary[tag] for tag in set(excluded) if tag in self.vocabulary)
+            compiled.append((required_mask, excluded_mask))
+        return compiled
+
+    def match_masks(self, expression):
+        """Distinct effective tag sets (as bitsets) that satisfy expression."""
+        terms = self.compile(expression)
+        return [mask for mask in self.groups
+                if any(mask & required == required and not mask & excluded for required, excluded in terms)]
+
+    def match_positions(self, expression):
+        """Document order positions of the headings matching expression."""
+        groups = [self.groups[mask] for mask in self.match_masks(expression)]
+        if len(groups) == 1:
+            return groups[0].tolist()
+        positions = []
+        for group in groups:
+            positions.extend(group)
+        positions.sort()
+        return positions
+
+    def match(self, expression):
+        """Headings matching an Org tag expression such as ``+work-someday|urgent``, in document order."""
+        return [self.get_node(position) for position in self.match_positions(expression)]
+
+    def count(self, expression):
+        return sum(len(self.groups[mask]) for mask in self.match_masks(expression))
+
+    def get_trees_by_tag(self, tag):
+        """Headings carrying tag directly or by inheritance."""
+        return self.match("+" + tag)
+
+
+class PropertyIndex(TreeIndex):
+    """Inverted index of the property drawers of a tree.
+
+    Keys are case-insensitive and kept upper-cased.  Every key maps its
+    values to the positions of the headings that set them, and values
+    that read as numbers, durations or dates also go into a sorted
+    column per key and kind, so that an equality test is a dictionary
+    lookup and a comparison a bisection.  The #+PROPERTY lines of the
+    preamble are the properties of the root, position 0, which is never
+    part of a result itself.
+
+    The effective (inherited) properties of every heading are built in
+    the same pass; a heading without a drawer shares the dict of its
+    parent.  Queries with inherit=True widen every matching heading to
+    its subtree, minus the subtrees that set the key again.
+    """
+
+    def __init__(self, root):
+        super(PropertyIndex, self).__init__(root)
+        self.values = None
+        self.definers = None
+        self.columns = None
+        self.sorted_values = None
+        self.own = None
+        self.effective = None
+
+    def build(self):
+        self.values = {}
+        self.definers = {}
+        self.columns = {}
+        self.sorted_values = {}
+        self.own = {}
+        file_properties = parse_file_properties(self.root.get_data()) if self.root.get_header() == None else {}
+        drawers = [(0, file_properties)] if file_properties else []
+        for position, raw in self.iter_bodies(":PROPERTIES:"):
+            properties = OrgTreeData(raw).get_properties()
+            if properties:
+                drawers.append((position, properties))
+        columns = {}
+        parsed_values = {}
+        for position, properties in drawers:
+            own = self.own[position] = dict((sys.intern(key.upper()), value) for key, value in properties.items())
+            for key, value in own.items():
+                self.definers.setdefault(key, array.array('l')).append(position)
+                values = self.values.setdefault(key, {})
+                positions = values.get(value)
+                if positions == None:
+                    positions = values[value] = array.array('l')
+                positions.append(position)
+                if value in parsed_values:
+                    parsed = parsed_values[value]
+                else:
+                    parsed = parsed_values[value] = parse_property_value(value)
+                if parsed != None:
+                    columns.setdefault((key, parsed[0]), []).append((parsed[1], position))
+        for name, entries in columns.items():
+            entries.sort()
+            self.columns[name] = (array.array('d', [entry[0] for entry in entries]),
+                                  array.array('l', [entry[1] for entry in entries]))
+        parents = self.parents
+        own_properties = self.own.get
+        effective = self.effective = [own_properties(0, {})]
+        append = effective.append
+        for position in range(1, len(parents)):
+            own = own_properties(position)
+            inherited = effective[parents[position]]
+            if own == None:
+                append(inherited)
+            elif inherited:
+                merged = dict(inherited)
+                merged.update(own)
+                append(merged)
+            else:
+                append(own)
+
+    def get_property(self, node, key, inherit=False):
+        position = self.get_position(node)
+        properties = self.effective[position] if inherit else self.own.get(position, {})
+        return properties.get(key.upper())
+
+    def get_inherited_properties(self, node):
+        """Effective properties of node; the dict is shared and must not be modified."""
+        position = self.get_position(node)
+        return self.effective[position]
+
+    def get_keys(self):
+        self.check()
+        return sorted(self.definers)
+
+    def get_values(self, key):
+        self.check()
+        return sorted(self.values.get(key.upper(), ()))
+
+    def find(self, key, value, inherit=False):
+        """Positions of the headings whose key property is exactly value."""
+        self.check()
+        key = key.upper()
+        positions = list(self.values.get(key, {}).get(value, ()))
+        return self.finish(key, positions, inherit)
+
+    def get_by_id(self, identifier):
+        positions = self.find("ID", identifier)
+        return self.get_node(positions[0]) if positions else None
+
+    def compare(self, key, op, value, inherit=False):
+        """Positions of the headings whose key property compares to value.
+
+        op is one of ``= == <> != < <= > >=``.  A value in double quotes
+        is compared as a string unless it is a timestamp; an unquoted
+        number, duration or date is compared with the values of the same
+        kind, others as strings.
+        """
+        self.check()
+        key = key.upper()
+        quoted = len(value) > 1 and value[0] == value[-1] == '"'
+        if quoted:
+            value = value[1:-1]
+        parsed = parse_property_value(value)
+        if parsed != None and quoted and parsed[0] != "date":
+            parsed = None
+        if parsed == None:
+            column = self.sorted_values.get(key)
+            if column == None:
+                column = self.sorted_values[key] = sorted(self.values.get(key, ()))
+            values = self.values.get(key, {})
+            positions = []
+            for start, stop in self.get_slices(column, op, value):
+                for matched in column[start:stop]:
+                    positions.extend(values[matched])
+        else:
+            column, column_positions = self.columns.get((key, parsed[0]), ((), ()))
+            positions = []
+            for start, stop in self.get_slices(column, op, parsed[1]):
+                positions.extend(column_positions[start:stop])
+        positions.sort()
+        return self.finish(key, positions, inherit)
+
+    def get_slices(self, column, op, value):
+        if op in ("=", "=="):
+            return [(bisect.bisect_left(column, value), bisect.bisect_right(column, value))]
+        if op in ("<>", "!="):
+            return [(0, bisect.bisect_left(column, value)), (bisect.bisect_right(column, value), len(column))]
+        if op == "<":
+            return [(0, bisect.bisect_left(column, value))]
+        if op == "<=":
+            return [(0, bisect.bisect_right(column, value))]
+        if op == ">":
+            return [(bisect.bisect_right(column, value), len(column))]
+        if op == ">=":
+            return [(bisect.bisect_left(column, value), len(column))]
+        raise ValueError("Unknown comparison operator: %s" % op)
+
+    def finish(self, key, positions, inherit):
+        if inherit:
+            positions = self.inherit(key, positions)
+        if positions and positions[0] == 0:
+            del positions[0]
+        return positions
+
+    def inherit(self, key, positions):
+        """Widen the headings setting key to the descendants that do not set it again."""
+        definers = self.definers.get(key, ())
+        sizes = self.sizes
+        result = []
+        for start in positions:
+            end = start + sizes[start]
+            position = start
+            i = bisect.bisect_right(definers, start)
+            while i < len(definers) and definers[i] < end:
+                redefined = definers[i]
+                result.extend(range(position, redefined))
+                position = redefined + sizes[redefined]
+                i = bisect.bisect_left(definers, position, i)
+            result.extend(range(position, end))
+        result.sort()
+        return result
+
+    def match_positions(self, condition, inherit=False):
+        match = PROPERTY_CONDITION_PATTERN.match(condition)
+        if match == None:
+            raise ValueError("Malformed property condition: %s" % condition)
+        return self.compare(match.group('key'), match.group('op'), match.group('value'), inherit)
+
+    def match(self, condition, inherit=False):
+        """Headings matching a condition such as ``EFFORT>1:00`` or ``CATEGORY="ops"``, in document order."""
+        return [self.get_node(position) for position in self.match_positions(condition, inherit)]
+
+
+TimeEntry = collections.namedtuple('TimeEntry', ['keyword', 'start', 'end', 'node', 'timestamp'])
+
+
+class TimeIndex(TreeIndex):
+    """Sorted index of the SCHEDULED and DEADLINE stamps of a tree.
+
+    Every stamp becomes an interval of seconds (see get_interval) kept in
+    arrays sorted by start.  Intervals shorter than a day, which is
+    nearly all of them, and longer ranges are kept apart, each with the
+    span of its longest interval, so that a window query is a bisection
+    of each tier over [window start - longest span, window end) and a
+    few long ranges do not widen the scan of the day-sized stamps.
+
+    Only the planning lines of the bodies containing a planning keyword
+    are parsed, straight into intervals; Schedule and Deadline objects
+    are made on demand by get_stamp().  The numbers of the stamps with a
+    repeater or a delay are kept in modified; their intervals are those
+    of the first occurrence.
+    """
+    day = 86400
+
+    def __init__(self, root):
+        super(TimeIndex, self).__init__(root)
+        self.keywords = None
+        self.timestamps = None
+        self.starts = None
+        self.ends = None
+        self.entry_positions = None
+        self.modified = None
+        self.tiers = None
+
+    def build(self):
+        entries = []
+        for position, raw in self.iter_bodies("SCHEDULED:", "DEADLINE:"):
+            for keyword, timestamp, parsed, first, last in iter_planning(raw):
+                entries.append((first, position, last, keyword, timestamp,
+                                parsed.repeater != None or parsed.delay != None))
+        entries.sort()
+        self.keywords = [sys.intern(entry[3]) for entry in entries]
+        self.timestamps = [entry[4] for entry in entries]
+        self.starts = array.array('q', [entry[0] for entry in entries])
+        self.ends = array.array('q', [entry[2] for entry in entries])
+        self.entry_positions = array.array('l', [entry[1] for entry in entries])
+        self.modified = set(number for number, entry in enumerate(entries) if entry[5])
+        short, long = array.array('l'), array.array('l')
+        for number, entry in enumerate(entries):
+            (short if entry[2] - entry[0] < self.day else long).append(number)
+        self.tiers = []
+        for numbers in (short, long):
+            if numbers:
+                starts = array.array('q', [self.starts[number] for number in numbers])
+                ends = array.array('q', [self.ends[number] for number in numbers])
+                span = max(end - start for start, end in zip(starts, ends))
+                self.tiers.append((starts, ends, numbers, span))
+
+    def __len__(self):
+        self.check()
+        return len(self.timestamps)
+
+    def find_entries(self, start, end, keyword=None):
+        """Numbers of the stamps overlapping [start, end), ordered by start.
+
+        start and end are dates or datetimes; a date stands for its
+        midnight.  keyword restricts the result to SCHEDULED or DEADLINE.
+        """
+        self.check()
+        first, stop = to_seconds(start), to_seconds(end)
+        result = []
+        for starts, ends, numbers, span in self.tiers:
+            low = bisect.bisect_left(starts, first - span)
+            high = bisect.bisect_left(starts, stop, low)
+            result.extend(numbers[i] for i in range(low, high) if ends[i] >= first)
+        if len(self.tiers) > 1:
+            result.sort()
+        if keyword != None:
+            keywords = self.keywords
+            result = [number for number in result if keywords[number] == keyword]
+        return result
+
+    def get_stamp(self, number):
+        """Schedule or Deadline object of a stamp."""
+        string = "%s: %s" % (self.keywords[number], self.timestamps[number])
+        if self.keywords[number] == "DEADLINE":
+            return DeadlineAbstractFactory.get_deadline(string)
+        return ScheduleAbstractFactory.get_schedule(string)
+
+    def query(self, start, end, keyword=None):
+        """Stamps scheduled or due in [start, end), ranges overlapping it included.
+
+        :returns: list -- TimeEntry tuples ordered by start
+        """
+        numbers = self.find_entries(start, end, keyword)
+        starts, ends, positions = self.starts, self.ends, self.entry_positions
+        keywords, timestamps, get_node = self.keywords, self.timestamps, self.get_node
+        return [TimeEntry(keywords[number], from_seconds(starts[number]), from_seconds(ends[number]),
+                          get_node(positions[number]), timestamps[number]) for number in numbers]
+
+    def count(self, start, end, keyword=None):
+        return len(self.find_entries(start, end, keyword))
@@ -3,67 +3,552 @@ import re
 import datetime
 import os
 import pickle
+import itertools
+import json
+import mmap
+import io
+import bisect
+import gc
+import concurrent.futures
 from .tree import *
 from .header import *
 from .schedule import *
 from .data import *
+from .events import *
+from .source import *
+from .query import compile_query
+from .columnar import COLUMNS
+from .binary import columns_from_tree, write_binary, read_binary, MalformedBinaryTree
 
 
 class OrgTreeReader(object):
+    __slots__ = ()
 
-    def read_from_file(self, filename, line_number, level, tag_dict=None):
-        if tag_dict:
+    def new_header(self, line):
+        return Header(line)
+
+    def new_tree(self):
+        return OrgTree()
+
+    def register_tree(self, tree):
+        tree.tag_dict = self.tag_dict
+        header = tree.get_header()
+        if header.has_tags():
+            for tag in header.get_tags():
+                if tag not in self.tag_dict:
+                    self.tag_dict[tag] = []
+                self.tag_dict[tag].append(tree)
+
+    def read_from_file(self, filename, line_number=0, level=0, tag_dict=None):
+        if tag_dict is not None:
             self.tag_dict = tag_dict
+        with open_source(filename) as lines:
+            return self.read_from_lines(lines, line_number, level)
+
+    def read_from_stream(self, stream, line_number=0, level=0):
+        """Read from a text or binary file object, e.g. sys.stdin.
+
+        gzip, bz2 and xz compressed input is decompressed while it is read.
+        """
+        with open_source(stream) as lines:
+            return self.read_from_lines(lines, line_number, level)
+
+    def read_from_string(self, text, line_number=0, level=0):
+        return self.read_from_lines(io.StringIO(text, newline=None), line_number, level)
+
+    def read_from_lines(self, lines, line_number=0, level=0):
+        """Build the tree from an iterable of lines in a single pass.
+
+        Open trees are kept on an explicit stack together with the list of
+        their body lines, which are joined once the tree is closed.
+
+        :returns:  int -- index of the first line belonging to a tree at or
+                   above ``level``, or None if the input was exhausted
+        """
         self.level = level
         if self.level == 0:
             self.parent = None
-        data = open(filename, 'r').readlines()
-        tree_start_pattern = re.compile("^\*{1,} ")
-        i = line_number
-        while i < len(data):
-            line = data[i]
-            if tree_start_pattern.match(line):
-                header = Header(line)
-                new_level = header.get_level()
-                if new_level > self.level:
-                    new_child = OrgTree()
-                    new_child.set_parent(self)
-                    new_child.set_header(header)
-                    if header.has_tags():
-                        for tag in header.get_tags():
-                            if tag not in self.tag_dict:
-                                self.tag_dict[tag] = []
-                            self.tag_dict[tag].append(new_child)
-                    self.add_child(new_child)
-                    continue_from  = new_child.read_from_file(filename, i+1, new_level, tag_dict=self.tag_dict)
-                    if not continue_from:
-                        break
-                    i = continue_from
-                else:
-                    return i
+        stack = [self]
+        bodies = [[]]
+        stop = None
+        for i, line in enumerate(itertools.islice(lines, line_number, None), line_number):
+            if not is_header_line(line):
+                bodies[-1].append(line)
+                continue
+            header = self.new_header(line)
+            new_level = header.get_level()
+            while new_level <= stack[-1].level and len(stack) > 1:
+                tree = stack.pop()
+                tree.raw_data += "".join(bodies.pop())
+            if new_level <= stack[-1].level:
+                stop = i
+                break
+            stack.append(self.add_tree(stack[-1], header))
+            bodies.append([])
+        while stack:
+            tree = stack.pop()
+            tree.raw_data += "".join(bodies.pop())
+        self.structure_changed()
+        return stop
+
+    def unregister_trees(self, trees):
+        """Remove trees from tag_dict, filtering each affected tag list once."""
+        removed = {}
+        for tree in trees:
+            header = tree.get_header()
+            if header.has_tags():
+                for tag in header.get_tags():
+                    removed.setdefault(tag, set()).add(tree)
+        for tag, removed_trees in removed.items():
+            trees = self.tag_dict.get(tag)
+            if trees == None:
+                continue
+            trees[:] = [tree for tree in trees if tree not in removed_trees]
+            if not trees:
+                del self.tag_dict[tag]
+
+    def add_tree(self, parent, header):
+        """Link a new tree for header below parent.
+
+        The structure version is not bumped here; the reader calls
+        structure_changed() once when its pass is done.
+        """
+        new_child = self.new_tree()
+        new_child.level = header.get_level()
+        new_child.parent = parent
+        new_child.set_header(header)
+        self.register_tree(new_child)
+        parent.children.append(new_child)
+        return new_child
+
+    def read_from_mmap(self, filename):
+        """Build the tree skeleton over a memory-mapped file.
+
+        Only the header lines are decoded.  Every tree records the byte
+        spans of its header and body in the mapped file and its body is
+        decoded by get_raw_data() when it is first needed.
+        """
+        self.level = 0
+        self.parent = None
+        with open(filename, 'rb') as inp:
+            if os.fstat(inp.fileno()).st_size == 0:
+                return None
+            source = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.source = source
+        self.raw_data = None
+        stack = [self]
+        body_start = 0
+        for match in HEADER_BYTES_PATTERN.finditer(source):
+            start = match.start()
+            stack[-1].body_span = (body_start, start)
+            end = source.find(b"\n", start)
+            end = len(source) if end == -1 else end + 1
+            header = self.new_header(source[start:end].decode('utf-8'))
+            while header.get_level() <= stack[-1].level:
+                stack.pop()
+            tree = self.add_tree(stack[-1], header)
+            tree.source = source
+            tree.raw_data = None
+            tree.header_span = (start, end)
+            stack.append(tree)
+            body_start = end
+        stack[-1].body_span = (body_start, len(source))
+        self.structure_changed()
+        return None
+
+    def read_from_file_parallel(self, filename, processes=None, chunks=None):
+        """Parse a large file in worker processes.
+
+        The file is cut at top-level (``* ``) headings into roughly equal
+        chunks, each chunk is parsed on its own and the resulting subtrees
+        and indexes are joined in document order.  The result is the same
+        as read_from_file(filename).
+
+        :param processes: number of worker processes, None for one per CPU;
+                          1 parses the chunks in the calling process
+        :param chunks: number of chunks, four per process by default
+        """
+        self.level = 0
+        self.parent = None
+        with open(filename, 'rb') as inp:
+            size = os.fstat(inp.fileno()).st_size
+            if size == 0:
+                return None
+            if decompress_stream(inp) is not inp:
+                return self.read_from_file(filename)
+            with mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ) as source:
+                boundaries = [match.start() for match in TOP_HEADER_BYTES_PATTERN.finditer(source)]
+        if chunks == None:
+            chunks = 4 * (processes or os.cpu_count() or 1)
+        edges = [0]
+        for k in range(1, chunks):
+            index = bisect.bisect_left(boundaries, size * k // chunks)
+            if index < len(boundaries) and boundaries[index] > edges[-1]:
+                edges.append(boundaries[index])
+        edges.append(size)
+        jobs = [(self.__class__, filename, start, end) for start, end in zip(edges, edges[1:])]
+        if processes == 1 or len(jobs) == 1:
+            results = map(_read_chunk, jobs)
+            for chunk in results:
+                self.merge_chunk(chunk)
+            return None
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+            for chunk in executor.map(_read_chunk, jobs):
+                self.merge_chunk(chunk)
+        return None
+
+    def merge_chunk(self, chunk):
+        self.raw_data += chunk.raw_data
+        for child in chunk.get_children():
+            child.set_parent(self)
+            self.add_child(child)
+        for tag, trees in chunk.get_tag_dict().items():
+            if tag not in self.tag_dict:
+                self.tag_dict[tag] = []
+            self.tag_dict[tag].extend(trees)
+        for tree in chunk:
+            tree.tag_dict = self.tag_dict
+
+
+def _read_chunk(job):
+    tree_class, filename, start, end = job
+    with open(filename, 'rb') as inp:
+        inp.seek(start)
+        text = inp.read(end - start).decode('utf-8')
+    tree = tree_class()
+    tree.read_from_lines(io.StringIO(text, newline=None))
+    return tree
+
+def count_lines(text):
+    if not text:
+        return 0
+    return text.count("\n") + (0 if text.endswith("\n") else 1)
+
+
+class OrgTreeEditor(object):
+    __slots__ = ()
+
+    def get_line_count(self):
+        """Number of document lines in this tree, its body and its subtrees."""
+        if self.line_count == None:
+            for tree in self.iter_postorder(lambda tree: tree.line_count != None):
+                count = 0 if tree.header == None else 1
+                count += count_lines(tree.get_raw_data())
+                for child in tree.children:
+                    count += child.line_count
+                tree.line_count = count
+        return self.line_count
+
+    def iter_source_lines(self):
+        for tree in self:
+            if tree.header != None:
+                yield tree.header.line + "\n"
+            for line in tree.get_raw_data().splitlines(True):
+                yield line
+
+    def reparse_lines(self, start, end, text):
+        """Replace document lines [start, end) with text and reparse.
+
+        Only the smallest subtree enclosing the edit is reparsed, its parent
+        is expanded only if the new text would change how the surrounding
+        headings nest.  tag_dict (and tree_dict) are updated for the removed
+        and added trees only; trees added by an edit are inserted into the
+        tag_dict lists at their place in document order.  Must be called on
+        the root tree.
+
+        :returns:  list -- the trees spliced in place of the old subtree
+        """
+        if self.header != None:
+            raise ValueError("reparse_lines must be called on the root tree")
+        new_lines = text.splitlines(True)
+        path = []
+        tree, offset = self, 0
+        while True:
+            position = offset + (0 if tree.header == None else 1) + count_lines(tree.get_raw_data())
+            for child in tree.children:
+                count = child.get_line_count()
+                if position <= start and end <= position + count:
+                    path.append((tree, offset))
+                    tree, offset = child, position
+                    break
+                position += count
             else:
-               self.raw_data += line
-               i += 1
+                break
+        body_start = offset + (0 if tree.header == None else 1)
+        body = tree.get_raw_data()
+        if body_start <= start and end <= body_start + count_lines(body) and not any(is_header_line(line) for line in new_lines):
+            lines = body.splitlines(True)
+            lines[start - body_start:end - body_start] = new_lines
+            tree.raw_data = "".join(lines)
+            tree.data = None
+            tree.properties = None
+            node = tree
+            while node != None:
+                node.line_count = None
+                node = node.parent
+            return [tree]
+        while path:
+            lines = list(tree.iter_source_lines())
+            lines[start - offset:end - offset] = new_lines
+            replacement = self._reparse_subtree(tree, lines)
+            if replacement != None:
+                return replacement
+            tree, offset = path.pop()
+        lines = list(self.iter_source_lines())
+        lines[start:end] = new_lines
+        self.unregister_trees([tree for child in self.children for tree in child])
+        self.children = []
+        self.structure_changed()
+        self.raw_data = ""
+        self.data = None
+        self.properties = None
+        self.line_count = None
+        self.read_from_lines(lines, 0, self.level)
+        return self.children
+
+    def _reparse_subtree(self, tree, lines):
+        parent = tree.parent
+        siblings = parent.children
+        index = siblings.index(tree)
+        if lines and not is_header_line(lines[0]):
+            return None
+        if lines and index > 0 and self.new_header(lines[0]).get_level() > siblings[index - 1].level:
+            return None
+        fragment = self.new_tree()
+        if fragment.read_from_lines(lines, 0, parent.level) != None:
+            return None
+        next_level = None
+        node = tree
+        while node is not self:
+            position = node.parent.children.index(node)
+            if position + 1 < len(node.parent.children):
+                next_level = node.parent.children[position + 1].level
+                break
+            node = node.parent
+        if next_level != None:
+            node = fragment
+            while node.children:
+                node = node.children[-1]
+                if node.level < next_level:
+                    return None
+        self.unregister_trees(list(tree))
+        for child in fragment.children:
+            child.parent = parent
+            for new_tree in child:
+                self.register_tree(new_tree)
+        siblings[index:index + 1] = fragment.children
+        parent.structure_changed()
+        self._order_tag_lists([new_tree for child in fragment.children for new_tree in child])
+        node = parent
+        while node != None:
+            node.line_count = None
+            node = node.parent
+        return fragment.children
+
+    def _order_tag_lists(self, new_trees):
+        """Move new_trees, just appended to the tag_dict lists, to their place in document order.
+
+        The new trees follow each other in document order, so each list
+        takes them as one block at the place found by bisection over
+        the sibling numbers on the path from the root.
+        """
+        counts = {}
+        for tree in new_trees:
+            if tree.header.has_tags():
+                for tag in tree.header.get_tags():
+                    counts[tag] = counts.get(tag, 0) + 1
+        sibling_numbers = {}
+
+        def get_path(node):
+            path = []
+            while node.parent != None:
+                numbers = sibling_numbers.get(node.parent)
+                if numbers == None:
+                    numbers = sibling_numbers[node.parent] = dict((child, i) for i, child in
+                                                                  enumerate(node.parent.children))
+                path.append(numbers[node])
+                node = node.parent
+            path.reverse()
+            return path
+
+        for tag, count in counts.items():
+            trees = self.tag_dict[tag]
+            if len(trees) == count:
+                continue
+            added = trees[len(trees) - count:]
+            del trees[len(trees) - count:]
+            key = get_path(added[0])
+            low, high = 0, len(trees)
+            while low < high:
+                middle = (low + high) // 2
+                if get_path(trees[middle]) < key:
+                    low = middle + 1
+                else:
+                    high = middle
+            trees[low:low] = added
+
 
 class OrgTreeWriter(object):
+    """Lossless, atomic writing of a tree.
+
+    Headers that were not changed through their setters are written as
+    they were read (Header.source_line) and only changed ones are
+    regenerated with get_string(); bodies are written as they are.
+    Trees read with read_from_mmap() copy their untouched headlines and
+    bodies straight from the mapped file, consecutive ones in a single
+    slice, so saving a file with a few edits is mostly a copy.
+    """
+    __slots__ = ()
+    write_buffer_size = 1 << 20
+
+    def iter_source_bytes(self):
+        """The document as chunks of UTF-8 bytes, root preamble included."""
+        mapped, start, end = None, 0, 0
+        for tree in self:
+            header = tree.header
+            pieces = []
+            if header != None:
+                if header.source_line != None and tree.header_span != None and tree.source != None:
+                    pieces.append(tree.header_span)
+                elif header.source_line != None:
+                    pieces.append((header.source_line + "\n").encode('utf-8'))
+                else:
+                    pieces.append((header.get_string() + "\n").encode('utf-8'))
+            if tree.raw_data == None and tree.source != None:
+                pieces.append(tree.body_span)
+            elif tree.raw_data:
+                pieces.append(tree.raw_data.encode('utf-8'))
+            for piece in pieces:
+                if piece.__class__ is tuple:
+                    if tree.source is mapped and piece[0] == end and end - start < 16 * self.write_buffer_size:
+                        end = piece[1]
+                        continue
+                    if end > start:
+                        yield mapped[start:end]
+                    mapped, (start, end) = tree.source, piece
+                    continue
+                if end > start:
+                    yield mapped[start:end]
+                    mapped, start, end = None, 0, 0
+                yield piece
+        if end > start:
+            yield mapped[start:end]
+
     def write_to_file(self, filename):
-        out = open(filename, 'w')
-        tree_sequence = []
-        children = self.get_children()
-        for item in self:
-            if not item.get_header():
+        """Write the tree to filename atomically, see source.atomic_output."""
+        with atomic_output(filename, self.write_buffer_size) as out:
+            for chunk in self.iter_source_bytes():
+                out.write(chunk)
+
+
+class PlainSerializableOrgTree(object):
+    """JSON export and import of a tree, streamed one node at a time.
+
+    Every node is a flat record with the id of its parent, so records
+    can be written and read in document order without holding more than
+    the path to the current node: id (document order, 0 for the root),
+    parent, level, hash (hashed trees only), keyword, priority, title,
+    tags, properties, scheduled, deadline (Org timestamp strings),
+    headline and body.  headline and body are what the importer rebuilds
+    the tree from; the other fields are for consumers of the export.
+    """
+    __slots__ = ()
+
+    def iter_json_records(self):
+        stack = []
+        for node_id, tree in enumerate(self):
+            while stack and stack[-1][0] is not tree.parent:
+                stack.pop()
+            header = tree.get_header()
+            body = tree.get_raw_data() or ""
+            record = {
+                'id': node_id,
+                'parent': stack[-1][1] if stack else None,
+                'level': tree.level,
+            }
+            if isinstance(header, HashedHeader):
+                record['hash'] = header.get_hash()
+            if header == None:
+                record.update(keyword=None, priority=None, title=None, tags=[], properties={},
+                              scheduled=None, deadline=None, headline=None)
+            else:
+                data = OrgTreeData(body)
+                record.update(keyword=header.get_type(), priority=header.get_priority(), title=header.get_title(),
+                              tags=list(header.get_tags()), properties=data.get_properties(),
+                              scheduled=get_planning_timestamp(data, "SCHEDULED"),
+                              deadline=get_planning_timestamp(data, "DEADLINE"),
+                              headline=header.get_string() if header.is_modified() else header.line)
+            record['body'] = body
+            stack.append((tree, node_id))
+            yield record
+
+    def iter_ndjson(self):
+        """NDJSON export: one record per line."""
+        for record in self.iter_json_records():
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    def iter_json(self):
+        """JSON export: an array with one record per line."""
+        separator = "[\n"
+        for record in self.iter_json_records():
+            yield separator + json.dumps(record, ensure_ascii=False)
+            separator = ",\n"
+        yield "\n]\n"
+
+    def to_string(self):
+        return "".join(self.iter_json())
+
+    def write_json(self, filename, ndjson=True):
+        """Stream the JSON (or with ndjson, NDJSON) export to a file."""
+        with open(filename, 'w', encoding='utf-8') as out:
+            out.writelines(self.iter_ndjson() if ndjson else self.iter_json())
+
+    def read_from_json_lines(self, lines):
+        """Rebuild the tree from the lines of an export made by iter_ndjson or iter_json.
+
+        Records are read one line at a time, the array brackets and
+        separators of the JSON form are skipped.  The record without a
+        headline is the root preamble; an export of a subtree starts
+        with a heading without a parent instead, which becomes a child
+        of the root.
+        """
+        self.level = 0
+        self.parent = None
+        stack = [(None, self)]
+        for line in lines:
+            line = line.strip().rstrip(",")
+            if line in ("", "[", "]"):
+                continue
+            record = json.loads(line)
+            if record['headline'] == None:
+                self.raw_data = record['body']
+                stack.append((record['id'], self))
                 continue
-            tree_sequence.append(item)
-        for item in tree_sequence:
-            out.write(item.get_header().get_string())
-            out.write(os.linesep)
-            out.write(item.get_data())
-        out.close()
+            while stack[-1][0] != record['parent']:
+                stack.pop()
+            tree = self.add_tree(stack[-1][1], self.new_header(record['headline']))
+            tree.raw_data = record['body']
+            stack.append((record['id'], tree))
+        self.structure_changed()
+        return None
+
+    def read_from_json(self, filename):
+        with open(filename, 'r', encoding='utf-8') as inp:
+            return self.read_from_json_lines(inp)
+
 
+def get_planning_timestamp(data, keyword):
+    planning = data.get_planning_line()
+    if planning != None:
+        for match in PLANNING_PATTERN.finditer(planning):
+            if match.group('keyword') == keyword:
+                return match.group('timestamp')
+    return None
 
-class OrgTree(Node, OrgTreeReader, OrgTreeWriter):
-    # level, tree_type, raw_data, data, tag_dict, header, properties
-    # are now instance variables initialized in __init__.
+
+class OrgTree(Node, OrgTreeReader, OrgTreeWriter, OrgTreeEditor, PlainSerializableOrgTree):
+    __slots__ = ('level', 'tree_type', 'raw_data', 'data', 'tag_dict', 'header', 'properties',
+                 'source', 'header_span', 'body_span', 'line_count')
 
     def __init__(self, *args, **kwargs):
         super(OrgTree, self).__init__(*args, **kwargs)  # Call Node's __init__ or object.__init__
@@ -74,13 +559,18 @@ class OrgTree(Node, OrgTreeReader, OrgTreeWriter):
         self.tag_dict = {}
         self.header = None
         self.properties = None
-        # Node class is expected to initialize self.children and self.parent (if applicable)
+        self.source = None
+        self.header_span = None
+        self.body_span = None
+        self.line_count = None
+        # children and parent are initialized by Node.__init__
 
     def get_header(self):
         return self.header
 
     def set_header(self, header):
         self.header = header
+        self.header_span = None
 
     def get_tag_dict(self):
         return self.tag_dict
@@ -91,14 +581,32 @@ class OrgTree(Node, OrgTreeReader, OrgTreeWriter):
         except KeyError:
             return []
 
+    def query(self, expression, indexes=()):
+        """Headings of the tree matching an Org match expression, in document order.
+
+        See pyorgtree.query.Query for the syntax.  TagIndex, PropertyIndex
+        and TimeIndex objects built over this tree may be passed in
+        indexes to narrow the headings the expression is tested on.
+        """
+        return compile_query(expression).execute(self, indexes)
+
+    def get_raw_data(self):
+        if self.raw_data == None and self.source != None:
+            start, end = self.body_span
+            text = self.source[start:end].decode('utf-8')
+            if "\r" in text:
+                text = text.replace("\r\n", "\n").replace("\r", "\n")
+            return text
+        return self.raw_data
+
     def get_data(self):
         if self.data == None:
-            self.data = OrgTreeData(self.raw_data)
+            self.data = OrgTreeData(self.get_raw_data())
         return self.data.get_data()
 
     def has_schedule(self):
         if self.data == None:
-            self.data = OrgTreeData(self.raw_data)
+            self.data = OrgTreeData(self.get_raw_data())
         return self.data.has_schedule()
     def get_schedule(self):
         if self.has_schedule():
@@ -106,24 +614,24 @@ class OrgTree(Node, OrgTreeReader, OrgTreeWriter):
 
     def has_deadline(self):
         if self.data == None:
-            self.data = OrgTreeData(self.raw_data)
+            self.data = OrgTreeData(self.get_raw_data())
         return self.data.has_deadline()
 
     def get_deadline(self):
         if self.data == None:
-            self.data = OrgTreeData(self.raw_data)
+            self.data = OrgTreeData(self.get_raw_data())
         return self.data.get_deadline()
 
     def has_properties(self):
         if self.data == None:
-            self.data = OrgTreeData(self.raw_data)
+            self.data = OrgTreeData(self.get_raw_data())
         if self.properties == None:
             self.properties = self.data.get_properties()
         return len(list(self.properties.keys())) > 0
 
     def get_properties(self):
         if self.data == None:
-            self.data = OrgTreeData(self.raw_data)
+            self.data = OrgTreeData(self.get_raw_data())
         if self.properties == None:
             self.properties = self.data.get_properties()
         return self.properties
@@ -132,17 +640,25 @@ class OrgTree(Node, OrgTreeReader, OrgTreeWriter):
         return "OrgTree(level=%d; title=%s)" % (self.level, self.header.get_title())
 
 
-class PickleSerializableOrgTree():
+class PickleSerializableOrgTree(object):
+    __slots__ = ()
 
     def pickle_load(self, filename):
         try:
             with open(filename, 'rb') as inp:
                 loaded_obj = pickle.load(inp)
-            # Update the current instance's dictionary with the loaded object's dictionary
-            # This ensures all instance attributes, including tree_dict and tag_dict, are restored.
-            self.__dict__.update(loaded_obj.__dict__)
+            # Copy every slot (and the __dict__ of subclasses without slots) of the
+            # loaded root, including tree_dict and tag_dict, into this instance.
+            for cls in type(loaded_obj).__mro__:
+                for name in cls.__dict__.get('__slots__', ()):
+                    if hasattr(loaded_obj, name):
+                        setattr(self, name, getattr(loaded_obj, name))
+            if hasattr(loaded_obj, '__dict__'):
+                self.__dict__.update(loaded_obj.__dict__)
+            for child in self.children:
+                child.set_parent(self)
             return True
-        except (IOError, pickle.UnpicklingError) as e:
+        except (IOError, AttributeError, pickle.UnpicklingError) as e:
             # It's good practice to log the error or handle it more specifically if needed
             print(f"Error during pickle_load: {e}") # Or use a proper logger
             return False
@@ -157,57 +673,137 @@ class PickleSerializableOrgTree():
             return False
 
 
-class PlainSerializableOrgTree():
-
-    def to_string(self):
-        return ""
+class BinarySerializableOrgTree(object):
+    """Compact binary serialization, see pyorgtree.binary for the format.
 
+    binary_load builds the nodes from the column table: headers are
+    created from their lines and given their keyword, priority and tags
+    from the table, and bodies stay in the memory-mapped file until
+    get_raw_data() decodes them, as after read_from_mmap().
+    """
+    __slots__ = ()
 
-class HashedOrgTreeReader(object):
+    def binary_dump(self, filename):
+        try:
+            columns, keywords, tagsets, hashes, text = columns_from_tree(self, COLUMNS)
+            write_binary(filename, COLUMNS, columns, keywords, tagsets, hashes, text,
+                         getattr(self, 'tree_dict', None) is not None)
+            return True
+        except IOError:
+            return False
 
-    def read_from_file(self, filename, line_number, level, tree_dict=None, tag_dict=None):
-        if tree_dict:
+    def binary_load(self, filename):
+        try:
+            source, columns, keywords, tagsets, hashes, hashed, version = read_binary(filename, COLUMNS)
+        except (IOError, MalformedBinaryTree):
+            return False
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._link_binary(source, columns, keywords, tagsets, hashes, version)
+        finally:
+            if enabled:
+                gc.enable()
+        self.structure_changed()
+        return True
+
+    def _link_binary(self, source, columns, keywords, tagsets, hashes, version):
+        parents = columns['parent']
+        levels = columns['level']
+        offsets = columns['offset']
+        body_offsets = columns['body_offset']
+        body_ends = columns['body_end']
+        priorities = columns['priority']
+        keyword_column = columns['keyword']
+        tagset_column = columns['tagset']
+        self.children = []
+        self.parent = None
+        self.level = 0
+        self.source = source
+        self.raw_data = None
+        self.data = None
+        self.properties = None
+        self.line_count = None
+        self.body_span = (body_offsets[0], body_ends[0])
+        self.tag_dict = tag_dict = {}
+        tree_dict = {}
+        hashed = hasattr(self, 'tree_dict')
+        if hashed:
             self.tree_dict = tree_dict
-        if tag_dict:
-            self.tag_dict = tag_dict
-        self.level = level
-        if self.level == 0:
-            self.parent = None
-        data = open(filename, 'r').readlines()
-        tree_start_pattern = re.compile("^\*{1,} ")
-        i = line_number
-        while i < len(data):
-            line = data[i]
-            if tree_start_pattern.match(line):
-                header = HashedHeader(line)
-                new_level = header.get_level()
-                if new_level > self.level:
-                    new_child = HashedOrgTree()
-                    new_child.set_parent(self)
-                    new_child.set_header(header)
-                    current_tree_hash = header.get_hash()
-                    if current_tree_hash:
-                        self.tree_dict[current_tree_hash] = new_child
-                    if header.has_tags():
-                        for tag in header.get_tags():
-                            if tag not in self.tag_dict:
-                                self.tag_dict[tag] = []
-                            self.tag_dict[tag].append(new_child)
-                    self.add_child(new_child)
-                    continue_from  = new_child.read_from_file(filename, i+1, new_level, tree_dict=self.tree_dict, tag_dict=self.tag_dict)
-                    if not continue_from:
-                        break
-                    i = continue_from
-                else:
-                    return i
-            else:
-               self.raw_data += line
-               i += 1
+        trees = [self]
+        new_tree = self.new_tree
+        new_header = self.new_header
+        for row in range(1, len(levels)):
+            tree = new_tree()
+            header = new_header(source[offsets[row]:body_offsets[row]].decode('utf-8'))
+            priority = priorities[row]
+            priority = chr(priority) if priority else None
+            keyword = keywords[keyword_column[row]]
+            tags = tagsets[tagset_column[row]]
+            if version == 1 and (header.get_priority() != priority or header.get_type() != keyword or
+                                 tuple(header.get_tags()) != tags):
+                header.source_line = None
+            header.priority = priority
+            header.header_type = keyword
+            header.tags = list(tags)
+            tree.header = header
+            tree.level = levels[row]
+            tree.source = source
+            tree.raw_data = None
+            tree.body_span = (body_offsets[row], body_ends[row])
+            tree.tag_dict = tag_dict
+            if hashed:
+                tree.tree_dict = tree_dict
+            parent = trees[parents[row]]
+            tree.parent = parent
+            parent.children.append(tree)
+            for tag in tags:
+                if tag not in tag_dict:
+                    tag_dict[tag] = []
+                tag_dict[tag].append(tree)
+            trees.append(tree)
+        for node_hash, row in hashes.items():
+            tree_dict[node_hash] = trees[row]
+
+
+class HashedOrgTreeReader(OrgTreeReader):
+    __slots__ = ()
+
+    def new_header(self, line):
+        return HashedHeader(line)
+
+    def new_tree(self):
+        return HashedOrgTree()
+
+    def register_tree(self, tree):
+        tree.tree_dict = self.tree_dict
+        current_tree_hash = tree.get_header().get_hash()
+        if current_tree_hash:
+            self.tree_dict[current_tree_hash] = tree
+        super(HashedOrgTreeReader, self).register_tree(tree)
+
+    def unregister_trees(self, trees):
+        for tree in trees:
+            current_tree_hash = tree.get_header().get_hash()
+            if current_tree_hash and self.tree_dict.get(current_tree_hash) is tree:
+                del self.tree_dict[current_tree_hash]
+        super(HashedOrgTreeReader, self).unregister_trees(trees)
+
+    def merge_chunk(self, chunk):
+        self.tree_dict.update(chunk.get_tree_dict())
+        for tree in chunk:
+            tree.tree_dict = self.tree_dict
+        super(HashedOrgTreeReader, self).merge_chunk(chunk)
+
+    def read_from_file(self, filename, line_number=0, level=0, tree_dict=None, tag_dict=None):
+        if tree_dict is not None:
+            self.tree_dict = tree_dict
+        return super(HashedOrgTreeReader, self).read_from_file(filename, line_number, level, tag_dict=tag_dict)
+
 
+class HashedOrgTree(HashedOrgTreeReader, OrgTree, PickleSerializableOrgTree, BinarySerializableOrgTree):
+    __slots__ = ('tree_dict',)
 
-class HashedOrgTree(HashedOrgTreeReader, OrgTree, PickleSerializableOrgTree, PlainSerializableOrgTree):
-    # tree_dict is now an instance variable initialized in __init__.
-    # tag_dict is inherited from OrgTree and initialized as an instance variable via super().__init__().
     def __init__(self):
         super(HashedOrgTree, self).__init__()
         self.tree_dict = {}
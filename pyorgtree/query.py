@@ -0,0 +1,486 @@
+import datetime
+import functools
+import re
+from .tree import *
+from .index import *
+from .agenda import add_interval, get_bounds
+
+TERM_PATTERN = re.compile(r"""
+    (?P<sign>[+-]?)
+    (?:
+        (?P<key>[A-Za-z_][\w-]*)\s*(?P<op><>|!=|==|<=|>=|=|<|>)\s*
+        (?P<value>"[^"]*"|\{[^}]*\}|-?[\w.:]+)
+      | \{(?P<regex>[^}]*)\}
+      | (?P<tag>[\w@#%]+)
+    )
+    \s*(?P<and>&)?\s*""", re.X)
+RELATIVE_TIME_PATTERN = re.compile(r"^<(?P<sign>[+-])(?P<num>[0-9]+)(?P<unit>[hdwmy])>$")
+SPECIAL_PROPERTIES = ("TODO", "LEVEL", "PRIORITY", "ITEM", "SCHEDULED", "DEADLINE")
+DEFAULT_PRIORITY = "B"
+
+
+class MalformedQuery(Exception):
+    def __init__(self, message):
+        Exception.__init__(self, message)
+
+
+def split_query(expression):
+    """Split a match into its tags/properties part and its TODO keyword part (after ``/``)."""
+    depth = None
+    for position, character in enumerate(expression):
+        if depth != None:
+            if character == depth:
+                depth = None
+        elif character == '"':
+            depth = '"'
+        elif character == "{":
+            depth = "}"
+        elif character == "/":
+            return expression[:position], expression[position + 1:]
+    return expression, None
+
+
+def resolve_time(value, now):
+    """Moment named by a match time value, and whether it carries a time of day.
+
+    Besides timestamps, Org's ``<now>``, ``<today>``, ``<tomorrow>``,
+    ``<yesterday>`` and ``<+2d>`` style offsets from today (``h`` is
+    from now) are understood.
+
+    :returns:  tuple -- (datetime, has time), None if value is not a time
+    """
+    today = datetime.datetime.combine(now.date(), datetime.time())
+    named = {"<now>": (now, True), "<today>": (today, False),
+             "<tomorrow>": (today + datetime.timedelta(days=1), False),
+             "<yesterday>": (today - datetime.timedelta(days=1), False)}
+    if value in named:
+        return named[value]
+    match = RELATIVE_TIME_PATTERN.match(value)
+    if match:
+        count = int(match.group('num')) * (1 if match.group('sign') == "+" else -1)
+        if match.group('unit') == "h":
+            return now + datetime.timedelta(hours=count), True
+        return add_interval(today, count, match.group('unit')), False
+    parsed = parse_timestamp(value)
+    if parsed == None or parsed.range_end != None:
+        return None
+    if parsed.time == None:
+        return datetime.datetime.combine(parsed.date, datetime.time()), False
+    return datetime.datetime.combine(parsed.date, parsed.time), True
+
+
+def compare(actual, op, expected):
+    if op in ("=", "=="):
+        return actual == expected
+    if op in ("<>", "!="):
+        return actual != expected
+    if op == "<":
+        return actual < expected
+    if op == "<=":
+        return actual <= expected
+    if op == ">":
+        return actual > expected
+    return actual >= expected
+
+
+class TagTerm(object):
+    def __init__(self, tag):
+        self.tag = tag
+
+    def matches(self, node, context):
+        return context.has_tag(node, self.tag)
+
+    def __repr__(self):
+        return "+%s" % self.tag
+
+
+class TagRegexTerm(object):
+    def __init__(self, regex):
+        self.pattern = re.compile(regex)
+
+    def matches(self, node, context):
+        return any(self.pattern.search(tag) for tag in context.get_tags(node))
+
+    def __repr__(self):
+        return "+{%s}" % self.pattern.pattern
+
+
+class TodoTerm(object):
+    def __init__(self, keyword):
+        self.keyword = keyword
+
+    def matches(self, node, context):
+        header = node.get_header()
+        return header != None and header.get_type() == self.keyword
+
+    def __repr__(self):
+        return "/%s" % self.keyword
+
+
+class PropertyTerm(object):
+    """Comparison of a property or of one of the special properties.
+
+    TODO, LEVEL, PRIORITY, ITEM (the title), SCHEDULED and DEADLINE are
+    read from the heading; other keys from its property drawer.  Values
+    follow PropertyIndex.compare: quoted strings compare as strings,
+    quoted timestamps (relative ones included) and unquoted numbers,
+    durations and dates by value, and ``{regex}`` with ``=`` or ``<>``
+    searches.  A heading without the property matches no comparison.
+    """
+
+    def __init__(self, key, op, value):
+        self.key = key.upper()
+        self.op = op
+        self.value = value
+        self.regex = None
+        self.time = None
+        self.parsed = None
+        quoted = len(value) > 1 and value[0] == value[-1] == '"'
+        text = value[1:-1] if quoted else value
+        if value.startswith("{") and value.endswith("}"):
+            if op not in ("=", "==", "<>", "!="):
+                raise MalformedQuery("Regular expressions only match with = or <>: %s" % value)
+            self.regex = re.compile(value[1:-1])
+        elif self.key in ("SCHEDULED", "DEADLINE"):
+            if resolve_time(text, datetime.datetime.now()) == None:
+                raise MalformedQuery("Not a time: %s" % value)
+            self.time = text
+        elif self.key == "LEVEL":
+            self.parsed = ("number", float(text)) if NUMBER_PATTERN.match(text) else None
+            if self.parsed == None:
+                raise MalformedQuery("LEVEL needs a number: %s" % value)
+        elif self.key not in SPECIAL_PROPERTIES:
+            parsed = parse_property_value(text)
+            if parsed != None and not (quoted and parsed[0] != "date"):
+                self.parsed = parsed
+        self.text = text
+
+    def get_actual(self, node, context):
+        header = node.get_header()
+        if self.key == "TODO":
+            return header.get_type()
+        if self.key == "LEVEL":
+            return header.get_level()
+        if self.key == "PRIORITY":
+            return header.get_priority() or DEFAULT_PRIORITY
+        if self.key == "ITEM":
+            return header.get_title()
+        if self.key == "SCHEDULED":
+            return node.get_schedule()
+        if self.key == "DEADLINE":
+            return node.get_deadline()
+        return context.get_property(node, self.key)
+
+    def matches(self, node, context):
+        if node.get_header() == None:
+            return False
+        actual = self.get_actual(node, context)
+        if actual == None:
+            return False
+        if self.regex != None:
+            return (self.regex.search(str(actual)) != None) == (self.op in ("=", "=="))
+        if self.time != None:
+            expected, has_time = context.resolve_time(self.time)
+            start = get_bounds(actual)[0]
+            if not has_time:
+                start = datetime.datetime.combine(start.date(), datetime.time())
+            return compare(start, self.op, expected)
+        if self.key == "LEVEL":
+            return compare(actual, self.op, self.parsed[1])
+        if self.parsed != None:
+            parsed = parse_property_value(actual)
+            return parsed != None and parsed[0] == self.parsed[0] and compare(parsed[1], self.op, self.parsed[1])
+        return compare(actual, self.op, self.text)
+
+    def __repr__(self):
+        return "%s%s%s" % (self.key, self.op, self.value)
+
+
+class QueryContext(object):
+    """Facets of the headings a query is evaluated on, taken from indexes where given."""
+
+    def __init__(self, root, indexes=(), now=None):
+        self.root = root
+        self.now = datetime.datetime.now() if now == None else now
+        self.tag_index = None
+        self.property_index = None
+        self.time_index = None
+        for index in indexes:
+            if isinstance(index, TagIndex):
+                self.tag_index = index
+            elif isinstance(index, PropertyIndex):
+                self.property_index = index
+            elif isinstance(index, TimeIndex):
+                self.time_index = index
+        self.filetags = None
+        self.times = {}
+
+    def get_filetags(self):
+        if self.filetags == None:
+            document = self.root
+            while document.get_parent() != None:
+                document = document.get_parent()
+            self.filetags = set(parse_filetags(document.get_data())) if document.get_header() == None else set()
+        return self.filetags
+
+    def get_tags(self, node):
+        """Tags of node with the inherited ones."""
+        if self.tag_index != None:
+            return self.tag_index.get_tags(node)
+        tags = set(self.get_filetags())
+        while node != None:
+            header = node.get_header()
+            if header != None:
+                tags.update(header.get_tags())
+            node = node.get_parent()
+        return tags
+
+    def has_tag(self, node, tag):
+        if self.tag_index != None:
+            return self.tag_index.has_tag(node, tag)
+        return tag in self.get_tags(node)
+
+    def get_property(self, node, key):
+        if self.property_index != None:
+            return self.property_index.get_property(node, key)
+        for name, value in node.get_properties().items():
+            if name.upper() == key:
+                return value
+        return None
+
+    def resolve_time(self, value):
+        if value not in self.times:
+            self.times[value] = resolve_time(value, self.now)
+        return self.times[value]
+
+
+class Query(object):
+    """A compiled Org match expression.
+
+    The expression is a ``|`` separated list of alternatives, each a
+    sequence of terms optionally joined with ``&``: ``+tag``, ``-tag`` or
+    a bare tag, ``{regex}`` over the tags, and property comparisons such
+    as ``TODO="NEXT"``, ``EFFORT>1:00``, ``PRIORITY="A"`` or
+    ``SCHEDULED<"<+1w>"``, each of which can be negated with ``-``.  After
+    a ``/`` comes a match over the TODO keyword with the same syntax
+    (``work/NEXT|WAITING``, ``/-DONE``).  Tags are inherited.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        match, todo = split_query(expression)
+        self.alternatives = self.parse(match, False)
+        self.todo_alternatives = self.parse(todo, True) if todo != None else None
+
+    def parse(self, text, todo):
+        """List of alternatives, each a list of (negated, term) pairs."""
+        alternatives = []
+        for alternative in self.split_alternatives(text):
+            terms = []
+            position = 0
+            alternative = alternative.strip()
+            while position < len(alternative):
+                match = TERM_PATTERN.match(alternative, position)
+                if match == None or match.end() == position:
+                    raise MalformedQuery("Malformed match: %s" % self.expression)
+                position = match.end()
+                if match.group('and') and position >= len(alternative):
+                    raise MalformedQuery("Malformed match: %s" % self.expression)
+                negated = match.group('sign') == "-"
+                if match.group('key') != None:
+                    if todo:
+                        raise MalformedQuery("Only keywords may follow /: %s" % self.expression)
+                    term = PropertyTerm(match.group('key'), match.group('op'), match.group('value'))
+                elif match.group('regex') != None:
+                    term = TagRegexTerm(match.group('regex'))
+                elif todo:
+                    term = TodoTerm(match.group('tag'))
+                else:
+                    term = TagTerm(match.group('tag'))
+                terms.append((negated, term))
+            if not terms and (todo or alternatives or text.strip()):
+                raise MalformedQuery("Malformed match: %s" % self.expression)
+            alternatives.append(terms)
+        return alternatives
+
+    def split_alternatives(self, text):
+        alternatives = []
+        depth = None
+        start = 0
+        for position, character in enumerate(text):
+            if depth != None:
+                if character == depth:
+                    depth = None
+            elif character == '"':
+                depth = '"'
+            elif character == "{":
+                depth = "}"
+            elif character == "|":
+                alternatives.append(text[start:position])
+                start = position + 1
+        alternatives.append(text[start:])
+        return alternatives
+
+    def match_alternatives(self, alternatives, node, context):
+        for terms in alternatives:
+            if all(term.matches(node, context) != negated for negated, term in terms):
+                return True
+        return False
+
+    def matches(self, node, context):
+        if node.get_header() == None:
+            return False
+        if not self.match_alternatives(self.alternatives, node, context):
+            return False
+        return self.todo_alternatives == None or self.match_alternatives(self.todo_alternatives, node, context)
+
+    def plan(self, root, indexes=(), now=None):
+        return QueryPlan(self, QueryContext(root, indexes, now))
+
+    def execute(self, root, indexes=(), now=None):
+        """Headings of root matching the query, in document order."""
+        return self.plan(root, indexes, now).execute()
+
+
+@functools.lru_cache(maxsize=256)
+def compile_query(expression):
+    """Compile an Org match expression once; see Query for the syntax."""
+    return Query(expression)
+
+
+class QueryPlan(object):
+    """How a query is run over a tree.
+
+    For every alternative, the positive terms an index can answer give
+    candidate sets: tags from a TagIndex or, failing that, the subtrees
+    of the headings in the tag_dict of the tree, properties from a
+    PropertyIndex and SCHEDULED or DEADLINE windows from a TimeIndex
+    (the tag_dict is not used for a ColumnarOrgTree, whose nodes are
+    views).
+    The candidates of the terms of an alternative are intersected, those
+    of the alternatives joined, and the compiled predicate is run on
+    them only.  When an alternative has no such term the plan is a
+    single streaming scan of the tree.  steps describes the choice.
+    """
+
+    def __init__(self, query, context):
+        self.query = query
+        self.context = context
+        self.tree_index = context.tag_index or context.property_index or context.time_index
+        self.sources = []
+        self.steps = []
+        for terms in query.alternatives:
+            sources = [source for source in (self.get_source(term) for negated, term in terms if not negated)
+                       if source != None]
+            if not sources:
+                self.sources = None
+                self.steps = ["scan"]
+                break
+            if self.tree_index == None:
+                sources = [min(sources, key=lambda source: len(source[1]))]
+            self.sources.append(sources)
+            self.steps.append(" & ".join(source[0] for source in sources))
+
+    def get_source(self, term):
+        context = self.context
+        if isinstance(term, TagTerm):
+            if context.tag_index != None:
+                return "tag index %s" % term.tag, lambda: context.tag_index.match_positions("+" + term.tag)
+            tag_dict = None if isinstance(context.root, ColumnarOrgTree) else context.root.get_tag_dict()
+            if tag_dict != None and term.tag not in context.get_filetags():
+                return "tag_dict %s" % term.tag, tag_dict.get(term.tag, [])
+        elif isinstance(term, PropertyTerm) and term.regex == None and term.op not in ("<>", "!="):
+            if term.key in ("SCHEDULED", "DEADLINE") and context.time_index != None:
+                return "time index %r" % term, lambda: self.get_time_positions(term)
+            if term.key not in SPECIAL_PROPERTIES and context.property_index != None:
+                return "property index %r" % term, lambda: context.property_index.compare(term.key, term.op, term.value)
+        return None
+
+    def get_time_positions(self, term):
+        index = self.context.time_index
+        expected, has_time = self.context.resolve_time(term.time)
+        low, high = datetime.date.min, datetime.date.max
+        if term.op in ("<", "<="):
+            high = expected + datetime.timedelta(days=1)
+        elif term.op in (">", ">="):
+            low = expected
+        else:
+            low, high = expected, expected + datetime.timedelta(days=1)
+        return [index.entry_positions[number] for number in index.find_entries(low, high, term.key)]
+
+    def get_positions(self, source):
+        if callable(source[1]):
+            return set(source[1]())
+        index = self.tree_index
+        positions = set()
+        for node in source[1]:
+            start = index.get_position(node)
+            positions.update(range(start, start + index.sizes[start]))
+        return positions
+
+    def iter_candidates(self):
+        if self.sources == None:
+            return iter(self.context.root)
+        if self.tree_index != None:
+            positions = set()
+            for sources in self.sources:
+                candidates = None
+                for source in sources:
+                    candidates = self.get_positions(source) if candidates == None else candidates & self.get_positions(source)
+                positions |= candidates
+            start = self.tree_index.get_position(self.context.root)
+            end = start + self.tree_index.sizes[start]
+            return map(self.tree_index.get_node, sorted(position for position in positions if start <= position < end))
+        return self.iter_tagged_subtrees([node for sources in self.sources for node in sources[0][1]])
+
+    def iter_tagged_subtrees(self, nodes):
+        """Nodes of the subtrees of nodes within the queried tree, once each and in document order.
+
+        A node above the queried tree stands for all of it, nodes outside
+        of it are left out.
+        """
+        root = self.context.root
+        ancestors = set()
+        ancestor = root.get_parent()
+        while ancestor != None:
+            ancestors.add(ancestor)
+            ancestor = ancestor.get_parent()
+        roots = set()
+        for node in nodes:
+            if node in ancestors:
+                roots.add(root)
+                continue
+            ancestor = node
+            while ancestor != None and ancestor is not root:
+                ancestor = ancestor.get_parent()
+            if ancestor != None:
+                roots.add(node)
+        sibling_numbers = {}
+
+        def get_path(node):
+            path = []
+            while node.get_parent() != None:
+                parent = node.get_parent()
+                numbers = sibling_numbers.get(parent)
+                if numbers == None:
+                    numbers = sibling_numbers[parent] = dict((child, i) for i, child in enumerate(parent.children))
+                path.append(numbers[node])
+                node = parent
+            path.reverse()
+            return path
+
+        def is_covered(node):
+            node = node.get_parent()
+            while node != None:
+                if node in roots:
+                    return True
+                node = node.get_parent()
+            return False
+
+        for node in sorted((node for node in roots if not is_covered(node)), key=get_path):
+            for subtree_node in node:
+                yield subtree_node
+
+    def execute(self):
+        query, context = self.query, self.context
+        return [node for node in self.iter_candidates() if query.matches(node, context)]
@@ -5,21 +5,22 @@ import pickle
 from .timestamp import *
 
 class Schedule(object):
+    __slots__ = ()
     keyword = "SCHEDULED"
     def __str__(self):
         return "%s: %s" % (self.keyword, super(Schedule, self).__str__())
 
 class ScheduleDatetime(Schedule, DatetimeStamp):
-    pass
+    __slots__ = ()
 
 class ScheduleDate(Schedule, DateStamp):
-    pass
+    __slots__ = ()
 
 class ScheduleDatetimeRange(Schedule, DatetimeRange):
-    pass
+    __slots__ = ()
 
 class ScheduleDateRange(Schedule, DateRange):
-    pass
+    __slots__ = ()
 
 class MalformedScheduleException(Exception):
     def __init__(self, message):
@@ -32,26 +33,28 @@ class ScheduleAbstractFactory(object):
         string = string.strip()
         if not string.startswith("%s:" % keyword):
             raise MalformedScheduleException("Malformed schedule string")
-        schedule = re.sub("^.*%s:" % keyword, "", string).strip()
-        if DatetimeRange.is_valid(schedule):
-            return ScheduleDatetimeRange(schedule)
-        elif DateRange.is_valid(schedule):
-            return ScheduleDateRange(schedule)
-        elif DatetimeStamp.is_valid(schedule):
-            return ScheduleDatetime(schedule)
-        elif DateStamp.is_valid(schedule):
-            return ScheduleDate(schedule)
-        else:
+        schedule = string.rpartition("%s:" % keyword)[2].strip()
+        parsed = parse_timestamp(schedule)
+        if parsed == None:
             raise MalformedScheduleException("Malformed schedule string")
+        elif parsed.range_end != None:
+            if parsed.time != None and parsed.range_end.time != None:
+                return ScheduleDatetimeRange(schedule, parsed)
+            return ScheduleDateRange(schedule, parsed)
+        elif parsed.time != None:
+            return ScheduleDatetime(schedule, parsed)
+        else:
+            return ScheduleDate(schedule, parsed)
 
 class Deadline(Schedule):
+    __slots__ = ()
     keyword = "DEADLINE"
 
 class DeadlineDatetime(Deadline, ScheduleDatetime):
-    pass
+    __slots__ = ()
 
 class DeadlineDate(Deadline, ScheduleDate):
-    pass
+    __slots__ = ()
 
 class DeadlineAbstractFactory(object):
     @staticmethod
@@ -60,10 +63,11 @@ class DeadlineAbstractFactory(object):
         string = string.strip()
         if not string.startswith("%s:" % keyword):
             raise MalformedScheduleException("Malformed deadline string")
-        schedule = re.sub("^.*%s:" % keyword, "", string).strip()
-        if DatetimeStamp.is_valid(schedule):
-            return DeadlineDatetime(schedule)
-        elif DateStamp.is_valid(schedule):
-            return DeadlineDate(schedule)
-        else:
+        schedule = string.rpartition("%s:" % keyword)[2].strip()
+        parsed = parse_timestamp(schedule)
+        if parsed == None:
             raise MalformedScheduleException("Malformed deadline string")
+        elif parsed.time != None:
+            return DeadlineDatetime(schedule, parsed)
+        else:
+            return DeadlineDate(schedule, parsed)
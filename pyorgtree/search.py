@@ -0,0 +1,372 @@
+import collections
+import hashlib
+import heapq
+import itertools
+import math
+import os
+import pickle
+import re
+import sys
+from .tree import *
+from .header import HashedHeader
+from .columnar import ColumnarOrgTree
+
+TOKEN_PATTERN = re.compile(r"\w+")
+QUERY_PATTERN = re.compile(r'(?P<sign>[+-]?)(?:"(?P<phrase>[^"]*)"?|(?P<word>[^\s"]+))')
+SIDECAR_SUFFIX = ".search"
+SIDECAR_VERSION = 1
+
+SearchResult = collections.namedtuple('SearchResult', ['score', 'node', 'hash'])
+
+
+def tokenize(text):
+    """Lower-cased word tokens of text."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def parse_query(query):
+    """Split a search query into optional, required and excluded phrases.
+
+    Words are optional and only rank the results, ``"quoted phrases"``
+    and ``+words`` are required and ``-words`` or ``-"phrases"`` are
+    excluded.  A word that tokenizes to several tokens (``full-text``)
+    is a phrase.
+
+    :returns:  tuple -- (optional, required, excluded) lists of token tuples
+    """
+    optional, required, excluded = [], [], []
+    for match in QUERY_PATTERN.finditer(query):
+        phrase = match.group('phrase')
+        tokens = tuple(tokenize(phrase if phrase != None else match.group('word')))
+        if not tokens:
+            continue
+        if match.group('sign') == "-":
+            excluded.append(tokens)
+        elif match.group('sign') == "+" or phrase != None:
+            required.append(tokens)
+        else:
+            optional.append(tokens)
+    return optional, required, excluded
+
+
+def get_positions(posting):
+    """Token positions of a posting, which is a bare int for a single position."""
+    return (posting,) if posting.__class__ is int else posting
+
+
+def get_frequency(posting):
+    return 1 if posting.__class__ is int else len(posting)
+
+
+def get_sidecar_path(filename):
+    return filename + SIDECAR_SUFFIX
+
+
+class SearchIndex(object):
+    """Positional inverted index over the titles and bodies of the headings of a tree.
+
+    Every heading is a document made of its title followed by its body;
+    postings map every document a term occurs in to its positions there
+    (a bare int for the common single position), so that phrases are
+    matched on positions and results are ranked with BM25.  Documents
+    are identified by a fingerprint of their text, which is what lets a
+    saved index be brought up to date by sync() re-tokenizing only the
+    headings whose text changed.
+
+    Within a session, linking or unlinking nodes is picked up on the
+    next query from node identity alone; body edits made in place are
+    picked up by update() with the changed trees (as returned by
+    OrgTree.reparse_lines) or by sync().
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, root):
+        self.root = root
+        self.version = None
+        self.postings = {}
+        self.doc_terms = {}
+        self.doc_lengths = {}
+        self.doc_keys = {}
+        self.total_length = 0
+        self.next_doc = 0
+        self.node_docs = {}
+        self.doc_nodes = {}
+        self.doc_positions = {}
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def iter_headings(self):
+        if isinstance(self.root, ColumnarOrgTree):
+            return self.root.nodes(range(1, len(self.root)))
+        return (node for node in self.root if node.get_header() != None)
+
+    def get_text(self, node):
+        return node.get_header().get_title(), node.get_raw_data() or ""
+
+    def get_fingerprint(self, title, body):
+        return hashlib.blake2b(("%s\0%s" % (title, body)).encode('utf-8'), digest_size=12).digest()
+
+    def add_document(self, title, body, fingerprint):
+        doc = self.next_doc
+        self.next_doc += 1
+        title_tokens = tokenize(title)
+        body_tokens = tokenize(body)
+        positions = {}
+        for position, token in itertools.chain(enumerate(title_tokens),
+                                               enumerate(body_tokens, len(title_tokens) + 1)):
+            previous = positions.get(token)
+            if previous == None:
+                positions[token] = position
+            elif previous.__class__ is int:
+                positions[token] = [previous, position]
+            else:
+                previous.append(position)
+        terms = []
+        all_postings = self.postings
+        for token, token_positions in positions.items():
+            token = sys.intern(token)
+            terms.append(token)
+            postings = all_postings.get(token)
+            if postings == None:
+                postings = all_postings[token] = {}
+            postings[doc] = token_positions if token_positions.__class__ is int else tuple(token_positions)
+        length = len(title_tokens) + len(body_tokens)
+        self.doc_terms[doc] = tuple(terms)
+        self.doc_lengths[doc] = length
+        self.doc_keys[doc] = fingerprint
+        self.total_length += length
+        return doc
+
+    def remove_document(self, doc):
+        for token in self.doc_terms.pop(doc):
+            postings = self.postings[token]
+            del postings[doc]
+            if not postings:
+                del self.postings[token]
+        self.total_length -= self.doc_lengths.pop(doc)
+        del self.doc_keys[doc]
+        node = self.doc_nodes.pop(doc, None)
+        if node != None:
+            self.node_docs.pop(node, None)
+
+    def link(self, headings):
+        self.node_docs = {}
+        self.doc_nodes = {}
+        self.doc_positions = {}
+        for position, (node, doc) in enumerate(headings):
+            self.doc_positions[doc] = position
+            if not isinstance(self.root, ColumnarOrgTree):
+                self.node_docs[node] = doc
+                self.doc_nodes[doc] = node
+        self.version = self.root.get_structure_version()
+
+    def sync(self):
+        """Bring the index up to date with the tree by comparing fingerprints.
+
+        Documents are matched to headings by the fingerprint of their
+        text; only the headings without a match are tokenized.
+
+        :returns:  tuple -- numbers of documents added and removed
+        """
+        unmatched = {}
+        for doc, fingerprint in self.doc_keys.items():
+            unmatched.setdefault(fingerprint, []).append(doc)
+        headings = []
+        added = 0
+        for node in self.iter_headings():
+            title, body = self.get_text(node)
+            fingerprint = self.get_fingerprint(title, body)
+            docs = unmatched.get(fingerprint)
+            if docs:
+                doc = docs.pop(0)
+            else:
+                doc = self.add_document(title, body, fingerprint)
+                added += 1
+            headings.append((node, doc))
+        removed = 0
+        for docs in unmatched.values():
+            for doc in docs:
+                self.remove_document(doc)
+                removed += 1
+        self.link(headings)
+        return added, removed
+
+    def refresh(self):
+        """Follow nodes linked or unlinked since the last query, by node identity."""
+        headings = []
+        seen = set()
+        for node in self.iter_headings():
+            doc = self.node_docs.get(node)
+            if doc == None:
+                title, body = self.get_text(node)
+                doc = self.add_document(title, body, self.get_fingerprint(title, body))
+            seen.add(doc)
+            headings.append((node, doc))
+        for doc in [doc for doc in self.doc_keys if doc not in seen]:
+            self.remove_document(doc)
+        self.link(headings)
+
+    def update(self, trees):
+        """Re-index the headings of trees whose text changed in place."""
+        self.check()
+        for tree in trees:
+            for node in tree:
+                doc = self.node_docs.get(node)
+                if node.get_header() == None or doc == None:
+                    continue
+                title, body = self.get_text(node)
+                fingerprint = self.get_fingerprint(title, body)
+                if fingerprint == self.doc_keys[doc]:
+                    continue
+                position = self.doc_positions.pop(doc)
+                self.remove_document(doc)
+                doc = self.add_document(title, body, fingerprint)
+                self.node_docs[node] = doc
+                self.doc_nodes[doc] = node
+                self.doc_positions[doc] = position
+
+    def check(self):
+        if self.version == self.root.get_structure_version():
+            return
+        if self.version == None or isinstance(self.root, ColumnarOrgTree):
+            self.sync()
+        else:
+            self.refresh()
+
+    def get_node(self, doc):
+        if isinstance(self.root, ColumnarOrgTree):
+            return self.root.node(self.doc_positions[doc] + 1)
+        return self.doc_nodes[doc]
+
+    def get_phrase_docs(self, tokens):
+        """Documents containing tokens as consecutive words, with the phrase count."""
+        postings = [self.postings.get(token) for token in tokens]
+        if any(posting == None for posting in postings):
+            return {}
+        shortest = min(postings, key=len)
+        result = {}
+        for doc in shortest:
+            if not all(doc in posting for posting in postings):
+                continue
+            starts = set(get_positions(postings[0][doc]))
+            for offset, posting in enumerate(postings[1:], 1):
+                starts &= set(position - offset for position in get_positions(posting[doc]))
+                if not starts:
+                    break
+            if starts:
+                result[doc] = len(starts)
+        return result
+
+    def get_idf(self, document_frequency):
+        count = len(self.doc_lengths)
+        return math.log(1.0 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def score(self, doc, frequency, idf, average):
+        norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[doc] / average) if average else self.k1
+        return idf * frequency * (self.k1 + 1.0) / (frequency + norm)
+
+    def search(self, query, limit=10):
+        """Headings matching query, best first, ranked with BM25.
+
+        See parse_query for the query syntax.  Phrases count as one term
+        with their number of occurrences as frequency.
+
+        :returns:  list -- SearchResult tuples (score, node, hash); hash is
+                   None unless the heading is hashed
+        """
+        self.check()
+        optional, required, excluded = parse_query(query)
+        matches = []
+        for tokens in optional + required:
+            if len(tokens) == 1:
+                docs = dict((doc, get_frequency(posting)) for doc, posting in self.postings.get(tokens[0], {}).items())
+            else:
+                docs = self.get_phrase_docs(tokens)
+            matches.append((tokens, docs))
+        candidates = None
+        for tokens, docs in matches[len(optional):]:
+            candidates = set(docs) if candidates == None else candidates & set(docs)
+        if candidates == None:
+            candidates = set()
+            for tokens, docs in matches:
+                candidates.update(docs)
+        for tokens in excluded:
+            if len(tokens) == 1:
+                candidates.difference_update(self.postings.get(tokens[0], ()))
+            else:
+                candidates.difference_update(self.get_phrase_docs(tokens))
+        scores = dict((doc, 0.0) for doc in candidates)
+        average = float(self.total_length) / len(self.doc_lengths) if self.doc_lengths else 0.0
+        for tokens, docs in matches:
+            idf = self.get_idf(len(docs))
+            for doc, frequency in docs.items():
+                if doc in scores:
+                    scores[doc] += self.score(doc, frequency, idf, average)
+        positions = self.doc_positions
+        if limit == None:
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], positions[item[0]]))
+        else:
+            ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], positions[item[0]]))
+        results = []
+        for doc, score in ranked:
+            node = self.get_node(doc)
+            header = node.get_header()
+            node_hash = header.get_hash() if isinstance(header, HashedHeader) else None
+            results.append(SearchResult(score, node, node_hash))
+        return results
+
+    def save(self, filename):
+        """Write the index to filename, without the node links."""
+        state = {
+            'version': SIDECAR_VERSION,
+            'postings': self.postings,
+            'doc_terms': self.doc_terms,
+            'doc_lengths': self.doc_lengths,
+            'doc_keys': self.doc_keys,
+            'total_length': self.total_length,
+            'next_doc': self.next_doc,
+        }
+        try:
+            with open(filename, 'wb') as out:
+                pickle.dump(state, out, pickle.HIGHEST_PROTOCOL)
+            return True
+        except IOError:
+            return False
+
+    def load(self, filename):
+        """Read an index written by save(); it is synced with the tree on the next query.
+
+        :returns:  bool -- False if the file is missing or not an index of this version
+        """
+        try:
+            with open(filename, 'rb') as inp:
+                state = pickle.load(inp)
+        except (IOError, pickle.UnpicklingError, EOFError):
+            return False
+        if not isinstance(state, dict) or state.get('version') != SIDECAR_VERSION:
+            return False
+        self.postings = state['postings']
+        self.doc_terms = state['doc_terms']
+        self.doc_lengths = state['doc_lengths']
+        self.doc_keys = state['doc_keys']
+        self.total_length = state['total_length']
+        self.next_doc = state['next_doc']
+        self.version = None
+        return True
+
+
+def open_search_index(root, filename):
+    """Search index of the tree read from filename, kept next to it.
+
+    The sidecar (filename + ".search") is loaded and synced when it
+    exists and written back when anything changed.
+    """
+    index = SearchIndex(root)
+    sidecar = get_sidecar_path(filename)
+    loaded = index.load(sidecar)
+    added, removed = index.sync()
+    if added or removed or not loaded:
+        index.save(sidecar)
+    return index
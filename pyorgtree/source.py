@@ -0,0 +1,128 @@
+import bz2
+import contextlib
+import gzip
+import io
+import lzma
+import os
+import stat
+import tempfile
+
+MAGIC_SIZE = 6
+DECOMPRESSORS = (
+    (b"\x1f\x8b", gzip.GzipFile),
+    (b"BZh", bz2.BZ2File),
+    (b"\xfd7zXZ\x00", lzma.LZMAFile),
+)
+
+
+class PrefixedStream(io.RawIOBase):
+    """Raw stream that replays already consumed bytes before the rest of a stream."""
+
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.prefix:
+            size = min(len(buffer), len(self.prefix))
+            buffer[:size] = self.prefix[:size]
+            self.prefix = self.prefix[size:]
+            return size
+        data = self.stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def peek_stream(stream, size):
+    """Return the first bytes of a binary stream and a stream still positioned before them."""
+    if hasattr(stream, 'peek'):
+        return stream.peek(size)[:size], stream
+    if stream.seekable():
+        position = stream.tell()
+        data = stream.read(size)
+        stream.seek(position)
+        return data, stream
+    data = stream.read(size)
+    return data, io.BufferedReader(PrefixedStream(data, stream))
+
+
+def decompress_stream(stream):
+    """Wrap a binary stream in a streaming decompressor if it starts with a gzip, bz2 or xz header."""
+    magic, stream = peek_stream(stream, MAGIC_SIZE)
+    for prefix, decompressor in DECOMPRESSORS:
+        if magic.startswith(prefix):
+            return decompressor(fileobj=stream) if decompressor is gzip.GzipFile else decompressor(stream)
+    return stream
+
+
+@contextlib.contextmanager
+def open_source(source, encoding=None):
+    """Open a file name or a file object as an iterable of text lines.
+
+    Binary input (a path or a binary file object) is decompressed on the
+    fly when it is gzip, bz2 or xz data and decoded with universal
+    newlines, like open(filename, 'r').  Text file objects and plain
+    iterables of lines are used as they are, unless the buffer under a
+    text stream such as sys.stdin starts with compressed data; it is
+    then decompressed and decoded with the encoding of the stream.
+    Streams passed in by the caller are left open.
+    """
+    if isinstance(source, (str, bytes, os.PathLike)):
+        with open(source, 'rb') as binary:
+            with io.TextIOWrapper(decompress_stream(binary), encoding=encoding, newline=None) as text:
+                yield text
+        return
+    if isinstance(source, io.TextIOBase):
+        buffer = getattr(source, 'buffer', None)
+        if not hasattr(buffer, 'peek') or \
+                not any(buffer.peek(MAGIC_SIZE).startswith(magic) for magic, opener in DECOMPRESSORS):
+            yield source
+            return
+        encoding = encoding or source.encoding
+        source = buffer
+    elif not hasattr(source, 'read'):
+        yield source
+        return
+    binary = decompress_stream(source)
+    text = io.TextIOWrapper(binary, encoding=encoding, newline=None)
+    try:
+        yield text
+    finally:
+        text.detach()
+        if binary is not source:
+            binary.close()
+
+
+@contextlib.contextmanager
+def atomic_output(filename, buffering=-1):
+    """Binary file object whose content replaces filename only once it is complete.
+
+    Data goes to a temporary file in the directory of filename, which is
+    flushed to disk and renamed over filename when the block exits
+    normally; on an exception it is removed and filename is left as it
+    was.  A symbolic link is written through and the permission bits of
+    an existing file are kept.
+    """
+    filename = os.path.realpath(filename)
+    directory, name = os.path.split(filename)
+    handle, temporary = tempfile.mkstemp(prefix=".%s." % name, suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(handle, 'wb', buffering=buffering) as out:
+            yield out
+            out.flush()
+            os.fsync(out.fileno())
+        try:
+            mode = stat.S_IMODE(os.stat(filename).st_mode)
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(temporary, mode)
+        os.replace(temporary, filename)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+        raise
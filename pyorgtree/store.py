@@ -0,0 +1,439 @@
+import hashlib
+import os
+import sqlite3
+from .pyorgtree import *
+from .index import (iter_planning, parse_property_value, from_seconds, to_seconds, TimeEntry,
+                    PROPERTY_CONDITION_PATTERN)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    preamble TEXT NOT NULL,
+    mtime INTEGER,
+    size INTEGER
+);
+CREATE TABLE IF NOT EXISTS subtrees (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    fingerprint BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS subtrees_file ON subtrees (file_id, position);
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY,
+    subtree_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    parent_id INTEGER,
+    level INTEGER NOT NULL,
+    hash TEXT,
+    keyword TEXT,
+    priority TEXT,
+    line TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS nodes_subtree ON nodes (subtree_id, rank);
+CREATE INDEX IF NOT EXISTS nodes_parent ON nodes (parent_id, rank);
+CREATE INDEX IF NOT EXISTS nodes_hash ON nodes (hash);
+CREATE TABLE IF NOT EXISTS tags (
+    node_id INTEGER NOT NULL,
+    tag TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag, node_id);
+CREATE INDEX IF NOT EXISTS tags_node ON tags (node_id);
+CREATE TABLE IF NOT EXISTS properties (
+    node_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    kind TEXT,
+    number REAL
+);
+CREATE INDEX IF NOT EXISTS properties_value ON properties (key, value);
+CREATE INDEX IF NOT EXISTS properties_number ON properties (key, kind, number);
+CREATE INDEX IF NOT EXISTS properties_node ON properties (node_id);
+CREATE TABLE IF NOT EXISTS planning (
+    node_id INTEGER NOT NULL,
+    keyword TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    long INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS planning_start ON planning (long, start);
+CREATE INDEX IF NOT EXISTS planning_node ON planning (node_id);
+"""
+
+ORDER = "subtrees.file_id, subtrees.position, nodes.rank"
+REVERSE_ORDER = "subtrees.file_id DESC, subtrees.position DESC, nodes.rank DESC"
+OPERATORS = {"=": "=", "==": "=", "<>": "<>", "!=": "<>", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+NODE_COLUMNS = "subtree_id, rank, size, parent_id, level, hash, keyword, priority, line, body"
+NODE_FIELDS = ", ".join("nodes." + name for name in NODE_COLUMNS.split(", "))
+DAY = 86400
+
+
+def get_fingerprint(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def get_headline(header):
+    return header.get_string() if header.is_modified() else header.line
+
+
+class StoredNode(object):
+    """OrgTree-like view of a heading kept in an OrgStore.
+
+    Like ColumnarNode, a view holds only the store and the id of its row;
+    the row is read when the view is first asked for anything and
+    children, parents and subtrees are read on demand, so walking a
+    stored corpus never loads more than the headings visited.
+    """
+    __slots__ = ('store', 'node_id', 'row')
+
+    def __init__(self, store, node_id, row=None):
+        self.store = store
+        self.node_id = node_id
+        self.row = row
+
+    def __eq__(self, other):
+        if not isinstance(other, StoredNode):
+            return NotImplemented
+        return self.store is other.store and self.node_id == other.node_id
+
+    def __hash__(self):
+        return hash((id(self.store), self.node_id))
+
+    def __repr__(self):
+        return "StoredNode(%d)" % self.node_id
+
+    def get_row(self):
+        if self.row == None:
+            self.row = self.store.connection.execute(
+                "SELECT %s FROM nodes WHERE id = ?" % NODE_COLUMNS, (self.node_id,)).fetchone()
+            if self.row == None:
+                raise KeyError("No stored node %d" % self.node_id)
+        return self.row
+
+    @property
+    def level(self):
+        return self.get_row()[4]
+
+    @property
+    def header(self):
+        return self.get_header()
+
+    @property
+    def parent(self):
+        return self.get_parent()
+
+    @property
+    def children(self):
+        return self.get_children()
+
+    def get_level(self):
+        return self.level
+
+    def get_header(self):
+        return self.store.header_class(self.get_row()[8])
+
+    def get_hash(self):
+        return self.get_row()[5]
+
+    def get_parent(self):
+        parent_id = self.get_row()[3]
+        if parent_id == None:
+            return None
+        return StoredNode(self.store, parent_id)
+
+    def get_children(self):
+        return self.store.get_nodes("SELECT id, %s FROM nodes WHERE parent_id = ? ORDER BY rank" % NODE_COLUMNS,
+                                    (self.node_id,))
+
+    def has_children(self):
+        return self.get_row()[2] > 1
+
+    def __getitem__(self, item_index):
+        if item_index == 0:
+            return self
+        children = self.get_children()
+        if item_index > 0 and item_index <= len(children):
+            return children[item_index - 1]
+        raise IndexError("Node index out of range")
+
+    def __iter__(self):
+        return self.iter_preorder()
+
+    def iter_preorder(self, prune=None):
+        """Iterate over the subtree in document order, one query without prune."""
+        if prune is not None:
+            return Node.iter_preorder(self, prune)
+        subtree_id, rank, size = self.get_row()[:3]
+        return self.store.iter_nodes("SELECT id, %s FROM nodes WHERE subtree_id = ? AND rank >= ? AND rank < ? "
+                                     "ORDER BY rank" % NODE_COLUMNS, (subtree_id, rank, rank + size))
+
+    iter_postorder = Node.iter_postorder
+    iter_breadth_first = Node.iter_breadth_first
+
+    def get_raw_data(self):
+        return self.get_row()[9]
+
+    def get_data(self):
+        return OrgTreeData(self.get_raw_data()).get_data()
+
+    def get_tags(self):
+        return [row[0] for row in self.store.connection.execute(
+            "SELECT tag FROM tags WHERE node_id = ? ORDER BY rowid", (self.node_id,))]
+
+    def get_type(self):
+        return self.get_row()[6]
+
+    def get_priority(self):
+        return self.get_row()[7]
+
+    def has_schedule(self):
+        return OrgTreeData(self.get_raw_data()).has_schedule()
+
+    def get_schedule(self):
+        return OrgTreeData(self.get_raw_data()).get_schedule()
+
+    def has_deadline(self):
+        return OrgTreeData(self.get_raw_data()).has_deadline()
+
+    def get_deadline(self):
+        return OrgTreeData(self.get_raw_data()).get_deadline()
+
+    def has_properties(self):
+        return OrgTreeData(self.get_raw_data()).has_properties()
+
+    def get_properties(self):
+        return OrgTreeData(self.get_raw_data()).get_properties()
+
+    def load_tree(self):
+        """Parse the subtree into an OrgTree (a HashedOrgTree for a hashed store)."""
+        text = "".join("%s\n%s" % (node.get_row()[8], node.get_raw_data()) for node in self)
+        root = self.store.tree_class()
+        root.read_from_string(text, 0, self.level - 1)
+        return root.get_children()[0]
+
+
+class OrgStore(object):
+    """SQLite database of the headings of Org files.
+
+    Every heading is a row of nodes (parent, level, rank in its top-level
+    subtree, hash, keyword, priority, headline and body) with its tags,
+    its properties (upper-cased keys, with numbers, durations and dates
+    as sortable numbers, see parse_property_value) and its SCHEDULED and
+    DEADLINE stamps (as intervals of seconds, see get_interval) in
+    indexed side tables.  Queries run in SQLite and yield StoredNode
+    views as they go, so a long-running process answers them in
+    constant memory.
+
+    Files are stored as their preamble and their top-level subtrees,
+    each with a fingerprint of its text; sync_file() reparses a file only
+    when its modification time or size changed and then rewrites only
+    the subtrees whose fingerprint is new.
+    """
+
+    def __init__(self, filename, hashed=True):
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript(SCHEMA)
+        self.hashed = hashed
+        self.header_class = HashedHeader if hashed else Header
+        self.tree_class = HashedOrgTree if hashed else OrgTree
+
+    def close(self):
+        self.connection.close()
+
+    def get_nodes(self, query, parameters=()):
+        return list(self.iter_nodes(query, parameters))
+
+    def iter_nodes(self, query, parameters=()):
+        for row in self.connection.execute(query, parameters):
+            yield StoredNode(self, row[0], row[1:])
+
+    def get_file_id(self, filename):
+        row = self.connection.execute("SELECT id FROM files WHERE name = ?", (filename,)).fetchone()
+        return row[0] if row else None
+
+    def get_filenames(self):
+        return [row[0] for row in self.connection.execute("SELECT name FROM files ORDER BY id")]
+
+    def sync_file(self, filename, tree=None):
+        """Bring the rows of a file up to date.
+
+        The file is parsed only if its modification time or size differ
+        from the stored ones, or if the parsed tree is passed in.  The
+        top-level subtrees are matched to the stored ones by fingerprint;
+        only the unmatched ones are deleted or inserted.
+
+        :returns:  tuple -- numbers of subtrees added and removed
+        """
+        stat = os.stat(filename)
+        row = self.connection.execute("SELECT id, mtime, size FROM files WHERE name = ?", (filename,)).fetchone()
+        if tree == None:
+            if row != None and row[1] == stat.st_mtime_ns and row[2] == stat.st_size:
+                return 0, 0
+            tree = self.tree_class()
+            tree.read_from_file(filename, 0, 0)
+        with self.connection:
+            if row == None:
+                file_id = self.connection.execute(
+                    "INSERT INTO files (name, preamble, mtime, size) VALUES (?, ?, ?, ?)",
+                    (filename, tree.get_raw_data() or "", stat.st_mtime_ns, stat.st_size)).lastrowid
+            else:
+                file_id = row[0]
+                self.connection.execute("UPDATE files SET preamble = ?, mtime = ?, size = ? WHERE id = ?",
+                                        (tree.get_raw_data() or "", stat.st_mtime_ns, stat.st_size, file_id))
+            return self.sync_subtrees(file_id, tree.get_children())
+
+    def sync_subtrees(self, file_id, children):
+        unmatched = {}
+        for subtree_id, position, fingerprint in self.connection.execute(
+                "SELECT id, position, fingerprint FROM subtrees WHERE file_id = ? ORDER BY position", (file_id,)):
+            unmatched.setdefault(fingerprint, []).append((subtree_id, position))
+        removed = 0
+        matched = []
+        new = []
+        for position, child in enumerate(children):
+            text = "".join("%s\n%s" % (get_headline(node.get_header()), node.get_raw_data() or "") for node in child)
+            fingerprint = get_fingerprint(text)
+            matches = unmatched.get(fingerprint)
+            if matches:
+                matched.append((position, matches.pop(0)))
+            else:
+                new.append((position, fingerprint, child))
+        for matches in unmatched.values():
+            for subtree_id, position in matches:
+                self.delete_subtree(subtree_id)
+                removed += 1
+        self.connection.executemany("UPDATE subtrees SET position = ? WHERE id = ?",
+                                    [(position, subtree_id) for position, (subtree_id, old_position) in matched
+                                     if position != old_position])
+        next_subtree = self.connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM subtrees").fetchone()[0]
+        next_node = self.connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM nodes").fetchone()[0]
+        subtrees, nodes, tags, properties, planning = [], [], [], [], []
+        for subtree_id, (position, fingerprint, child) in enumerate(new, next_subtree):
+            subtrees.append((subtree_id, file_id, position, fingerprint))
+            ids = {child.parent: None}
+            stack = []
+            for rank, node in enumerate(child):
+                node_id = ids[node] = next_node + len(nodes)
+                while stack and stack[-1][1] is not node.parent:
+                    closed = stack.pop()[0]
+                    nodes[closed][3] = len(nodes) - closed
+                stack.append((len(nodes), node))
+                header = node.get_header()
+                raw = node.get_raw_data() or ""
+                node_hash = header.get_hash() if isinstance(header, HashedHeader) else None
+                nodes.append([node_id, subtree_id, rank, 1, ids[node.parent], node.level, node_hash,
+                              header.get_type(), header.get_priority(), get_headline(header), raw])
+                tags.extend((node_id, tag) for tag in dict.fromkeys(header.get_tags()))
+                if ":PROPERTIES:" in raw:
+                    for key, value in OrgTreeData(raw).get_properties().items():
+                        parsed = parse_property_value(value)
+                        properties.append((node_id, key.upper(), value, parsed and parsed[0], parsed and parsed[1]))
+                if "SCHEDULED:" in raw or "DEADLINE:" in raw:
+                    for keyword, timestamp, parsed, first, last in iter_planning(raw):
+                        planning.append((node_id, keyword, timestamp, first, last, int(last - first >= DAY)))
+            for closed, node in stack:
+                nodes[closed][3] = len(nodes) - closed
+        self.connection.executemany("INSERT INTO subtrees VALUES (?, ?, ?, ?)", subtrees)
+        self.connection.executemany("INSERT INTO nodes (id, %s) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)" %
+                                    NODE_COLUMNS, nodes)
+        self.connection.executemany("INSERT INTO tags VALUES (?, ?)", tags)
+        self.connection.executemany("INSERT INTO properties VALUES (?, ?, ?, ?, ?)", properties)
+        self.connection.executemany("INSERT INTO planning VALUES (?, ?, ?, ?, ?, ?)", planning)
+        return len(new), removed
+
+    def delete_subtree(self, subtree_id):
+        for table in ("tags", "properties", "planning"):
+            self.connection.execute("DELETE FROM %s WHERE node_id IN (SELECT id FROM nodes WHERE subtree_id = ?)"
+                                    % table, (subtree_id,))
+        self.connection.execute("DELETE FROM nodes WHERE subtree_id = ?", (subtree_id,))
+        self.connection.execute("DELETE FROM subtrees WHERE id = ?", (subtree_id,))
+
+    def remove_file(self, filename):
+        file_id = self.get_file_id(filename)
+        if file_id == None:
+            return False
+        with self.connection:
+            for row in self.connection.execute("SELECT id FROM subtrees WHERE file_id = ?", (file_id,)).fetchall():
+                self.delete_subtree(row[0])
+            self.connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        return True
+
+    def get_file_children(self, filename):
+        """Views of the top-level headings of a stored file."""
+        return list(self.select("subtrees.file_id = ? AND nodes.rank = 0", (self.get_file_id(filename),)))
+
+    def load_tree(self, filename):
+        """Parse a stored file back into an OrgTree (a HashedOrgTree for a hashed store)."""
+        row = self.connection.execute("SELECT id, preamble FROM files WHERE name = ?", (filename,)).fetchone()
+        if row == None:
+            return None
+        lines = [row[1]]
+        for line, body in self.connection.execute(
+                "SELECT line, body FROM nodes JOIN subtrees ON subtrees.id = nodes.subtree_id "
+                "WHERE subtrees.file_id = ? ORDER BY subtrees.position, nodes.rank", (row[0],)):
+            lines.append("%s\n%s" % (line, body))
+        tree = self.tree_class()
+        tree.read_from_string("".join(lines))
+        return tree
+
+    def select(self, condition, parameters, order=ORDER):
+        return self.iter_nodes("SELECT nodes.id, %s FROM nodes JOIN subtrees ON subtrees.id = nodes.subtree_id "
+                               "WHERE %s ORDER BY %s" % (NODE_FIELDS, condition, order), parameters)
+
+    def get_subtree_by_hash(self, subtree_hash):
+        """View of the last heading with a hash, as in HashedOrgTree.tree_dict, or None."""
+        for node in self.select("nodes.hash = ?", (subtree_hash,), REVERSE_ORDER + " LIMIT 1"):
+            return node
+        return None
+
+    def iter_tagged(self, tag):
+        """Headings carrying tag themselves, in file and document order."""
+        return self.select("nodes.id IN (SELECT node_id FROM tags WHERE tag = ?)", (tag,))
+
+    def iter_matching(self, condition):
+        """Headings whose own property matches a condition such as ``EFFORT>1:00``.
+
+        The condition is read as by PropertyIndex.compare: numbers,
+        durations and dates are compared with the values of the same
+        kind, quoted values as strings unless they are timestamps.
+        """
+        match = PROPERTY_CONDITION_PATTERN.match(condition)
+        if match == None:
+            raise ValueError("Malformed property condition: %s" % condition)
+        key, op, value = match.group('key').upper(), match.group('op'), match.group('value')
+        if op not in OPERATORS:
+            raise ValueError("Unknown comparison operator: %s" % op)
+        quoted = len(value) > 1 and value[0] == value[-1] == '"'
+        if quoted:
+            value = value[1:-1]
+        parsed = parse_property_value(value)
+        if parsed != None and quoted and parsed[0] != "date":
+            parsed = None
+        if parsed == None:
+            return self.select("nodes.id IN (SELECT node_id FROM properties WHERE key = ? AND value %s ?)"
+                               % OPERATORS[op], (key, value))
+        return self.select("nodes.id IN (SELECT node_id FROM properties WHERE key = ? AND kind = ? AND number %s ?)"
+                           % OPERATORS[op], (key, parsed[0], parsed[1]))
+
+    def iter_window(self, start, end, keyword=None):
+        """SCHEDULED and DEADLINE stamps overlapping [start, end), ordered by start.
+
+        :returns: iterator -- TimeEntry tuples with StoredNode views
+        """
+        first, stop = to_seconds(start), to_seconds(end)
+        query = "SELECT planning.keyword, planning.timestamp, planning.start, planning.end, nodes.id, %s " \
+                "FROM planning JOIN nodes ON nodes.id = planning.node_id " \
+                "WHERE ((planning.long = 0 AND planning.start >= ? AND planning.start < ?) " \
+                "OR (planning.long = 1 AND planning.start < ?)) AND planning.end >= ?" % NODE_FIELDS
+        parameters = [first - DAY, stop, stop, first]
+        if keyword != None:
+            query += " AND planning.keyword = ?"
+            parameters.append(keyword)
+        query += " ORDER BY planning.start, planning.rowid"
+        for row in self.connection.execute(query, parameters):
+            yield TimeEntry(row[0], from_seconds(row[2]), from_seconds(row[3]), StoredNode(self, row[4], row[5:]),
+                            row[1])
@@ -6,19 +6,98 @@
 import re 
 import datetime
 import sys
+import collections
+
+TIMESTAMP_PATTERN = re.compile(r"""
+    (?P<open>[<\[])
+    (?P<date>[0-9]{4}-[0-1][0-9]-[0-3][0-9])
+    (?:\ (?P<weekday>[A-Z][a-z]{2}))?
+    (?:\ (?P<time>[0-2][0-9]:[0-5][0-9])(?:-(?P<end_time>[0-2][0-9]:[0-5][0-9]))?)?
+    (?:\ (?P<modifier>(?:\.\+|\+\+|\+|--|-)[0-9]{1,4}[dwmy]))?
+    (?:\ (?P<second_modifier>(?:\.\+|\+\+|\+|--|-)[0-9]{1,4}[dwmy]))?
+    (?P<rest>.*)
+    (?P<close>[\]>])$
+""", re.X)
+REPEATER_PATTERN = re.compile(r"^(?P<mark>\.\+|\+\+|\+)(?P<num>[0-9]{1,4})(?P<unit>[dwmy])$")
+DELAY_PATTERN = re.compile(r"^(?P<mark>--?)(?P<num>[0-9]{1,4})(?P<unit>[dwmy])$")
+REPEATER_SEARCH_PATTERN = re.compile(r" (?P<repeater>(?:\.\+|\+\+|\+)[0-9]{1,4}[dwmy])")
+DELAY_SEARCH_PATTERN = re.compile(r" (?P<delay>--?[0-9]{1,4}[dwmy])")
+
+ParsedTimestamp = collections.namedtuple(
+    'ParsedTimestamp',
+    ['active', 'date', 'time', 'end_time', 'weekday', 'repeater', 'delay', 'range_end'])
+
+
+def _parse_single_timestamp(string):
+    match = TIMESTAMP_PATTERN.match(string)
+    if match == None:
+        return None
+    open_bracket, date, weekday, time, end_time, modifier, second_modifier, rest, close_bracket = match.groups()
+    try:
+        date = datetime.date.fromisoformat(date)
+        if time != None:
+            time = datetime.time.fromisoformat(time)
+            if end_time != None:
+                end_time = datetime.time.fromisoformat(end_time)
+    except ValueError:
+        return None
+    repeater = delay = None
+    for modifier in (modifier, second_modifier):
+        if modifier == None:
+            break
+        if modifier[0] == "-":
+            delay = delay or modifier
+        else:
+            repeater = repeater or modifier
+    if rest:
+        if repeater == None:
+            repeater_match = REPEATER_SEARCH_PATTERN.search(rest)
+            if repeater_match:
+                repeater = repeater_match.group('repeater')
+        if delay == None:
+            delay_match = DELAY_SEARCH_PATTERN.search(rest)
+            if delay_match:
+                delay = delay_match.group('delay')
+    active = open_bracket == "<" and close_bracket == ">"
+    return ParsedTimestamp(active, date, time, end_time, weekday, repeater, delay, None)
+
+
+def parse_timestamp(string):
+    """Parse a timestamp or a timestamp range in a single pass.
+
+    A range is two stamps joined by ``--``, neither of them carrying a
+    repeater or a delay; its fields describe the first stamp and
+    range_end holds the parsed second one.
+
+    :returns: ParsedTimestamp -- parse result, None if the string is not a timestamp
+    """
+    stamps = string.split("--") if "--" in string else ()
+    if len(stamps) == 2:
+        start = _parse_single_timestamp(stamps[0])
+        if start != None and start.repeater == None and start.delay == None:
+            end = _parse_single_timestamp(stamps[1])
+            if end != None and end.repeater == None and end.delay == None:
+                return start._replace(range_end=end)
+    return _parse_single_timestamp(string)
 
 class MalformedTimestamp(Exception):
     def __init__(self, message):
         Exception.__init__(self, message)
         
 class Timestamp(object):
-    string = None
-    active = None
+    __slots__ = ('string', 'active', 'weekday')
 
-    def __init__(self, string):
-        if not Timestamp.is_valid(string):
-            raise MalformedTimestamp("Malformed timestamp: %s" % string)
+    def __init__(self, string, parsed=None):
+        if parsed == None:
+            parsed = parse_timestamp(string)
+            if parsed == None:
+                raise MalformedTimestamp("Malformed timestamp: %s" % string)
         self.string = string
+        self._load_parsed(parsed)
+
+    def _load_parsed(self, parsed):
+        self.active = parsed.active
+        self.weekday = parsed.weekday
         
     @staticmethod
     def is_valid(string):
@@ -26,24 +105,13 @@ class Timestamp(object):
         
         :returns:  bool -- validation result
         """
-        pattern = re.compile("^[\[\<].{1,}[\]\>]$")
-        if not pattern.match(string):
-            return False
-        pattern = re.compile("^[\[\<][0-9][0-9][0-9][0-9]-[0-1][0-9]-[0-3][0-9].*[\]\>]$")
-        if not pattern.match(string):
-            return False
-        return True
+        return parse_timestamp(string) != None
         
     def is_active(self):
         """Check if the timestamp is active.
         
         :returns:  bool -- active status
         """
-        if self.active == None:
-            self.active = False
-            active_pattern = re.compile("^<.{1,}>$")
-            if active_pattern.match(self.string):
-                self.active = True
         return self.active
         
     def set_active(self, active):
@@ -68,31 +136,19 @@ class Timestamp(object):
         
         :returns:  bool -- is weekday present?
         """
-        pattern = re.compile(".{1,}[0-9] [A-Z][a-z][a-z]")
-        return pattern.match(self.string) != None
+        return self.weekday != None
 
 class TimestampRepeater(object):
-    repeater = -1
-    repeat_interval = None
-    
-    def _extract_repeater(self, line):
-        repeater = re.sub(".{1,} (?P<repeater>[\+]{1,2}[0-9]{1,4}[dwmy]).{1,}", "\g<repeater>", line)
-        return repeater
+    __slots__ = ()
     
     def has_repeater(self):
         return self.get_repeater() != None
                 
     def get_repeater(self):
-        if self.repeater == -1:
-            self.repeater = None
-            schedule_repeater_pattern = re.compile(".{1,} [\+]{1,2}[0-9]{1,4}[dwmy]")
-            if schedule_repeater_pattern.match(self.string):
-                self.repeater = self._extract_repeater(self.string)
         return self.repeater
         
     def set_repeater(self, new_repeater):
-        schedule_repeater_pattern = re.compile("^[\+]{1,2}[0-9]{1,4}[dwmy]$")
-        if not schedule_repeater_pattern.match(new_repeater):
+        if not REPEATER_PATTERN.match(new_repeater):
             return False
         self.repeater = new_repeater
         return True
@@ -107,64 +163,55 @@ class TimestampRepeater(object):
             return False
         
     def get_repeat_interval(self):
-        if self.repeat_interval == None and self.has_repeater():
-            repeater = self.get_repeater()
-            interval = re.sub("\+{1,2}(?P<num>[0-9]{1,4}).{1,}", "\g<num>", repeater)
-            interval = int(interval)
-            unit = re.sub(".{1,}(?P<unit>[dwmy])", "\g<unit>", repeater)
-            return (interval, unit)
+        if self.has_repeater():
+            match = REPEATER_PATTERN.match(self.get_repeater())
+            return (int(match.group('num')), match.group('unit'))
         else:
             return None
 
 class TimestampDelay(object):
-    delay = -1
-    
-    def _extract_delay(self, line):
-        delay = re.sub(".{1,} (?P<repeater>[\-]{1,2}[0-9]{1,4}[dwmy]).{1,}", "\g<repeater>", line)
-        return delay
+    __slots__ = ()
         
     def has_delay(self):
-        if self.delay == -1:
-            self.get_delay()
         return self.delay != None
         
     def get_delay(self):
-        if self.delay == -1:
-            schedule_delay_pattern = re.compile(".{1,} [\-]{1,2}[0-9]{1,4}[dwmy]")
-            self.delay = None
-            if schedule_delay_pattern.match(self.string):
-                self.delay = self._extract_delay(self.string)
         return self.delay
         
     def set_delay(self, new_delay):
-        schedule_delay_pattern = re.compile("^[\-]{1,2}[0-9]{1,4}[dwmy]$")
-        if not schedule_delay_pattern.match(new_delay):
+        if not DELAY_PATTERN.match(new_delay):
             return False
         self.delay = new_delay
         return True
         
     def get_delay_interval(self):
         if self.has_delay():
-            interval = re.sub("[-]{1,2}(?P<num>[0-9]{1,4}).{1,}", "\g<num>", self.delay)
-            interval = int(interval)
-            unit = re.sub(".{1,}(?P<unit>[dwmy])", "\g<unit>", self.delay)
-        return (interval, unit)
+            match = DELAY_PATTERN.match(self.delay)
+            return (int(match.group('num')), match.group('unit'))
+        else:
+            return None
 
 class DateStamp(Timestamp, TimestampRepeater, TimestampDelay):
-    date = None
-    def __init__(self, string):
+    __slots__ = ('date', 'repeater', 'delay')
+
+    def __init__(self, string, parsed=None):
         self.string = string
-        if not DateStamp.is_valid(string):
-            raise MalformedTimestamp("Malformed datestamp: %s" % string)
+        if parsed == None:
+            parsed = parse_timestamp(string)
+            if parsed == None:
+                raise MalformedTimestamp("Malformed datestamp: %s" % string)
+        self._load_parsed(parsed)
+
+    def _load_parsed(self, parsed):
+        self.active = parsed.active
+        self.weekday = parsed.weekday
+        self.date = parsed.date
+        self.repeater = parsed.repeater
+        self.delay = parsed.delay
             
     @staticmethod
     def is_valid(string):
-        if not Timestamp.is_valid(string):
-            return False
-        pattern = re.compile("^.....-..-..( [A-Z][a-z]{2}|.{0})")
-        if not pattern.match(string):
-            return False
-        return True
+        return parse_timestamp(string) != None
         
     def set_date(self, new_date):
         if not isinstance(new_date, datetime.date):
@@ -177,11 +224,6 @@ class DateStamp(Timestamp, TimestampRepeater, TimestampDelay):
         return True
         
     def get_date(self):
-        if self.date == None:
-            year = int(self.string[1:5])
-            month = int(self.string[6:8])
-            day = int(self.string[9:11])
-            self.date = datetime.date(year, month, day)
         return self.date
     def __sub__(self, other):
         return self.get_date() - other.get_date()
@@ -202,26 +244,17 @@ class DateStamp(Timestamp, TimestampRepeater, TimestampDelay):
         return result
         
 class DatetimeStampDuration(object):
-    duration_present = None
+    __slots__ = ()
     
     def has_duration(self):
-        if self.duration_present == None:
-            self.duration_present = False
-            duration_pattern = re.compile(".{1,} [0-2][0-9]:[0-5][0-9]-[0-2][0-9]:[0-5][0-9].{1,}")
-            if duration_pattern.match(self.string):
-                self.duration_present = True
-        return self.duration_present
+        return self.end_time != None
         
     def get_start_datetime(self):
         return self.get_datetime()
 
     def get_end_datetime(self):
         if self.has_duration():
-            date = self.get_date()
-            time_string = re.sub(".{1,}-(?P<time>[0-2][0-9]:[0-5][0-9])", "\g<time>", self.string)
-            hour = int(time_string[0:2])
-            minute = int(time_string[3:5])
-            return datetime.datetime(date.year, date.month, date.day, hour, minute)
+            return datetime.datetime.combine(self.get_date(), self.end_time)
         return None
         
     def get_duration(self):
@@ -235,19 +268,26 @@ class DatetimeStampDuration(object):
             return None
                 
 class DatetimeStamp(DatetimeStampDuration, DateStamp, Timestamp):
-    datetime = -1
-    def __init__(self, string):
+    __slots__ = ('datetime', 'end_time')
+
+    def __init__(self, string, parsed=None):
         self.string = string
-        if not DatetimeStamp.is_valid(string):
+        if parsed == None:
+            parsed = parse_timestamp(string)
+        if parsed == None or parsed.time == None:
             raise MalformedTimestamp("Malformed datetime stamp: %s" % string)
+        self._load_parsed(parsed)
+
+    def _load_parsed(self, parsed):
+        self.active = parsed.active
+        self.weekday = parsed.weekday
+        self.date = parsed.date
+        self.repeater = parsed.repeater
+        self.delay = parsed.delay
+        self.datetime = datetime.datetime.combine(parsed.date, parsed.time)
+        self.end_time = parsed.end_time
 
     def get_datetime(self):
-        if self.datetime == -1:
-            date = self.get_date()
-            time_string = re.sub(".{1,} (?P<time>[0-2][0-9]:[0-5][0-9])", "\g<time>", self.string)
-            hour = int(time_string[0:2])
-            minute = int(time_string[3:5])
-            self.datetime = datetime.datetime(date.year, date.month, date.day, hour, minute)
         return self.datetime
         
     def set_datetime(self, new_datetime):
@@ -258,12 +298,8 @@ class DatetimeStamp(DatetimeStampDuration, DateStamp, Timestamp):
         
     @staticmethod
     def is_valid(string):
-        if not Timestamp.is_valid(string):
-            return False
-        pattern = re.compile(".{5}-.{2}-.{2}( [A-Z][a-z]{2}|.{0}) [0-2][0-9]:[0-5][0-9](.{0}|-[0-2][0-9]:[0-5][0-9])")
-        if not pattern.match(string):
-            return False
-        return True
+        parsed = parse_timestamp(string)
+        return parsed != None and parsed.time != None
         
     def __str__(self):
         pattern = "%Y-%m-%d"
@@ -272,7 +308,7 @@ class DatetimeStamp(DatetimeStampDuration, DateStamp, Timestamp):
         pattern += " %H:%M"
         result = self.get_datetime().strftime(pattern)
         if self.has_duration():
-            end_time = self.get_end_datetime().strftime("-%H-%M")
+            end_time = self.get_end_datetime().strftime("-%H:%M")
             result += end_time
         if self.has_delay():
             result += " %s" % self.get_delay()
@@ -292,9 +328,7 @@ class MalformedRange(Exception):
         Exception.__init__(self, message)
 
 class Range(object):
-    string = None
-    from_timestamp = None
-    to_timestamp = None
+    __slots__ = ('string', 'from_timestamp', 'to_timestamp')
     
     @staticmethod
     def is_valid(string):
@@ -305,6 +339,8 @@ class Range(object):
         
     def __init__(self, string):
         self.string = string
+        self.from_timestamp = None
+        self.to_timestamp = None
         
     def get_to(self):
         return self.to_timestamp
@@ -334,50 +370,40 @@ class Range(object):
         return self.get_from().is_active() and self.get_to().is_active()
         
 class DateRange(Range):
-    def __init__(self, string):
-        if not DateRange.is_valid(string):
-            raise MalformedRange("Malformed date range:")
+    __slots__ = ()
+
+    def __init__(self, string, parsed=None):
+        if parsed == None:
+            parsed = parse_timestamp(string)
+        if parsed == None or parsed.range_end == None:
+            raise MalformedRange("Malformed date range: %s" % string)
         Range.__init__(self, string)
         stamps = string.split("--")
-        self.from_timestamp = DateStamp(stamps[0])
-        self.to_timestamp = DateStamp(stamps[1])
+        self.from_timestamp = DateStamp(stamps[0], parsed)
+        self.to_timestamp = DateStamp(stamps[1], parsed.range_end)
         
     @staticmethod
     def is_valid(string):
-        if not Range.is_valid(string):
-            return False
-        stamps = string.split("--")
-        if not len(stamps) == 2:
-            return False
-        for stamp in stamps:
-            if not DateStamp.is_valid(stamp):
-                return False
-            ds = DateStamp(stamp)
-            if ds.has_repeater() or ds.has_delay():
-                return False		
-        return True
+        parsed = parse_timestamp(string)
+        return parsed != None and parsed.range_end != None
         
 class DatetimeRange(Range):
-    def __init__(self, string):
+    __slots__ = ()
+
+    def __init__(self, string, parsed=None):
         self.string = string
-        if not DatetimeRange.is_valid(string):
+        if parsed == None:
+            parsed = parse_timestamp(string)
+        if not DatetimeRange.is_parsed_range(parsed):
             raise MalformedRange("Malformed datetime range: %s" % string)
         stamps = string.split("--")
-        self.from_timestamp = DatetimeStamp(stamps[0])
-        self.to_timestamp = DatetimeStamp(stamps[1])
+        self.from_timestamp = DatetimeStamp(stamps[0], parsed)
+        self.to_timestamp = DatetimeStamp(stamps[1], parsed.range_end)
+
+    @staticmethod
+    def is_parsed_range(parsed):
+        return parsed != None and parsed.range_end != None and parsed.time != None and parsed.range_end.time != None
         
     @staticmethod
     def is_valid(string):
-        pattern = re.compile("^.{1,}--.{1,}$")
-        if not pattern.match(string):
-            return False
-        stamps = string.split("--")
-        if not len(stamps) == 2:
-            return False
-        for stamp in stamps:
-            if not DatetimeStamp.is_valid(stamp):
-                return False
-            dts = DatetimeStamp(stamp)
-            if dts.has_repeater() or dts.has_delay():
-                return False		
-        return True
+        return DatetimeRange.is_parsed_range(parse_timestamp(string))
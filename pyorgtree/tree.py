@@ -1,24 +1,109 @@
+import collections
+import itertools
+
+
+def set_pickled_state(obj, state):
+    """Set the attributes unpickled for obj.
+
+    state is the (__dict__, slots) pair pickled for a slotted object or,
+    in pickles written before the classes had __slots__, the __dict__.
+    """
+    if isinstance(state, tuple):
+        state = dict(state[0] or {}, **(state[1] or {}))
+    for name, value in state.items():
+        setattr(obj, name, value)
+
+
 class Node(object):
-    parent = None
-    children = []
+    __slots__ = ('parent', 'children', 'structure_version')
+    _structure_versions = itertools.count(1)
+
+    def get_root(self):
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    def structure_changed(self):
+        """Invalidate the indexes over the tree of this node; called whenever links between its nodes change."""
+        self.get_root().structure_version = next(Node._structure_versions)
+
+    def get_structure_version(self):
+        """Number that changes whenever nodes of the tree of this node are linked or unlinked.
+
+        Numbers are unique across trees, so moving a node into another
+        tree changes it as well.
+        """
+        return self.get_root().structure_version
+
     def __iter__(self):
-        yield self
-        for child in self.children:
-            for item in child:
-                yield item
+        return self.iter_preorder()
+
+    def iter_preorder(self, prune=None):
+        """Iterate over the subtree in document order.
+
+        :param prune: optional predicate; a node for which it returns True
+                      is skipped together with all of its descendants
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if prune is not None and prune(node):
+                continue
+            yield node
+            if node.children:
+                stack.extend(reversed(node.children))
+
+    def iter_postorder(self, prune=None):
+        """Iterate over the subtree yielding children before their parent."""
+        if prune is not None and prune(self):
+            return
+        stack = [(self, iter(self.children))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if prune is None or not prune(child):
+                    stack.append((child, iter(child.children)))
+                    break
+            else:
+                stack.pop()
+                yield node
+
+    def iter_breadth_first(self, prune=None):
+        """Iterate over the subtree level by level."""
+        if prune is not None and prune(self):
+            return
+        queue = collections.deque([self])
+        while queue:
+            node = queue.popleft()
+            yield node
+            for child in node.children:
+                if prune is None or not prune(child):
+                    queue.append(child)
+
     def add_child(self, new_child):
         self.children.append(new_child)
+        self.structure_changed()
     def has_children(self):
         return len(self.children) > 0
 
     def __init__(self):
+        self.parent = None
         self.children = []
+        self.structure_version = 0
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            self.__init__()
+        self.structure_version = 0
+        set_pickled_state(self, state)
 
     def get_parent(self):
         return self.parent
 
     def set_parent(self, parent):
         self.parent = parent
+        self.structure_changed()
 
     def get_children(self):
         return self.children
@@ -30,3 +115,87 @@ class Node(object):
             return self.children[item_index-1]
         else:
             raise IndexError("Node index out of range")
+
+
+class StructuralIndex(object):
+    """Document order numbering of a tree for constant-time structural queries.
+
+    Every node gets its position in document order (the Euler tour entry
+    number), its depth below the indexed root and the size of its subtree,
+    so that the subtree of a node is the run of positions
+    [entry, entry + size).  The numbering is rebuilt lazily on the first
+    query after any node of the tree was linked or unlinked.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.version = None
+        self.positions = None
+        self.order = None
+        self.depths = None
+        self.sizes = None
+
+    def rebuild(self):
+        positions = {}
+        order = []
+        depths = []
+        parents = []
+        stack = [(self.root, 0, -1)]
+        while stack:
+            node, depth, parent = stack.pop()
+            position = len(order)
+            positions[node] = position
+            order.append(node)
+            depths.append(depth)
+            parents.append(parent)
+            if node.children:
+                stack.extend((child, depth + 1, position) for child in reversed(node.children))
+        sizes = [1] * len(order)
+        for position in range(len(order) - 1, 0, -1):
+            sizes[parents[position]] += sizes[position]
+        self.positions = positions
+        self.order = order
+        self.depths = depths
+        self.sizes = sizes
+        self.version = self.root.get_structure_version()
+
+    def get_position(self, node):
+        if self.version != self.root.get_structure_version():
+            self.rebuild()
+        try:
+            return self.positions[node]
+        except KeyError:
+            raise ValueError("Node is not in the indexed tree")
+
+    def __len__(self):
+        if self.version != self.root.get_structure_version():
+            self.rebuild()
+        return len(self.order)
+
+    def get_entry(self, node):
+        return self.get_position(node)
+
+    def get_exit(self, node):
+        position = self.get_position(node)
+        return position + self.sizes[position] - 1
+
+    def depth(self, node):
+        position = self.get_position(node)
+        return self.depths[position]
+
+    def subtree_size(self, node):
+        """Number of nodes in the subtree of node, node included."""
+        position = self.get_position(node)
+        return self.sizes[position]
+
+    def is_ancestor(self, ancestor, node):
+        """True if node lies strictly inside the subtree of ancestor."""
+        start = self.get_position(ancestor)
+        position = self.get_position(node)
+        return start < position < start + self.sizes[start]
+
+    def nth(self, position):
+        """The node at the given position in document order, the root being 0."""
+        if self.version != self.root.get_structure_version():
+            self.rebuild()
+        return self.order[position]
@@ -0,0 +1,108 @@
+from pyorgtree.pyorgtree import *
+from pyorgtree.agenda import *
+import datetime
+import itertools
+
+TEXT = """* a
+  SCHEDULED: <2013-08-11 Sun +1w>
+* b
+  DEADLINE: <2013-08-20 Tue -3d>
+* c
+  SCHEDULED: <2013-08-12 Mon 10:00-11:00 .+2d>
+* d
+  SCHEDULED: <2013-08-13 Tue>
+* e
+  SCHEDULED: <2013-08-01 Thu --2d ++1w>
+"""
+
+
+def describe(occurrences):
+    return [(occurrence.shown.strftime("%m-%d %H:%M"), occurrence.node.get_header().get_title())
+            for occurrence in occurrences]
+
+
+class TestInterval(object):
+    def test_add_interval(self):
+        moment = datetime.datetime(2013, 1, 31, 10, 0)
+        assert add_interval(moment, 1, "m") == datetime.datetime(2013, 2, 28, 10, 0)
+        assert add_interval(moment, 2, "m") == datetime.datetime(2013, 3, 31, 10, 0)
+        assert add_interval(moment, -2, "m") == datetime.datetime(2012, 11, 30, 10, 0)
+        assert add_interval(moment, 1, "y") == datetime.datetime(2014, 1, 31, 10, 0)
+        assert add_interval(moment, 2, "w") == datetime.datetime(2013, 2, 14, 10, 0)
+
+    def test_first_repeat(self):
+        base = datetime.datetime(2013, 1, 31)
+        assert first_repeat(base, 1, "d", base - datetime.timedelta(days=5)) == 0
+        assert first_repeat(base, 3, "d", datetime.datetime(2013, 2, 6)) == 2
+        assert first_repeat(base, 1, "m", datetime.datetime(2013, 3, 1)) == 2
+        assert first_repeat(base, 1, "y", datetime.datetime(2020, 6, 1)) == 8
+
+
+class TestExpand(object):
+    def test_repeater(self):
+        stamp = ScheduleAbstractFactory.get_schedule("SCHEDULED: <2013-08-31 Sat 09:00-09:30 +1m>")
+        occurrences = list(expand(stamp, datetime.date(2013, 9, 1), datetime.date(2014, 1, 1)))
+        assert [occurrence.start.date() for occurrence in occurrences] == \
+            [datetime.date(2013, 9, 30), datetime.date(2013, 10, 31), datetime.date(2013, 11, 30), datetime.date(2013, 12, 31)]
+        assert occurrences[0].end == datetime.datetime(2013, 9, 30, 9, 30)
+        assert occurrences[0].keyword == "SCHEDULED"
+
+    def test_single(self):
+        stamp = ScheduleAbstractFactory.get_schedule("SCHEDULED: <2013-08-01 Thu>--<2013-08-20 Tue>")
+        assert len(list(expand(stamp, datetime.date(2013, 8, 10), datetime.date(2013, 8, 11)))) == 1
+        assert list(expand(stamp, datetime.date(2013, 8, 21), datetime.date(2013, 9, 1))) == []
+
+    def test_merge(self):
+        tasks = [("x", ScheduleAbstractFactory.get_schedule("SCHEDULED: <2013-08-01 Thu +%dd>" % days))
+                 for days in (2, 3)]
+        occurrences = merge_occurrences(tasks, datetime.date(2013, 8, 1), datetime.date(2013, 8, 8))
+        assert [occurrence.start.day for occurrence in occurrences] == [1, 1, 3, 4, 5, 7, 7]
+
+
+class TestAgenda(object):
+    def test_week(self):
+        tree = OrgTree()
+        tree.read_from_string(TEXT)
+        agenda = Agenda(tree)
+        week = agenda.get_occurrences(datetime.date(2013, 8, 12), datetime.date(2013, 8, 19))
+        assert describe(week) == [("08-12 10:00", "c"), ("08-13 00:00", "d"), ("08-14 10:00", "c"),
+                                  ("08-15 00:00", "e"), ("08-16 10:00", "c"), ("08-18 00:00", "a"),
+                                  ("08-18 10:00", "c")]
+        deadlines = agenda.get_occurrences(datetime.date(2013, 8, 12), datetime.date(2013, 8, 19), keyword="DEADLINE")
+        assert deadlines == []
+
+    def test_warnings(self):
+        tree = OrgTree()
+        tree.read_from_string(TEXT)
+        agenda = Agenda(tree)
+        week = agenda.get_occurrences(datetime.date(2013, 8, 12), datetime.date(2013, 8, 19), "DEADLINE", warnings=True)
+        assert describe(week) == [("08-17 00:00", "b")]
+        assert week[0].start == datetime.datetime(2013, 8, 20)
+        first = agenda.get_occurrences(datetime.date(2013, 8, 1), datetime.date(2013, 8, 9), warnings=True)
+        assert [occurrence.shown.day for occurrence in first if occurrence.node.get_header().get_title() == "e"] == [3, 8]
+
+    def test_delay_longer_than_repeat(self):
+        tree = OrgTree()
+        tree.read_from_string("* a\n  SCHEDULED: <2024-01-04 Thu +3w --5w>\n")
+        agenda = Agenda(tree)
+        window = agenda.get_occurrences(datetime.date(2024, 1, 18), datetime.date(2024, 1, 29), warnings=True)
+        assert [(occurrence.start.day, occurrence.shown.day) for occurrence in window] == [(25, 25)]
+        window = agenda.get_occurrences(datetime.date(2024, 1, 18), datetime.date(2024, 2, 20), warnings=True)
+        assert [(occurrence.start.date(), occurrence.shown.date()) for occurrence in window] == \
+            [(datetime.date(2024, 1, 25), datetime.date(2024, 1, 25)),
+             (datetime.date(2024, 1, 4), datetime.date(2024, 2, 8)),
+             (datetime.date(2024, 2, 15), datetime.date(2024, 2, 15))]
+
+    def test_delayed_repeat(self):
+        tree = OrgTree()
+        tree.read_from_string("* a\n  SCHEDULED: <2024-01-01 Mon +1w -3d>\n")
+        agenda = Agenda(tree)
+        for day in [1, 3, 4]:
+            window = agenda.get_occurrences(datetime.date(2024, 1, day), datetime.date(2024, 1, 5), warnings=True)
+            assert [(occurrence.start.day, occurrence.shown.day) for occurrence in window] == [(1, 4)]
+
+    def test_lazy(self):
+        tree = OrgTree()
+        tree.read_from_string(TEXT)
+        occurrences = Agenda(tree).iter_occurrences(datetime.date(2013, 8, 12), datetime.date(9000, 1, 1))
+        assert len(list(itertools.islice(occurrences, 100))) == 100
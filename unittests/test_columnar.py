@@ -0,0 +1,104 @@
+from pyorgtree.pyorgtree import *
+from pyorgtree import columnar
+from pyorgtree.columnar import *
+import glob
+import gzip
+import tempfile
+import os
+
+
+def describe(tree):
+    result = []
+    for node in tree:
+        header = node.get_header()
+        parent = node.get_parent()
+        parent_header = parent.get_header() if parent != None else None
+        result.append((node.level, header and header.get_string(), node.get_data(),
+                       parent_header and parent_header.get_string(), len(node.get_children())))
+    return result
+
+
+class TestColumnarOrgTree(object):
+    def test_same_as_org_tree(self):
+        for filename in sorted(glob.glob('unittests/test_data/*.org')):
+            tree = HashedOrgTree()
+            tree.read_from_file(filename, 0, 0)
+            store = ColumnarOrgTree(hashed=True)
+            store.read_from_file(filename)
+            assert describe(store) == describe(tree)
+            assert [node.level for node in store.iter_postorder()] == [node.level for node in tree.iter_postorder()]
+            assert sorted(store.get_tree_dict()) == sorted(tree.get_tree_dict())
+            for tag, trees in tree.get_tag_dict().items():
+                assert [node.get_header().get_string() for node in store.get_trees_by_tag(tag)] == \
+                    [node.get_header().get_string() for node in trees]
+
+    def test_views(self):
+        store = ColumnarOrgTree()
+        store.read_from_string("preamble\n* TODO [#A] a :x:y:\nbody a\n** b\n   SCHEDULED: <2013-09-20 Fri>\n* DONE c :y:\n")
+        assert len(store) == 4
+        assert store.get_data() == "preamble\n"
+        a, c = store.get_children()
+        assert a.get_header().get_title() == "a"
+        assert a.get_type() == "TODO" and a.get_priority() == "A" and a.get_tags() == ("x", "y")
+        assert a.get_data() == "body a\n"
+        b = a[1]
+        assert b.get_parent() == a and a.get_parent() == store
+        assert b.has_schedule()
+        assert not c.has_children()
+        assert [node.index for node in store.iter_breadth_first()] == [0, 1, 3, 2]
+        assert [node.index for node in store.iter_preorder(lambda node: node.level == 2)] == [0, 1, 3]
+
+    def test_select_rows(self):
+        store = ColumnarOrgTree()
+        store.read_from_string("* TODO a :x:\n** TODO b :x:y:\n** DONE c :x:\n* TODO d\n** NEXT [#B] e :y:\n")
+        saved = columnar.numpy
+        try:
+            for module in set([None, saved]):
+                columnar.numpy = module
+                assert list(store.select_rows(keyword="TODO")) == [1, 2, 4]
+                assert list(store.select_rows(keyword="TODO", tag="x")) == [1, 2]
+                assert list(store.select_rows(tag="y", level=2)) == [2, 5]
+                assert list(store.select_rows(priority="B")) == [5]
+                assert list(store.select_rows(within=store[2])) == [4, 5]
+                assert list(store.select_rows(keyword="WAIT")) == []
+                assert [node.get_header().get_title() for node in store.select(tagged=True, within=1)] == ["a", "b", "c"]
+        finally:
+            columnar.numpy = saved
+
+    def test_compressed_and_empty(self):
+        fd, filename = tempfile.mkstemp(suffix=".org.gz")
+        os.close(fd)
+        try:
+            with gzip.open(filename, 'wt') as out:
+                out.write("* a\n** b\n")
+            store = ColumnarOrgTree()
+            store.read_from_file(filename)
+            assert [node.level for node in store] == [0, 1, 2]
+            with open(filename, 'w'):
+                pass
+            store.read_from_file(filename)
+            assert len(store) == 1 and store.get_children() == []
+        finally:
+            os.unlink(filename)
+
+    def test_binary(self):
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            for name in sorted(glob.glob('unittests/test_data/*.org')):
+                store = ColumnarOrgTree(hashed=True)
+                store.read_from_file(name)
+                store.binary_dump(filename)
+                loaded = ColumnarOrgTree()
+                loaded.read_from_binary(filename)
+                assert describe(loaded) == describe(store)
+                assert sorted(loaded.get_tree_dict()) == sorted(store.get_tree_dict())
+                assert list(loaded.select_rows(tagged=True)) == list(store.select_rows(tagged=True))
+                tree = HashedOrgTree()
+                tree.binary_load(filename)
+                assert describe(tree) == describe(store)
+                loaded.binary_dump(filename + ".copy")
+                assert open(filename + ".copy", 'rb').read() == open(filename, 'rb').read()
+                os.unlink(filename + ".copy")
+        finally:
+            os.unlink(filename)
@@ -0,0 +1,37 @@
+from pyorgtree.corpus import *
+
+FILES = ['unittests/test_data/tree01.org', 'unittests/test_data/tree03.org', 'unittests/test_data/tree04.org']
+
+
+class TestCorpus(object):
+    def test_load_sequential(self):
+        forest = load_corpus(FILES, processes=1)
+        assert len(forest.get_children()) == 3
+        assert forest.get_filenames() == FILES
+        for filename, file_tree in zip(FILES, forest.get_children()):
+            assert forest.get_file_tree(filename) is file_tree
+            assert file_tree.get_parent() is forest
+        assert forest.get_file_by_hash('45678') == FILES[1]
+        assert forest.get_file_by_hash('38402') == FILES[2]
+        assert forest.get_subtree_by_hash('38402').get_header().get_title() == "dignissim vitae mattis et"
+        tagged = forest.get_trees_by_tag_with_files('tag1')
+        assert [filename for filename, _ in tagged] == [FILES[1], FILES[1], FILES[2]]
+        assert [tree for _, tree in tagged] == forest.get_trees_by_tag('tag1')
+
+    def test_hash_collisions(self):
+        forest = load_corpus(FILES, processes=1)
+        assert forest.has_hash_collisions()
+        collisions = forest.get_hash_collisions()
+        assert sorted(collisions.keys()) == ['12345', '23456', '34567', '38399', '38400', '45678', '89238']
+        assert [filename for filename, _ in collisions['38399']] == [FILES[1], FILES[2]]
+
+    def test_load_parallel(self):
+        sequential = load_corpus(FILES, processes=1)
+        parallel = load_corpus(FILES, processes=2)
+        assert parallel.get_filenames() == FILES
+        assert sorted(parallel.get_tree_dict().keys()) == sorted(sequential.get_tree_dict().keys())
+        for tree_hash, (filename, tree) in sequential.hash_index.items():
+            assert parallel.hash_index[tree_hash][0] == filename
+            assert parallel.get_subtree_by_hash(tree_hash).get_header() == tree.get_header()
+            assert parallel.get_subtree_by_hash(tree_hash).get_data() == tree.get_data()
+        assert sorted(parallel.get_hash_collisions().keys()) == sorted(sequential.get_hash_collisions().keys())
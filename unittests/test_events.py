@@ -0,0 +1,44 @@
+from pyorgtree.pyorgtree import *
+import io
+
+
+class TestEvents(object):
+    def test_events_match_tree(self):
+        filename = 'unittests/test_data/tree03.org'
+        tree = HashedOrgTree()
+        tree.read_from_file(filename, 0, 0)
+        expected = [(node.get_header().get_level(), node.get_header().get_hash()) for node in tree if node.get_header()]
+        started = []
+        for event in iter_events(filename, hashed=True):
+            if event.get_type() == START_HEADING:
+                started.append((event.get_header().get_level(), event.get_header().get_hash()))
+        assert started == expected
+
+    def test_event_nesting(self):
+        stream = io.StringIO("preamble\n* a\nbody a\n*** b\n** c\n* d\n")
+        events = [(event.get_type(), event.get_header() and event.get_header().get_title(), event.get_data())
+                  for event in iter_events(stream)]
+        assert events == [
+            (BODY_CHUNK, None, "preamble\n"),
+            (START_HEADING, "a", None),
+            (BODY_CHUNK, "a", "body a\n"),
+            (START_HEADING, "b", None),
+            (END_HEADING, "b", None),
+            (START_HEADING, "c", None),
+            (END_HEADING, "c", None),
+            (END_HEADING, "a", None),
+            (START_HEADING, "d", None),
+            (END_HEADING, "d", None),
+        ]
+
+    def test_body_reassembles_data(self):
+        filename = 'unittests/test_data/tree04.org'
+        tree = HashedOrgTree()
+        tree.read_from_file(filename, 0, 0)
+        bodies = {}
+        for event in iter_events(filename, hashed=True):
+            if event.get_type() == BODY_CHUNK and event.get_header():
+                key = event.get_header().get_hash()
+                bodies[key] = bodies.get(key, "") + event.get_data()
+        for key, subtree in tree.get_tree_dict().items():
+            assert bodies.get(key, "") == subtree.get_data()
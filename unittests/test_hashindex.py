@@ -0,0 +1,90 @@
+from pyorgtree.pyorgtree import *
+from pyorgtree.hashindex import *
+import glob
+import gzip
+import os
+import shutil
+import tempfile
+import pytest
+
+TEXT = """preamble
+* TODO aaaaa: First :x:
+  body of first
+** bbbbb: Second
+   body of second
+*** ccccc: Third
+* ddddd: Fourth
+  last body
+"""
+
+
+class TestHashIndex(object):
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "notes.org")
+        with open(self.filename, 'w') as out:
+            out.write(TEXT)
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.directory)
+
+    def test_lookup(self):
+        index = HashIndex(self.filename)
+        assert len(index) == 4
+        assert os.path.exists(get_hash_index_path(self.filename))
+        assert "bbbbb" in index and "zzzzz" not in index
+        assert index.find("bbbbb")[2] == 2
+        assert index.read_subtree("bbbbb") == b"** bbbbb: Second\n   body of second\n*** ccccc: Third\n"
+        second = index.get_subtree_by_hash("bbbbb")
+        assert second.get_header().get_title() == "Second"
+        assert second.level == 2
+        assert [child.get_header().get_hash() for child in second.get_children()] == ["ccccc"]
+        assert index.get_subtree_by_hash("ddddd").get_data() == "  last body\n"
+        assert index.get_subtree_by_hash("zzzzz") == None
+        for bad_hash in ["bbbbé", "bbbb", "bbbbbb", "BBBBB", "", None]:
+            assert index.find(bad_hash) == None
+            assert index.get_subtree_by_hash(bad_hash) == None
+        assert index.verify()
+        index.close()
+
+    def test_same_as_full_parse(self):
+        for filename in sorted(glob.glob('unittests/test_data/*.org')):
+            tree = HashedOrgTree()
+            tree.read_from_file(filename, 0, 0)
+            index_filename = os.path.join(self.directory, "test.hashidx")
+            index = HashIndex(filename, index_filename)
+            for subtree_hash, node in tree.get_tree_dict().items():
+                found = index.get_subtree_by_hash(subtree_hash)
+                assert [n.get_header().get_string() for n in found] == [n.get_header().get_string() for n in node]
+                assert found.get_data() == node.get_data()
+            index.close()
+
+    def test_stale(self):
+        write_hash_index(self.filename)
+        with open(self.filename, 'a') as out:
+            out.write("* eeeee: Fifth\n")
+        index = HashIndex(self.filename, rebuild=False)
+        with pytest.raises(StaleHashIndex):
+            index.find("aaaaa")
+        assert get_subtree_by_hash(self.filename, "eeeee").get_header().get_title() == "Fifth"
+        assert len(HashIndex(self.filename, rebuild=False)) == 5
+
+    def test_changed_subtree(self):
+        index = HashIndex(self.filename)
+        assert not index.verify()
+        assert len(index) == 4 and index.verify()
+        stat = os.stat(self.filename)
+        with open(self.filename, 'w') as out:
+            out.write(TEXT.replace("body of second", "BODY OF SECOND"))
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert not index.verify()
+        with pytest.raises(StaleHashIndex):
+            index.get_subtree_by_hash("bbbbb")
+        assert index.get_subtree_by_hash("ddddd").get_header().get_title() == "Fourth"
+        index.close()
+
+    def test_compressed(self):
+        with gzip.open(self.filename + ".gz", 'wt') as out:
+            out.write(TEXT)
+        with pytest.raises(ValueError):
+            write_hash_index(self.filename + ".gz")
@@ -0,0 +1,222 @@
+from pyorgtree.pyorgtree import *
+from pyorgtree.columnar import ColumnarOrgTree
+from pyorgtree.corpus import load_corpus
+from pyorgtree.index import *
+import datetime
+import os
+import shutil
+import tempfile
+import pytest
+
+TEXT = """#+FILETAGS: :project:
+* a :work:
+** b :urgent:
+*** c
+** d :someday:
+* e :home:private:
+** f
+"""
+
+
+def titles(nodes):
+    return [node.get_header().get_title() for node in nodes]
+
+
+class TestTagExpression(object):
+    def test_parse(self):
+        assert parse_tag_expression("+work-someday|urgent") == [(["work"], ["someday"]), (["urgent"], [])]
+        assert parse_tag_expression("work&home") == [(["work", "home"], [])]
+
+    def test_malformed(self):
+        for expression in ["", "+work|", "work+&:"]:
+            with pytest.raises(MalformedTagExpression):
+                parse_tag_expression(expression)
+
+    def test_filetags(self):
+        assert parse_filetags("#+FILETAGS: :a:b:\n#+filetags: c\n") == ["a", "b", "c"]
+
+
+class TestTagIndex(object):
+    def test_inheritance(self):
+        tree = OrgTree()
+        tree.read_from_string(TEXT)
+        index = TagIndex(tree, exclude_from_inheritance=["private"])
+        c = tree.get_children()[0].get_children()[0].get_children()[0]
+        assert index.get_tags(c) == ["project", "work", "urgent"]
+        assert index.has_tag(c, "urgent")
+        assert not index.has_tag(c, "home")
+        assert titles(index.match("+work-someday")) == ["a", "b", "c"]
+        assert titles(index.match("urgent|home")) == ["b", "c", "e", "f"]
+        assert titles(index.match("+private")) == ["e"]
+        assert titles(index.match("project-work")) == ["e", "f"]
+        assert index.match("+missing") == []
+        assert index.count("+project") == 6
+
+    def test_rebuild_after_add_child(self):
+        tree = OrgTree()
+        tree.read_from_string(TEXT)
+        index = TagIndex(tree)
+        assert index.count("home") == 2
+        masks = index.masks
+        OrgTree().read_from_string(TEXT)
+        assert index.count("home") == 2 and index.masks is masks
+        child = OrgTree()
+        child.read_from_string("*** g\n", level=2)
+        tree.get_children()[1].get_children()[0].add_child(child.get_children()[0])
+        assert index.count("home") == 3
+
+    def test_columnar(self):
+        tree = OrgTree()
+        tree.read_from_string(TEXT)
+        store = ColumnarOrgTree()
+        store.read_from_string(TEXT)
+        expected = TagIndex(tree, exclude_from_inheritance=["private"])
+        index = TagIndex(store, exclude_from_inheritance=["private"])
+        for expression in ["+work-someday", "urgent|home", "+private", "project-work"]:
+            assert titles(index.match(expression)) == titles(expected.match(expression))
+        assert index.get_tags(store.node(3)) == ["project", "work", "urgent"]
+
+    def test_corpus(self):
+        forest = load_corpus(['unittests/test_data/tree01.org', 'unittests/test_data/tree03.org'], processes=1)
+        assert TagIndex(forest).count("tag1") == 6
+        index = TagIndex(forest)
+        assert all(node.get_header() != None for node in index.match("-tag1"))
+        assert len(index.match("-tag1")) == len([node for node in forest if node.get_header()]) - 6
+
+    def test_corpus_filetags(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filenames = []
+            for name, text in [("a.org", "#+FILETAGS: :alpha:\n* a1\n** a2 :x:\n"), ("b.org", "* b1 :x:\n")]:
+                filenames.append(os.path.join(directory, name))
+                with open(filenames[-1], 'w') as out:
+                    out.write(text)
+            index = TagIndex(load_corpus(filenames, processes=1))
+            assert titles(index.match("alpha")) == ["a1", "a2"]
+            assert titles(index.match("x-alpha")) == ["b1"]
+        finally:
+            shutil.rmtree(directory)
+
+PROPERTY_TEXT = """#+PROPERTY: CATEGORY home
+* a
+  :PROPERTIES:
+  :CATEGORY: ops
+  :Effort:   1:30
+  :ID:       a-id
+  :END:
+** b
+   :PROPERTIES:
+   :EFFORT: 0:45
+   :END:
+*** c
+** d
+   :PROPERTIES:
+   :CATEGORY: dev
+   :DUE: <2013-08-11 Sun>
+   :END:
+* e
+  :PROPERTIES:
+  :EFFORT: 2:00
+  :DUE: 2013-09-01
+  :SIZE: 10
+  :END:
+"""
+
+
+class TestPropertyIndex(object):
+    def test_values(self):
+        assert parse_property_value("2d 1:30") == ("duration", 2970)
+        assert parse_property_value("-2.5") == ("number", -2.5)
+        assert parse_property_value("<2013-08-11 Sun 01:00>")[0] == "date"
+        assert parse_property_value("ops") == None
+
+    def test_queries(self):
+        tree = OrgTree()
+        tree.read_from_string(PROPERTY_TEXT)
+        index = PropertyIndex(tree)
+        assert titles(index.match("EFFORT>1:00")) == ["a", "e"]
+        assert titles(index.match("effort<=1:30")) == ["a", "b"]
+        assert titles(index.match('CATEGORY="ops"')) == ["a"]
+        assert titles(index.match("CATEGORY<>ops")) == ["d"]
+        assert titles(index.match('DUE<"<2013-08-20>"')) == ["d"]
+        assert titles(index.match("SIZE>=10")) == ["e"]
+        assert index.get_by_id("a-id").get_header().get_title() == "a"
+        assert index.get_by_id("missing") == None
+        assert index.get_keys() == ["CATEGORY", "DUE", "EFFORT", "ID", "SIZE"]
+        with pytest.raises(ValueError):
+            index.match("EFFORT")
+
+    def test_inheritance(self):
+        tree = OrgTree()
+        tree.read_from_string(PROPERTY_TEXT)
+        index = PropertyIndex(tree)
+        c = tree.get_children()[0].get_children()[0].get_children()[0]
+        assert index.get_property(c, "category") == None
+        assert index.get_property(c, "category", inherit=True) == "ops"
+        assert index.get_property(c, "effort", inherit=True) == "0:45"
+        assert index.get_inherited_properties(c) is index.get_inherited_properties(c.get_parent())
+        assert titles(index.match("CATEGORY=ops", inherit=True)) == ["a", "b", "c"]
+        assert titles(index.match("CATEGORY=home", inherit=True)) == ["e"]
+        assert titles(index.match("EFFORT<1:00", inherit=True)) == ["b", "c"]
+
+    def test_columnar(self):
+        tree = OrgTree()
+        tree.read_from_string(PROPERTY_TEXT)
+        store = ColumnarOrgTree()
+        store.read_from_string(PROPERTY_TEXT)
+        expected = PropertyIndex(tree)
+        index = PropertyIndex(store)
+        for condition in ["EFFORT>1:00", "CATEGORY=ops", "DUE>2013-01-01", "ID=a-id"]:
+            for inherit in (False, True):
+                assert titles(index.match(condition, inherit)) == titles(expected.match(condition, inherit))
+
+TIME_TEXT = """* a
+  SCHEDULED: <2013-08-11 Sun>
+* b
+  DEADLINE: <2013-08-14 Wed 10:00> SCHEDULED: <2013-08-12 Mon 09:00-11:00>
+* c
+  SCHEDULED: <2013-07-01 Mon>--<2013-09-01 Sun>
+* d
+  CLOSED: [2013-08-11 Sun 12:00]
+* e
+  SCHEDULED: <2013-08-20 Tue +1w>
+"""
+
+
+class TestTimeIndex(object):
+    def test_interval(self):
+        assert get_interval(parse_timestamp("<2013-08-11 Sun>"))[1] - get_interval(parse_timestamp("<2013-08-11 Sun>"))[0] == 86399
+        first, last = get_interval(parse_timestamp("<2013-08-12 Mon 09:00-11:00>"))
+        assert from_seconds(first) == datetime.datetime(2013, 8, 12, 9, 0)
+        assert from_seconds(last) == datetime.datetime(2013, 8, 12, 11, 0)
+        assert to_seconds(datetime.date(2013, 8, 12)) == to_seconds(datetime.datetime(2013, 8, 12))
+
+    def test_query(self):
+        tree = OrgTree()
+        tree.read_from_string(TIME_TEXT)
+        index = TimeIndex(tree)
+        assert len(index) == 5
+        week = index.query(datetime.date(2013, 8, 12), datetime.date(2013, 8, 19))
+        assert [(entry.keyword, entry.node.get_header().get_title()) for entry in week] == \
+            [("SCHEDULED", "c"), ("SCHEDULED", "b"), ("DEADLINE", "b")]
+        assert week[1].start == datetime.datetime(2013, 8, 12, 9, 0)
+        assert week[1].timestamp == "<2013-08-12 Mon 09:00-11:00>"
+        assert index.count(datetime.date(2013, 8, 11), datetime.date(2013, 8, 12)) == 2
+        assert index.count(datetime.datetime(2013, 8, 12, 11, 0), datetime.date(2013, 8, 13)) == 2
+        assert index.count(datetime.datetime(2013, 8, 12, 11, 1), datetime.date(2013, 8, 13)) == 1
+        assert index.count(datetime.date(2013, 9, 2), datetime.date(2014, 1, 1)) == 0
+        deadlines = index.query(datetime.date(2013, 8, 1), datetime.date(2013, 9, 1), keyword="DEADLINE")
+        assert [entry.node.get_header().get_title() for entry in deadlines] == ["b"]
+        stamp = index.get_stamp(index.find_entries(datetime.date(2013, 8, 20), datetime.date(2013, 8, 21))[-1])
+        assert isinstance(stamp, ScheduleDate) and stamp.get_repeater() == "+1w"
+
+    def test_columnar(self):
+        tree = OrgTree()
+        tree.read_from_string(TIME_TEXT)
+        store = ColumnarOrgTree()
+        store.read_from_string(TIME_TEXT)
+        start, end = datetime.date(2013, 8, 1), datetime.date(2013, 9, 1)
+        assert [(entry.keyword, entry.start, entry.end, entry.node.get_header().get_title())
+                for entry in TimeIndex(store).query(start, end)] == \
+            [(entry.keyword, entry.start, entry.end, entry.node.get_header().get_title())
+             for entry in TimeIndex(tree).query(start, end)]
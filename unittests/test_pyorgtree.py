@@ -2,7 +2,9 @@
 from pyorgtree.pyorgtree import *
 import tempfile
 import os
+import json
 import datetime
+import pytest
 from logging import debug, log, info
 
 class TestHeaderTags(object):
@@ -218,6 +220,48 @@ class TestHeaderType(object):
         assert header.get_level() == 3
         
 class TestHeader(object):
+    def test_title_metacharacters(self):
+        header = Header("** TODO fix (a+b)* [x] TODO list :tag1:")
+        assert header.get_type() == "TODO"
+        assert header.get_title() == "fix (a+b)* [x] TODO list"
+        assert header.get_string() == "** TODO fix (a+b)* [x] TODO list :tag1:"
+
+    def test_no_stars(self):
+        for header in (Header("foo :tag1:"), HashedHeader("foo :tag1:")):
+            assert header.get_level() == 0
+            assert header.get_title() == "foo"
+            assert header.get_tags() == ["tag1"]
+        assert Header("").get_title() == ""
+
+    def test_long_line(self):
+        title = "long title " * 40
+        header = HashedHeader("*** NEXT [#B] a1b2c: %s :tag1:" % title)
+        assert header.get_title() == title.strip()
+        assert header.get_hash() == "a1b2c"
+        assert header.get_priority() == "B"
+        assert header.get_tags() == ["tag1"]
+
+    def test_compact(self):
+        header = Header("* TODO title :tag1:")
+        tree = OrgTree()
+        tree.read_from_string("* TODO title\n   SCHEDULED: <2013-09-20 Fri>\n")
+        for item in (header, tree, tree.get_children()[0], tree.get_children()[0].get_schedule()):
+            assert not hasattr(item, '__dict__')
+        assert header.get_type() is Header("** TODO other").get_type()
+
+    def test_tokens(self):
+        string = "** TODO [2013-08-10 Sat 11:51] [#A] c1234: title :tag1:tag2:"
+        header = HashedHeader(string)
+        assert header.get_token('stars') == "**"
+        assert header.get_token('keyword') == "TODO"
+        assert header.get_token('timestamp') == "[2013-08-10 Sat 11:51]"
+        assert header.get_token('priority') == "[#A]"
+        assert header.get_token('hash') == "c1234"
+        assert header.get_token('tags') == ":tag1:tag2:"
+        assert header.get_token_span('hash') == (36, 41)
+        assert Header(string).get_title() == "c1234: title"
+        assert header.get_title() == "title"
+
     def test_title_only(self):
         string = "** title test header"
         header = HashedHeader(string)
@@ -311,6 +355,22 @@ class TestTreeData(object):
         assert tree_dict['38402'].has_deadline()
         assert tree_dict['38402'].get_deadline().get_date() == datetime.date(2013, 11, 30)
 
+    def test_planning_line(self):
+        data = OrgTreeData("   DEADLINE: <2013-11-30 Sat> SCHEDULED: <2013-10-25 Fri 15:00>\n"
+                           "   :PROPERTIES:\n   :URL: http://example.com/a:b\n   :Effort+: 1:30\n   :empty:\n   :END:\n"
+                           "   free text\n   SCHEDULED: <2014-01-01 Wed>\n")
+        assert data.get_schedule().get_datetime() == datetime.datetime(2013, 10, 25, 15, 0)
+        assert data.get_deadline().get_date() == datetime.date(2013, 11, 30)
+        assert data.get_properties() == {'URL': 'http://example.com/a:b', 'Effort+': '1:30', 'empty': ''}
+
+    def test_sections_at_top_only(self):
+        data = OrgTreeData("   free text\n   SCHEDULED: <2014-01-01 Wed>\n   :PROPERTIES:\n   :a: 1\n   :END:\n")
+        assert not data.has_schedule()
+        assert not data.has_properties()
+        data = OrgTreeData("   :PROPERTIES:\n   :a: 1\n   :END:\n   SCHEDULED: <2014-01-01 Wed>\n")
+        assert data.has_schedule()
+        assert data.get_properties() == {'a': '1'}
+
 class TestScheduleRepeater(object):
     def test_schedule_repeater(self):
         line = "SCHEDULED: <2013-09-20 Fri 15:05 +1d>"
@@ -492,6 +552,50 @@ class TestOrgTree(object):
         assert tree[1][3].get_header().get_title() == "Fullam exorbitus scribit"
         assert tree[1][1][1].get_header().get_title() == "Ut ut dolor et felis ultrices"
 
+    def test_read_from_lines(self):
+        lines = ["preamble\n", "* a :x:\n", "body a\n", "*** b :x:\n", "** c\n", "body c\n", "* d\n"]
+        tree = OrgTree()
+        assert tree.read_from_lines(lines) == None
+        assert tree.get_data() == "preamble\n"
+        assert [child.get_header().get_title() for child in tree.get_children()] == ["a", "d"]
+        assert [child.get_header().get_title() for child in tree[1].get_children()] == ["b", "c"]
+        assert tree[1].get_data() == "body a\n"
+        assert tree[1][2].get_data() == "body c\n"
+        assert tree[1][2].get_parent() is tree[1]
+        assert tree.get_trees_by_tag('x') == [tree[1], tree[1][1]]
+        assert tree[1][1].get_tag_dict() is tree.get_tag_dict()
+
+    def test_read_from_lines_stop(self):
+        lines = ["* a\n", "** b\n", "body b\n", "** c\n", "* d\n"]
+        tree = OrgTree()
+        assert tree.read_from_lines(lines, 1, 1) == 4
+        assert [child.get_header().get_title() for child in tree.get_children()] == ["b", "c"]
+
+    def test_read_deep_outline(self):
+        depth = 5000
+        lines = ["%s level %d\n" % ("*" * level, level) for level in range(1, depth + 1)]
+        tree = HashedOrgTree()
+        tree.read_from_lines(lines)
+        assert sum(1 for _ in tree) == depth + 1
+        assert next(tree.iter_postorder()).get_header().get_level() == depth
+
+    def test_structural_index_after_read(self):
+        tree = OrgTree()
+        index = StructuralIndex(tree)
+        assert len(index) == 1
+        tree.read_from_lines(["* a\n", "** b\n", "* c\n"])
+        assert len(index) == 4
+        assert index.depth(tree[1][1]) == 2
+        subtree = tree[2]
+        subtree.read_from_lines(["** d\n", "*** e\n"], 0, 1)
+        assert len(index) == 6
+        assert index.is_ancestor(subtree, subtree[1][1])
+        mapped = OrgTree()
+        index = StructuralIndex(mapped)
+        assert len(index) == 1
+        mapped.read_from_mmap('unittests/test_data/tree00.org')
+        assert len(index) == sum(1 for _ in mapped)
+
 class TestDeadline(object):
     def test_deadline_date(self):
         line = "DEADLINE: <2013-09-20 Fri>"
@@ -557,6 +661,21 @@ class TestHashedOrgTree(object):
             new_tree_dict = new_tree.get_tree_dict()
             assert new_tree_dict[tree_hash].get_data() == tree_dict[tree_hash].get_data()
             assert new_tree_dict[tree_hash].get_header() == tree_dict[tree_hash].get_header()
+        for child in new_tree.get_children():
+            assert child.get_parent() is new_tree
+
+    def test_load_baseline_pickle(self):
+        tree = HashedOrgTree()
+        tree.read_from_file('unittests/test_data/tree01.org', 0, 0)
+        loaded = HashedOrgTree()
+        assert loaded.pickle_load('unittests/test_data/tree01.baseline.pickle')
+        assert list(loaded.get_tree_dict().keys()) == list(tree.get_tree_dict().keys())
+        for tree_hash, node in tree.get_tree_dict().items():
+            loaded_node = loaded.get_subtree_by_hash(tree_hash)
+            assert loaded_node.get_header() == node.get_header()
+            assert loaded_node.get_header().get_string() == node.get_header().get_string()
+            assert loaded_node.get_data() == node.get_data()
+            assert loaded_node.get_properties() == node.get_properties()
 
     def test_multiple(self):
         tree = HashedOrgTree()
@@ -611,3 +730,367 @@ class TestTreeWriter(object):
         original_file = open('unittests/test_data/tree06.org', 'r').read()
         written_file = open(self._temp_file, 'r').read()
         assert written_file == original_file
+
+    def test_untouched_nodes_kept(self):
+        text = "#+TITLE: x\n*  TODO  spaced   heading    :a:  \nbody\n** [#B] child\n* other :b:\n"
+        tree = OrgTree()
+        tree.read_from_string(text)
+        _, self._temp_file = tempfile.mkstemp()
+        tree.write_to_file(self._temp_file)
+        assert open(self._temp_file, 'r').read() == text
+        child = tree.get_children()[0].get_children()[0]
+        assert not child.get_header().is_modified()
+        child.get_header().set_priority("A")
+        assert child.get_header().is_modified()
+        tree.write_to_file(self._temp_file)
+        assert open(self._temp_file, 'r').read() == text.replace("** [#B] child", "** [#A] child")
+
+    def test_mapped_copy(self):
+        _, self._temp_file = tempfile.mkstemp()
+        source = b"preamble\r\n* a \r\nbody a\r\n** b\r\n* c\r\nbody c"
+        with open(self._temp_file, 'wb') as out:
+            out.write(source)
+        tree = OrgTree()
+        tree.read_from_mmap(self._temp_file)
+        assert b"".join(tree.iter_source_bytes()) == source
+        tree.get_children()[1].get_header().add_tag("x")
+        tree.write_to_file(self._temp_file)
+        assert open(self._temp_file, 'rb').read() == source.replace(b"* c\r\n", b"* c :x:\n")
+
+    def test_mapped_set_header(self):
+        _, self._temp_file = tempfile.mkstemp()
+        with open(self._temp_file, 'w') as out:
+            out.write("* TODO abcde: old title\nbody\n")
+        tree = HashedOrgTree()
+        tree.read_from_mmap(self._temp_file)
+        tree.get_children()[0].set_header(HashedHeader("* DONE abcde: new title"))
+        tree.write_to_file(self._temp_file)
+        assert open(self._temp_file).read() == "* DONE abcde: new title\nbody\n"
+
+    def test_atomic(self):
+        _, self._temp_file = tempfile.mkstemp()
+        os.chmod(self._temp_file, 0o640)
+        with open(self._temp_file, 'w') as out:
+            out.write("* old\n")
+        tree = OrgTree()
+        tree.read_from_string("* new\n* broken\n")
+        tree.get_children()[1].raw_data = 1
+        try:
+            tree.write_to_file(self._temp_file)
+        except AttributeError:
+            pass
+        assert open(self._temp_file, 'r').read() == "* old\n"
+        directory = os.path.dirname(self._temp_file)
+        assert not [name for name in os.listdir(directory)
+                    if name.startswith(".%s." % os.path.basename(self._temp_file))]
+        tree.get_children()[1].raw_data = ""
+        tree.write_to_file(self._temp_file)
+        assert open(self._temp_file, 'r').read() == "* new\n* broken\n"
+        assert os.stat(self._temp_file).st_mode & 0o777 == 0o640
+
+class TestMappedOrgTree(object):
+    def test_read_from_mmap(self):
+        for name in ['tree00', 'tree01', 'tree03', 'tree04', 'tree06']:
+            filename = 'unittests/test_data/%s.org' % name
+            tree = HashedOrgTree()
+            tree.read_from_file(filename, 0, 0)
+            mapped = HashedOrgTree()
+            mapped.read_from_mmap(filename)
+            assert mapped.raw_data == None
+            nodes = list(tree)
+            mapped_nodes = list(mapped)
+            assert len(nodes) == len(mapped_nodes)
+            for node, mapped_node in zip(nodes, mapped_nodes):
+                assert node.get_header() == mapped_node.get_header()
+                assert node.get_data() == mapped_node.get_data()
+                assert node.get_properties() == mapped_node.get_properties()
+            assert sorted(tree.get_tree_dict().keys()) == sorted(mapped.get_tree_dict().keys())
+            assert sorted(tree.get_tag_dict().keys()) == sorted(mapped.get_tag_dict().keys())
+
+    def test_spans(self):
+        filename = 'unittests/test_data/tree05.org'
+        source = open(filename, 'rb').read()
+        tree = OrgTree()
+        tree.read_from_mmap(filename)
+        child = tree.get_children()[0]
+        start, end = child.header_span
+        assert source[start:end].decode('utf-8').strip() == child.get_header().line
+        assert child.header_span[1] == child.body_span[0]
+        assert tree.body_span == (0, start)
+
+    def test_empty_file(self):
+        _, filename = tempfile.mkstemp()
+        try:
+            tree = OrgTree()
+            tree.read_from_mmap(filename)
+            assert tree.get_children() == []
+            assert tree.get_data() == ""
+        finally:
+            os.unlink(filename)
+
+class TestBinaryOrgTree(object):
+    def test_round_trip(self):
+        _, filename = tempfile.mkstemp()
+        try:
+            for name in sorted(os.listdir('unittests/test_data')):
+                if not name.endswith('.org'):
+                    continue
+                tree = HashedOrgTree()
+                tree.read_from_file('unittests/test_data/' + name, 0, 0)
+                assert tree.binary_dump(filename)
+                loaded = HashedOrgTree()
+                assert loaded.binary_load(filename)
+                assert loaded.raw_data == None
+                nodes = list(tree)
+                loaded_nodes = list(loaded)
+                assert len(nodes) == len(loaded_nodes)
+                for node, loaded_node in zip(nodes, loaded_nodes):
+                    assert node.level == loaded_node.level
+                    assert node.get_header() == loaded_node.get_header()
+                    assert node.get_raw_data() == loaded_node.get_raw_data()
+                    assert node.get_properties() == loaded_node.get_properties()
+                    for child in loaded_node.get_children():
+                        assert child.get_parent() is loaded_node
+                assert sorted(tree.get_tree_dict().keys()) == sorted(loaded.get_tree_dict().keys())
+                for tree_hash, node in loaded.get_tree_dict().items():
+                    assert node.get_header().get_hash() == tree_hash
+                assert sorted(tree.get_tag_dict().keys()) == sorted(loaded.get_tag_dict().keys())
+                for tag, trees in tree.get_tag_dict().items():
+                    assert [node.get_header().line for node in loaded.get_trees_by_tag(tag)] == \
+                        [node.get_header().line for node in trees]
+        finally:
+            os.unlink(filename)
+
+    def test_not_binary(self):
+        tree = HashedOrgTree()
+        assert not tree.binary_load('unittests/test_data/tree01.org')
+        assert not tree.binary_load('unittests/test_data/missing.bin')
+
+    def _edit(self, tree):
+        header = tree.get_children()[0].get_header()
+        header.set_title("new title")
+        header.set_priority("A")
+        header.add_tag("z")
+        return header
+
+    def test_edited_headers(self):
+        _, filename = tempfile.mkstemp()
+        try:
+            tree = HashedOrgTree()
+            tree.read_from_string("* TODO abcde: old title :a:\nbody\n")
+            self._edit(tree)
+            assert tree.binary_dump(filename)
+            loaded = HashedOrgTree()
+            assert loaded.binary_load(filename)
+            header = loaded.get_children()[0].get_header()
+            assert header.get_title() == "new title"
+            assert header.get_priority() == "A" and header.get_tags() == ["a", "z"]
+            loaded.write_to_file(filename)
+            assert open(filename).read() == "* TODO [#A] abcde: new title :a:z:\nbody\n"
+        finally:
+            os.unlink(filename)
+
+    def test_version_1_edited_columns(self):
+        _, filename = tempfile.mkstemp()
+        try:
+            tree = HashedOrgTree()
+            tree.read_from_string("* TODO abcde: old title :a:\nbody\n")
+            header = self._edit(tree)
+            header.source_line = header.line
+            columns, keywords, tagsets, hashes, text = columns_from_tree(tree, COLUMNS)
+            write_binary(filename, COLUMNS, columns, keywords, tagsets, hashes, text, True)
+            with open(filename, 'r+b') as out:
+                out.seek(4)
+                out.write(b"\x01\x00")
+            loaded = HashedOrgTree()
+            assert loaded.binary_load(filename)
+            assert loaded.get_children()[0].get_header().is_modified()
+            loaded.write_to_file(filename)
+            assert open(filename).read() == "* TODO [#A] abcde: old title :a:z:\nbody\n"
+        finally:
+            os.unlink(filename)
+
+    def test_truncated(self):
+        _, filename = tempfile.mkstemp()
+        try:
+            tree = HashedOrgTree()
+            tree.read_from_string("* abcde: title\n")
+            assert tree.binary_dump(filename)
+            with open(filename, 'r+b') as out:
+                out.truncate(20)
+            assert not HashedOrgTree().binary_load(filename)
+            with pytest.raises(MalformedBinaryTree):
+                read_binary(filename, COLUMNS)
+        finally:
+            os.unlink(filename)
+
+
+class TestJsonOrgTree(object):
+    def test_records(self):
+        tree = HashedOrgTree()
+        tree.read_from_string("preamble\n* TODO [#A] abcde: Title :a:b:\n  SCHEDULED: <2013-09-20 Fri>\n"
+                              "  :PROPERTIES:\n  :EFFORT: 1:00\n  :END:\n** Child\n* Other\n")
+        records = [json.loads(line) for line in tree.iter_ndjson()]
+        assert [(record['id'], record['parent'], record['level']) for record in records] == \
+            [(0, None, 0), (1, 0, 1), (2, 1, 2), (3, 0, 1)]
+        assert records[0]['body'] == "preamble\n"
+        first = records[1]
+        assert first['hash'] == "abcde" and first['keyword'] == "TODO" and first['priority'] == "A"
+        assert first['title'] == "Title" and first['tags'] == ["a", "b"]
+        assert first['properties'] == {"EFFORT": "1:00"}
+        assert first['scheduled'] == "<2013-09-20 Fri>" and first['deadline'] == None
+        assert json.loads(tree.to_string()) == records
+
+    def test_round_trip(self):
+        _, filename = tempfile.mkstemp()
+        try:
+            for name in ['tree00', 'tree01', 'tree03', 'tree04', 'tree06']:
+                tree = HashedOrgTree()
+                tree.read_from_file('unittests/test_data/%s.org' % name, 0, 0)
+                for ndjson in (True, False):
+                    tree.write_json(filename, ndjson)
+                    loaded = HashedOrgTree()
+                    loaded.read_from_json(filename)
+                    assert [node.get_header() for node in loaded] == [node.get_header() for node in tree]
+                    assert [node.get_raw_data() for node in loaded] == [node.get_raw_data() for node in tree]
+                    assert sorted(loaded.get_tree_dict()) == sorted(tree.get_tree_dict())
+                    assert sorted(loaded.get_tag_dict()) == sorted(tree.get_tag_dict())
+        finally:
+            os.unlink(filename)
+
+    def test_plain_tree(self):
+        tree = OrgTree()
+        tree.read_from_string("preamble\n* TODO old title :a:\n  body\n** Child\n")
+        header = tree.get_children()[0].get_header()
+        header.set_title("new title")
+        header.set_priority("A")
+        records = [json.loads(line) for line in tree.iter_ndjson()]
+        assert 'hash' not in records[1]
+        assert records[1]['title'] == "new title" and records[1]['headline'] == "* TODO [#A] new title :a:"
+        loaded = OrgTree()
+        loaded.read_from_json_lines(tree.to_string().splitlines())
+        header = loaded.get_children()[0].get_header()
+        assert header.get_title() == "new title" and header.get_priority() == "A"
+        assert "".join(loaded.iter_source_lines()) == "preamble\n* TODO [#A] new title :a:\n  body\n** Child\n"
+
+    def test_subtree(self):
+        tree = HashedOrgTree()
+        tree.read_from_string("* abcde: A\n** fghij: B\n   body\n*** C\n** D\n")
+        loaded = HashedOrgTree()
+        loaded.read_from_json_lines(tree.get_subtree_by_hash('fghij').iter_ndjson())
+        assert [(node.level, node.get_header() and node.get_header().get_title()) for node in loaded] == \
+            [(0, None), (2, 'B'), (3, 'C')]
+        assert loaded.get_subtree_by_hash('fghij').get_raw_data() == "   body\n"
+        assert loaded.get_raw_data() == ""
+
+
+class TestParallelOrgTree(object):
+    def _compare(self, tree, parallel):
+        nodes = list(tree)
+        parallel_nodes = list(parallel)
+        assert len(nodes) == len(parallel_nodes)
+        for node, parallel_node in zip(nodes, parallel_nodes):
+            assert node.get_header() == parallel_node.get_header()
+            assert node.get_data() == parallel_node.get_data()
+            assert node.level == parallel_node.level
+            assert (node.get_parent() == None) == (parallel_node.get_parent() == None)
+            assert parallel_node.get_tag_dict() is parallel.get_tag_dict()
+        position = dict((id(node), i) for i, node in enumerate(parallel_nodes))
+        for tag, trees in tree.get_tag_dict().items():
+            assert [nodes.index(node) for node in trees] == [position[id(node)] for node in parallel.get_trees_by_tag(tag)]
+
+    def test_parallel_matches_sequential(self):
+        for name in ['tree00', 'tree01', 'tree02', 'tree03', 'tree05']:
+            filename = 'unittests/test_data/%s.org' % name
+            tree = HashedOrgTree()
+            tree.read_from_file(filename, 0, 0)
+            parallel = HashedOrgTree()
+            parallel.read_from_file_parallel(filename, processes=1, chunks=3)
+            self._compare(tree, parallel)
+            assert sorted(tree.get_tree_dict().keys()) == sorted(parallel.get_tree_dict().keys())
+            for tree_hash, subtree in parallel.get_tree_dict().items():
+                assert subtree.get_header() == tree.get_subtree_by_hash(tree_hash).get_header()
+
+    def test_parallel_processes(self):
+        fd, filename = tempfile.mkstemp(suffix=".org")
+        with os.fdopen(fd, "w") as out:
+            out.write("#+TITLE: preamble\n")
+            for i in range(200):
+                out.write("%s TODO %05d: heading %d :tag%d:\nbody %d\n" % ("*" * (1 + i % 3), i, i, i % 5, i))
+        try:
+            tree = OrgTree()
+            tree.read_from_file(filename, 0, 0)
+            parallel = OrgTree()
+            parallel.read_from_file_parallel(filename, processes=2, chunks=8)
+            self._compare(tree, parallel)
+            assert parallel.get_data() == "#+TITLE: preamble\n"
+        finally:
+            os.unlink(filename)
+
+class TestReparse(object):
+    def _read(self, lines):
+        tree = HashedOrgTree()
+        tree.read_from_lines(lines)
+        return tree
+
+    def _snapshot(self, tree):
+        nodes = [(node.level, node.get_header() and node.get_header().get_string(), node.get_data()) for node in tree]
+        positions = dict((id(node), i) for i, node in enumerate(tree))
+        tags = dict((tag, [positions[id(node)] for node in trees]) for tag, trees in tree.get_tag_dict().items())
+        hashes = dict((key, positions[id(node)]) for key, node in tree.get_tree_dict().items())
+        return nodes, tags, hashes
+
+    def test_body_edit_keeps_trees(self):
+        lines = open('unittests/test_data/tree03.org').readlines()
+        tree = self._read(lines)
+        subtree = tree.get_subtree_by_hash('45678')
+        others = list(tree)
+        assert tree.get_line_count() == len(lines)
+        index = lines.index("*** TODO 45678: Ut ut dolor et felis ultrices\n")
+        assert tree.reparse_lines(index + 1, index + 2, "replaced line\n") == [subtree]
+        assert subtree.get_data().startswith("replaced line\n")
+        assert list(tree) == others
+        lines[index + 1:index + 2] = ["replaced line\n"]
+        assert self._snapshot(tree) == self._snapshot(self._read(lines))
+        assert tree.get_line_count() == len(lines)
+
+    def test_structural_index_after_reparse(self):
+        tree = self._read(["* a\n", "** b\n", "* c\n"])
+        index = StructuralIndex(tree)
+        assert index.subtree_size(tree[1]) == 2
+        tree.reparse_lines(2, 3, "*** c\n**** d\n")
+        assert index.subtree_size(tree[1]) == 4
+        assert index.depth(index.nth(4)) == 4
+        assert index.is_ancestor(tree[1], index.nth(4))
+
+    def test_header_edit(self):
+        lines = open('unittests/test_data/tree03.org').readlines()
+        tree = self._read(lines)
+        first = tree.get_subtree_by_hash('12345')
+        index = lines.index("** TODO 23456: interdum in, laoreet ut nisl\t\t\t  :tag3:tag4:\n")
+        new_text = "** NEXT 99999: renamed :tag5:\nnew body\n"
+        replaced = tree.reparse_lines(index, index + 1, new_text)
+        assert [node.get_header().get_hash() for node in replaced] == ['99999']
+        assert tree.get_subtree_by_hash('12345') is first
+        assert tree.get_subtree_by_hash('23456') == None
+        assert tree.get_trees_by_tag('tag5') == replaced
+        lines[index:index + 1] = [new_text]
+        assert self._snapshot(tree) == self._snapshot(self._read("".join(lines).splitlines(True)))
+
+    def test_random_edits(self):
+        import random
+        rand = random.Random(1234)
+        pool = ["* %05d: top :tag1:\n", "** %05d: mid :tag2:\n", "*** %05d: low :tag1:tag3:\n",
+                "**** deep\n", "body text\n", "\n", ":PROPERTIES:\n", "** TODO %05d: other :tag4:\n"]
+        counter = iter(range(100000))
+        lines = open('unittests/test_data/tree02.org').readlines()
+        tree = self._read(lines)
+        for _ in range(200):
+            start = rand.randint(0, len(lines))
+            end = rand.randint(start, min(len(lines), start + 6))
+            new_lines = [line % next(counter) if "%" in line else line
+                         for line in (rand.choice(pool) for _ in range(rand.randint(0, 4)))]
+            tree.reparse_lines(start, end, "".join(new_lines))
+            lines[start:end] = new_lines
+            assert self._snapshot(tree) == self._snapshot(self._read(lines))
+            assert tree.get_line_count() == len(lines)
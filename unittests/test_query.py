@@ -0,0 +1,136 @@
+from pyorgtree.pyorgtree import *
+from pyorgtree.columnar import ColumnarOrgTree
+from pyorgtree.index import *
+from pyorgtree.query import *
+import datetime
+import pytest
+
+TEXT = """#+FILETAGS: :org:
+* NEXT [#A] a :work:
+  SCHEDULED: <2013-08-12 Mon>
+  :PROPERTIES:
+  :EFFORT: 1:30
+  :CATEGORY: ops
+  :END:
+** TODO b :urgent:
+   DEADLINE: <2013-08-20 Tue 10:00>
+   :PROPERTIES:
+   :EFFORT: 0:30
+   :END:
+** DONE c
+* TODO d :home:
+  SCHEDULED: <2013-08-30 Fri>
+  :PROPERTIES:
+  :CATEGORY: dev
+  :END:
+*** WAIT e :someday:
+"""
+NOW = datetime.datetime(2013, 8, 11, 9, 0)
+
+
+def titles(nodes):
+    return [node.get_header().get_title() for node in nodes]
+
+
+def read():
+    tree = OrgTree()
+    tree.read_from_string(TEXT)
+    return tree
+
+
+class TestCompile(object):
+    def test_cached(self):
+        assert compile_query("+work-urgent") is compile_query("+work-urgent")
+
+    def test_split(self):
+        assert split_query('work+ITEM="a/b"/NEXT|TODO') == ('work+ITEM="a/b"', "NEXT|TODO")
+
+    def test_malformed(self):
+        for expression in ["work&", "work|", "LEVEL>x", "/TODO=x", "SCHEDULED<\"soon\"", "EFFORT<{1}"]:
+            with pytest.raises(MalformedQuery):
+                compile_query(expression)
+
+    def test_resolve_time(self):
+        assert resolve_time("<today>", NOW) == (datetime.datetime(2013, 8, 11), False)
+        assert resolve_time("<+1w>", NOW) == (datetime.datetime(2013, 8, 18), False)
+        assert resolve_time("<-2h>", NOW) == (datetime.datetime(2013, 8, 11, 7, 0), True)
+        assert resolve_time("<2013-08-01 Thu 10:00>", NOW) == (datetime.datetime(2013, 8, 1, 10, 0), True)
+
+
+class TestQuery(object):
+    def test_tags(self):
+        tree = read()
+        assert titles(tree.query("work")) == ["a", "b", "c"]
+        assert titles(tree.query("+work-urgent")) == ["a", "c"]
+        assert titles(tree.query("urgent|someday")) == ["b", "e"]
+        assert titles(tree.query("org&home")) == ["d", "e"]
+        assert titles(tree.query("{^some}")) == ["e"]
+
+    def test_properties(self):
+        tree = read()
+        assert titles(tree.query('TODO="NEXT"')) == ["a"]
+        assert titles(tree.query("work/TODO|DONE")) == ["b", "c"]
+        assert titles(tree.query("/-DONE-TODO")) == ["a", "e"]
+        assert titles(tree.query("EFFORT>1:00")) == ["a"]
+        assert titles(tree.query('CATEGORY="ops"|CATEGORY={^d}')) == ["a", "d"]
+        assert titles(tree.query('PRIORITY="A"')) == ["a"]
+        assert titles(tree.query('PRIORITY<>"A"+LEVEL=2')) == ["b", "c"]
+        assert titles(tree.query("-work+LEVEL>1")) == ["e"]
+        assert titles(tree.query('ITEM={^[ab]$}')) == ["a", "b"]
+
+    def test_times(self):
+        tree = read()
+        plan = compile_query('SCHEDULED<"<+1w>"').plan(tree, now=NOW)
+        assert titles(plan.execute()) == ["a"]
+        assert titles(compile_query('DEADLINE>="<2013-08-20 Tue 10:00>"').execute(tree, now=NOW)) == ["b"]
+        assert titles(compile_query('DEADLINE>"<2013-08-20 Tue 10:00>"').execute(tree, now=NOW)) == []
+        assert titles(compile_query('SCHEDULED="<2013-08-30>"').execute(tree, now=NOW)) == ["d"]
+
+
+class TestPlanner(object):
+    expressions = ["work", "+work-urgent", "urgent|someday", "org&home", 'TODO="NEXT"', "EFFORT>1:00",
+                   'work+EFFORT<1:00', 'CATEGORY="ops"|home', 'SCHEDULED<"<+1w>"', 'DEADLINE>"<today>"+urgent',
+                   "work/TODO|DONE", "-work"]
+
+    def test_steps(self):
+        tree = read()
+        assert compile_query("-work").plan(tree).steps == ["scan"]
+        assert compile_query("org").plan(tree).steps == ["scan"]
+        assert compile_query("work+urgent|home").plan(tree).steps == ["tag_dict work", "tag_dict home"]
+        indexes = [TagIndex(tree), PropertyIndex(tree), TimeIndex(tree)]
+        assert compile_query('work+EFFORT<1:00').plan(tree, indexes).steps == \
+            ["tag index work & property index EFFORT<1:00"]
+        assert compile_query('DEADLINE>"<today>"').plan(tree, indexes).steps == ['time index DEADLINE>"<today>"']
+
+    def test_same_results(self):
+        tree = read()
+        indexes = [TagIndex(tree), PropertyIndex(tree), TimeIndex(tree)]
+        for expression in self.expressions:
+            query = compile_query(expression)
+            scanned = [node for node in tree if query.matches(node, QueryContext(tree, now=NOW))]
+            assert query.execute(tree, now=NOW) == scanned
+            assert query.execute(tree, indexes, now=NOW) == scanned
+
+    def test_subtree(self):
+        tree = read()
+        indexes = [TagIndex(tree), PropertyIndex(tree), TimeIndex(tree)]
+        for subtree in [tree[1][1], tree[2]]:
+            for expression in self.expressions + ["work", "home", "org"]:
+                query = compile_query(expression)
+                scanned = [node for node in subtree if query.matches(node, QueryContext(subtree, now=NOW))]
+                assert query.execute(subtree, now=NOW) == scanned
+                assert query.execute(subtree, indexes, now=NOW) == scanned
+        assert titles(tree[2].query("work")) == []
+        assert titles(tree[1][1].query("work")) == ["b"]
+        assert titles(tree[2].query("org")) == ["d", "e"]
+
+    def test_columnar(self):
+        tree = read()
+        store = ColumnarOrgTree()
+        store.read_from_string(TEXT)
+        indexes = [TagIndex(store), PropertyIndex(store), TimeIndex(store)]
+        for expression in self.expressions:
+            query = compile_query(expression)
+            expected = titles(query.execute(tree, now=NOW))
+            assert titles(query.execute(store, now=NOW)) == expected
+            assert titles(query.execute(store, indexes, now=NOW)) == expected
@@ -0,0 +1,96 @@
+from pyorgtree.pyorgtree import *
+from pyorgtree.columnar import ColumnarOrgTree
+from pyorgtree.search import *
+import os
+import tempfile
+
+TEXT = """* Full-text search
+  Build an inverted index with positional postings.
+* Agenda
+  Index of scheduled items; search is not needed here.
+* Notes
+** Search engines
+   Ranking with BM25 and phrase queries over the index.
+** Cooking
+   Positional postings of pasta recipes.
+"""
+
+
+def titles(results):
+    return [result.node.get_header().get_title() for result in results]
+
+
+class TestQuery(object):
+    def test_parse(self):
+        assert parse_query('index +search -"pasta recipes" full-text') == \
+            ([("index",), ("full", "text")], [("search",)], [("pasta", "recipes")])
+        assert parse_query('"positional postings"') == ([], [("positional", "postings")], [])
+
+
+class TestSearchIndex(object):
+    def test_search(self):
+        tree = OrgTree()
+        tree.read_from_string(TEXT)
+        index = SearchIndex(tree)
+        assert titles(index.search("search")) == ["Full-text search", "Agenda", "Search engines"]
+        assert titles(index.search('"positional postings"')) == ["Cooking", "Full-text search"]
+        assert titles(index.search('"postings positional"')) == []
+        assert titles(index.search("postings -pasta")) == ["Full-text search"]
+        assert titles(index.search("+index bm25")) == ["Search engines", "Full-text search", "Agenda"]
+        assert titles(index.search("search", limit=1)) == ["Full-text search"]
+        scores = [result.score for result in index.search("search")]
+        assert scores == sorted(scores, reverse=True)
+        assert index.search("missing") == []
+        assert len(index) == 5
+
+    def test_title_and_body_do_not_form_phrases(self):
+        tree = OrgTree()
+        tree.read_from_string(TEXT)
+        assert SearchIndex(tree).search('"search build"') == []
+
+    def test_hashes(self):
+        tree = HashedOrgTree()
+        tree.read_from_string("* TODO abc12: hashed heading\n  some words\n")
+        results = SearchIndex(tree).search("words")
+        assert [result.hash for result in results] == ["abc12"]
+
+    def test_incremental(self):
+        tree = OrgTree()
+        tree.read_from_string(TEXT)
+        index = SearchIndex(tree)
+        assert titles(index.search("pasta")) == ["Cooking"]
+        trees = tree.reparse_lines(8, 9, "   Spaghetti only.\n")
+        index.update(trees)
+        assert index.search("pasta") == []
+        assert titles(index.search("spaghetti")) == ["Cooking"]
+        tree.reparse_lines(7, 9, "** Baking\n   Bread and pasta.\n")
+        assert titles(index.search("pasta")) == ["Baking"]
+        assert index.search("spaghetti") == []
+        assert len(index) == 5
+
+    def test_sidecar(self):
+        directory = tempfile.mkdtemp()
+        filename = os.path.join(directory, "notes.org")
+        with open(filename, "w") as out:
+            out.write(TEXT)
+        tree = OrgTree()
+        tree.read_from_file(filename)
+        index = open_search_index(tree, filename)
+        assert os.path.exists(get_sidecar_path(filename))
+        with open(filename, "w") as out:
+            out.write(TEXT.replace("pasta recipes", "soup recipes"))
+        tree = OrgTree()
+        tree.read_from_file(filename)
+        index = SearchIndex(tree)
+        assert index.load(get_sidecar_path(filename))
+        assert index.sync() == (1, 1)
+        assert titles(index.search("soup")) == ["Cooking"]
+        assert index.search("pasta") == []
+
+    def test_columnar(self):
+        store = ColumnarOrgTree()
+        store.read_from_string(TEXT)
+        tree = OrgTree()
+        tree.read_from_string(TEXT)
+        for query in ['"positional postings"', "search index", "+postings -pasta"]:
+            assert titles(SearchIndex(store).search(query)) == titles(SearchIndex(tree).search(query))
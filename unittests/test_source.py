@@ -0,0 +1,98 @@
+from pyorgtree.pyorgtree import *
+import bz2
+import gzip
+import io
+import lzma
+import os
+import tempfile
+
+FILENAME = 'unittests/test_data/tree03.org'
+
+
+class UnseekableStream(io.RawIOBase):
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def readinto(self, buffer):
+        data = self.data.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class TestSource(object):
+    def _reference(self):
+        tree = HashedOrgTree()
+        tree.read_from_file(FILENAME, 0, 0)
+        return [(node.get_header() and node.get_header().get_string(), node.get_data()) for node in tree]
+
+    def _nodes(self, tree):
+        return [(node.get_header() and node.get_header().get_string(), node.get_data()) for node in tree]
+
+    def test_read_from_string(self):
+        tree = HashedOrgTree()
+        tree.read_from_string(open(FILENAME).read())
+        assert self._nodes(tree) == self._reference()
+        tree = OrgTree()
+        tree.read_from_string("* a\r\nbody\r\n")
+        assert tree[1].get_data() == "body\n"
+
+    def test_read_from_stream(self):
+        data = open(FILENAME, 'rb').read()
+        for stream in [io.StringIO(data.decode()), io.BytesIO(data), UnseekableStream(data)]:
+            tree = HashedOrgTree()
+            tree.read_from_stream(stream)
+            assert self._nodes(tree) == self._reference()
+            assert not stream.closed
+
+    def test_text_stream(self):
+        fd, filename = tempfile.mkstemp(suffix='.org')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write("* caf\u00e9 :a:\nbody \u00e9\n".encode('latin-1'))
+            tree = OrgTree()
+            with open(filename, encoding='latin-1') as inp:
+                tree.read_from_stream(inp)
+            assert tree[1].get_header().get_title() == "caf\u00e9"
+            assert tree[1].get_data() == "body \u00e9\n"
+            tree = HashedOrgTree()
+            with open(FILENAME) as inp:
+                inp.readline()
+                tree.read_from_stream(inp)
+            rest = HashedOrgTree()
+            rest.read_from_string(open(FILENAME).read().split("\n", 1)[1])
+            assert len(tree.get_children()) > 1
+            assert self._nodes(tree) == self._nodes(rest)
+        finally:
+            os.unlink(filename)
+
+    def test_compressed(self):
+        data = open(FILENAME, 'rb').read()
+        for suffix, compress in [('.gz', gzip.compress), ('.bz2', bz2.compress), ('.xz', lzma.compress)]:
+            compressed = compress(data)
+            tree = HashedOrgTree()
+            tree.read_from_stream(io.BytesIO(compressed))
+            assert self._nodes(tree) == self._reference()
+            tree = HashedOrgTree()
+            tree.read_from_stream(UnseekableStream(compressed))
+            assert self._nodes(tree) == self._reference()
+            tree = HashedOrgTree()
+            tree.read_from_stream(io.TextIOWrapper(io.BufferedReader(UnseekableStream(compressed))))
+            assert self._nodes(tree) == self._reference()
+            fd, filename = tempfile.mkstemp(suffix='.org' + suffix)
+            try:
+                with os.fdopen(fd, 'wb') as out:
+                    out.write(compressed)
+                tree = HashedOrgTree()
+                tree.read_from_file(filename, 0, 0)
+                assert self._nodes(tree) == self._reference()
+                hashes = [event.get_header().get_hash() for event in iter_events(filename, hashed=True)
+                          if event.get_type() == START_HEADING]
+                assert hashes == [node.get_header().get_hash() for node in tree if node.get_header()]
+            finally:
+                os.unlink(filename)
@@ -0,0 +1,113 @@
+from pyorgtree.pyorgtree import *
+from pyorgtree.store import *
+import datetime
+import os
+import shutil
+import tempfile
+
+TEXT = """#+TITLE: notes
+* TODO [#A] aaaaa: Write report :work:
+  SCHEDULED: <2013-09-20 Fri>
+  :PROPERTIES:
+  :EFFORT: 1:30
+  :END:
+** bbbbb: Outline :work:draft:
+   DEADLINE: <2013-09-22 Sun>
+** ccccc: Figures
+* ddddd: Holidays :home:
+  SCHEDULED: <2013-09-18 Wed>--<2013-09-25 Wed>
+  :PROPERTIES:
+  :EFFORT: 0:30
+  :CATEGORY: rest
+  :END:
+"""
+
+
+def titles(nodes):
+    return [node.get_header().get_title() for node in nodes]
+
+
+class TestOrgStore(object):
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "notes.org")
+        with open(self.filename, 'w') as out:
+            out.write(TEXT)
+        self.store = OrgStore(os.path.join(self.directory, "notes.db"))
+
+    def teardown_method(self, method):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def rewrite(self, text):
+        with open(self.filename, 'w') as out:
+            out.write(text)
+        stat = os.stat(self.filename)
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+    def test_nodes(self):
+        assert self.store.sync_file(self.filename) == (2, 0)
+        first, second = self.store.get_file_children(self.filename)
+        assert first.get_header().get_title() == "Write report"
+        assert first.get_type() == "TODO" and first.get_priority() == "A"
+        assert titles(first.get_children()) == ["Outline", "Figures"]
+        assert titles(first) == ["Write report", "Outline", "Figures"]
+        outline = first.get_children()[0]
+        assert outline.get_parent() == first and first.get_parent() == None
+        assert outline.get_tags() == ["work", "draft"]
+        assert first.get_properties() == {"EFFORT": "1:30"}
+        assert first.has_children() and not outline.has_children()
+        assert self.store.get_subtree_by_hash("bbbbb") == outline
+        assert self.store.get_subtree_by_hash("zzzzz") == None
+        tree = HashedOrgTree()
+        tree.read_from_file(self.filename, 0, 0)
+        loaded = self.store.load_tree(self.filename)
+        assert [node.get_header() for node in loaded if node.get_header()] == \
+            [node.get_header() for node in tree if node.get_header()]
+        assert loaded.get_data() == tree.get_data()
+        assert first.load_tree().get_subtree_by_hash("ccccc").get_header().get_title() == "Figures"
+
+    def test_queries(self):
+        self.store.sync_file(self.filename)
+        assert titles(self.store.iter_tagged("work")) == ["Write report", "Outline"]
+        assert titles(self.store.iter_tagged("none")) == []
+        assert titles(self.store.iter_matching("EFFORT>1:00")) == ["Write report"]
+        assert titles(self.store.iter_matching("EFFORT<=1:30")) == ["Write report", "Holidays"]
+        assert titles(self.store.iter_matching('CATEGORY="rest"')) == ["Holidays"]
+        entries = list(self.store.iter_window(datetime.date(2013, 9, 20), datetime.date(2013, 9, 23)))
+        assert [(entry.keyword, entry.node.get_header().get_title()) for entry in entries] == \
+            [("SCHEDULED", "Holidays"), ("SCHEDULED", "Write report"), ("DEADLINE", "Outline")]
+        assert entries[0].start == datetime.datetime(2013, 9, 18)
+        entries = self.store.iter_window(datetime.date(2013, 9, 21), datetime.date(2013, 9, 22), "SCHEDULED")
+        assert [entry.timestamp for entry in entries] == ["<2013-09-18 Wed>--<2013-09-25 Wed>"]
+
+    def test_sync(self):
+        self.store.sync_file(self.filename)
+        holidays = self.store.get_subtree_by_hash("ddddd")
+        assert self.store.sync_file(self.filename) == (0, 0)
+        text = TEXT.replace("** ccccc: Figures", "** ccccc: Tables :work:")
+        self.rewrite(text)
+        assert self.store.sync_file(self.filename) == (1, 1)
+        assert self.store.get_subtree_by_hash("ddddd") == holidays
+        assert titles(self.store.iter_tagged("work")) == ["Write report", "Outline", "Tables"]
+        self.rewrite("* eeeee: New\n" + text.split("* ddddd")[0].split("\n", 1)[1])
+        assert self.store.sync_file(self.filename) == (1, 1)
+        assert titles(self.store.get_file_children(self.filename)) == ["New", "Write report"]
+        assert list(self.store.iter_matching("CATEGORY=rest")) == []
+        assert self.store.remove_file(self.filename)
+        assert list(self.store.iter_tagged("work")) == []
+        assert self.store.get_filenames() == []
+
+    def test_edited_headers(self):
+        tree = HashedOrgTree()
+        tree.read_from_file(self.filename, 0, 0)
+        assert self.store.sync_file(self.filename, tree) == (2, 0)
+        header = tree.get_subtree_by_hash("ddddd").get_header()
+        header.set_title("Vacation")
+        header.set_priority("B")
+        header.add_tag("away")
+        assert self.store.sync_file(self.filename, tree) == (1, 1)
+        assert titles(self.store.iter_tagged("away")) == ["Vacation"]
+        loaded = self.store.load_tree(self.filename).get_subtree_by_hash("ddddd").get_header()
+        assert loaded.get_title() == "Vacation" and loaded.get_priority() == "B"
+        assert loaded.get_tags() == ["home", "away"]
@@ -155,3 +155,53 @@ class TestDelayRepeater(object):
         assert ds.has_repeater()
         assert ds.get_repeater() == "+5d"
         assert ds.get_date() == datetime.date(2013, 8, 11)
+
+class TestParseTimestamp(object):
+    def test_fields(self):
+        parsed = parse_timestamp("<2013-08-11 Sun 12:15-13:35 .+2w -1d>")
+        assert parsed.active
+        assert parsed.date == datetime.date(2013, 8, 11)
+        assert parsed.time == datetime.time(12, 15)
+        assert parsed.end_time == datetime.time(13, 35)
+        assert parsed.weekday == "Sun"
+        assert parsed.repeater == ".+2w"
+        assert parsed.delay == "-1d"
+        assert parsed.range_end == None
+
+    def test_range(self):
+        parsed = parse_timestamp("[2013-08-11 Sun]--[2013-08-12 Mon 10:00]")
+        assert not parsed.active
+        assert parsed.time == None
+        assert parsed.range_end.date == datetime.date(2013, 8, 12)
+        assert parsed.range_end.time == datetime.time(10, 0)
+
+    def test_invalid(self):
+        assert parse_timestamp("2013-08-11") == None
+        assert parse_timestamp("<2013-02-30 Sat>") == None
+        assert parse_timestamp("<2013-08-11 Sun 25:00>") == None
+        assert not DatetimeStamp.is_valid("<2013-08-11 Sun>")
+        assert not DateRange.is_valid("<2013-08-11 Sun +1d>--<2013-08-12 Mon>")
+
+    def test_construct_from_parsed(self):
+        string = "<2013-08-11 Sun 13:00>--<2013-08-12 Mon 15:00>"
+        dtr = DatetimeRange(string, parse_timestamp(string))
+        assert dtr.get_duration() == datetime.timedelta(days=1, hours=2)
+
+class TestRepeatInterval(object):
+    def test_restart_repeater(self):
+        dts = DatetimeStamp("<2013-08-11 Sun 13:00 .+3d>")
+        assert dts.get_repeater() == ".+3d"
+        assert dts.get_repeat_interval() == (3, "d")
+        assert not dts.has_overdue_repeater()
+        assert dts.set_repeater(".+1w")
+        assert dts.get_repeat_interval() == (1, "w")
+        assert "%s" % dts == "<2013-08-11 Sun 13:00 .+1w>"
+
+    def test_no_repeater_or_delay(self):
+        ds = DateStamp("<2013-08-11 Sun>")
+        assert ds.get_repeat_interval() == None
+        assert ds.get_delay_interval() == None
+
+    def test_duration_string(self):
+        dts = DatetimeStamp("<2013-08-11 Sun 12:15-13:35>")
+        assert "%s" % dts == "<2013-08-11 Sun 12:15-13:35>"
@@ -1,5 +1,10 @@
 from pyorgtree.tree import *
 
+class NamedNode(Node):
+    def __init__(self, name):
+        super(NamedNode, self).__init__()
+        self.name = name
+
 class TestTree(object):
     def test_tree_iteration(self):
         tree = Node()
@@ -22,3 +27,88 @@ class TestTree(object):
             counter += 1
         print(counter)
         assert counter == 7
+
+    def _build(self):
+        # a(b(d, e(g)), c(f))
+        nodes = {}
+        for name in "abcdefg":
+            nodes[name] = NamedNode(name)
+        for parent, child in ["ab", "ac", "bd", "be", "cf", "eg"]:
+            nodes[parent].add_child(nodes[child])
+            nodes[child].set_parent(nodes[parent])
+        return nodes["a"]
+
+    def test_tree_orders(self):
+        tree = self._build()
+        assert "".join(node.name for node in tree) == "abdegcf"
+        assert "".join(node.name for node in tree.iter_preorder()) == "abdegcf"
+        assert "".join(node.name for node in tree.iter_postorder()) == "dgebfca"
+        assert "".join(node.name for node in tree.iter_breadth_first()) == "abcdefg"
+
+    def test_tree_prune(self):
+        tree = self._build()
+        prune = lambda node: node.name in ("e", "c")
+        assert "".join(node.name for node in tree.iter_preorder(prune)) == "abd"
+        assert "".join(node.name for node in tree.iter_postorder(prune)) == "dba"
+        assert "".join(node.name for node in tree.iter_breadth_first(prune)) == "abd"
+        assert list(tree.iter_postorder(lambda node: True)) == []
+
+    def test_deep_tree_iteration(self):
+        tree = Node()
+        node = tree
+        for _ in range(100000):
+            child = Node()
+            node.add_child(child)
+            node = child
+        assert sum(1 for _ in tree) == 100001
+        assert next(tree.iter_postorder()) is node
+        assert sum(1 for _ in tree.iter_breadth_first()) == 100001
+
+class TestStructuralIndex(object):
+    def _build(self):
+        return TestTree()._build()
+
+    def test_queries(self):
+        tree = self._build()
+        index = StructuralIndex(tree)
+        nodes = dict((node.name, node) for node in tree)
+        assert len(index) == 7
+        assert "".join(index.nth(position).name for position in range(7)) == "abdegcf"
+        assert [index.depth(nodes[name]) for name in "abdegcf"] == [0, 1, 2, 2, 3, 1, 2]
+        assert [index.subtree_size(nodes[name]) for name in "abdegcf"] == [7, 4, 1, 2, 1, 2, 1]
+        assert index.get_entry(nodes["b"]) == 1 and index.get_exit(nodes["b"]) == 4
+        assert index.is_ancestor(nodes["a"], nodes["g"])
+        assert index.is_ancestor(nodes["b"], nodes["g"])
+        assert not index.is_ancestor(nodes["c"], nodes["g"])
+        assert not index.is_ancestor(nodes["g"], nodes["g"])
+        assert not index.is_ancestor(nodes["g"], nodes["b"])
+
+    def test_rebuild_after_mutation(self):
+        tree = self._build()
+        index = StructuralIndex(tree)
+        nodes = dict((node.name, node) for node in tree)
+        assert index.subtree_size(nodes["c"]) == 2
+        h = NamedNode("h")
+        nodes["f"].add_child(h)
+        h.set_parent(nodes["f"])
+        assert index.subtree_size(nodes["c"]) == 3
+        assert index.depth(h) == 3
+        assert index.nth(7) is h
+        try:
+            index.depth(NamedNode("x"))
+            assert False
+        except ValueError:
+            pass
+
+    def test_other_tree_untouched(self):
+        tree = self._build()
+        other = self._build()
+        index = StructuralIndex(tree)
+        assert len(index) == 7
+        positions = index.positions
+        other.add_child(NamedNode("h"))
+        assert len(index) == 7 and index.positions is positions
+        moved = other.get_children()[0]
+        moved.set_parent(tree)
+        tree.add_child(moved)
+        assert len(index) == 11